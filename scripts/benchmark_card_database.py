@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Card Database Builder Benchmark
+Builds cards.db from synthetic Scryfall-shaped corpora (no download) and
+reports ingest/index/total timings, cards/sec, peak RSS and database size as
+JSON, so builder changes can be compared run against run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from build_card_database import TABLE_LAYOUTS
+from json_codec import available_json_codecs
+from generate_card_corpus import parse_count, write_corpus
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+# Builder phases (see build_events) summed into each reported phase.
+PHASES = {
+    'ingest': ('ingest',),
+    'index': ('filter_tables', 'fts_index', 'indexes', 'layout'),
+    'publish': ('publish',),
+}
+
+
+def peak_rss_mb() -> Dict[str, Optional[float]]:
+    """Peak resident set size of this process and of its (worker) children."""
+    if resource is not None:
+        # ru_maxrss is in KB on Linux and in bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+        return {'peak_rss_mb': round(own / 1024 / 1024, 1),
+                'peak_rss_workers_mb': round(children / 1024 / 1024, 1) if children else None}
+    try:
+        import psutil
+        peak = psutil.Process().memory_info().peak_wset
+        return {'peak_rss_mb': round(peak / 1024 / 1024, 1), 'peak_rss_workers_mb': None}
+    except (ImportError, AttributeError):
+        return {'peak_rss_mb': None, 'peak_rss_workers_mb': None}
+
+
+def run_build(corpus: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the database from ``corpus`` in this process and measure it.
+
+    Must run in a fresh process whose DESKTOPMTG_DATA_DIR points at an empty
+    directory, so the builder's paths and the RSS figures belong to this build.
+    """
+    import build_card_database  # paths come from DESKTOPMTG_DATA_DIR, set by the parent
+    from build_events import BuildEvents
+
+    events = BuildEvents('cards', summary_file=build_card_database.TIMINGS_FILE)
+    builder = build_card_database.MTGDatabaseBuilder(source_file=corpus, force=True, events=events, **options)
+    start = time.perf_counter()
+    builder.build_database()
+    total = time.perf_counter() - start
+
+    durations = {entry['phase']: entry['duration_s'] for entry in events.phases}
+    phases = {phase: sum(durations.get(name, 0.0) for name in names) for phase, names in PHASES.items()}
+
+    database = build_card_database.DATABASE_FILE
+    with sqlite3.connect(database) as conn:
+        cards = conn.execute('SELECT COUNT(*) FROM cards').fetchone()[0]
+    return {
+        'ingested_cards': cards,
+        'seconds': {**{phase: round(value, 3) for phase, value in phases.items()}, 'total': round(total, 3)},
+        'cards_per_sec': round(cards / phases['ingest']) if phases['ingest'] else None,
+        'db_mb': round(database.stat().st_size / 1024 / 1024, 1),
+        **peak_rss_mb(),
+    }
+
+
+def benchmark(count: int, args: argparse.Namespace, corpus_dir: Path,
+              json_codec: Optional[str] = None) -> Dict[str, Any]:
+    """Generate (or reuse) one corpus and build it in a child process."""
+    corpus = corpus_dir / f"cards-{count}-ne{args.non_english}-mf{args.multi_face}-s{args.seed}.json"
+    if not corpus.exists():
+        print(f"🧪 Generating {count:,} synthetic cards...")
+        start = time.perf_counter()
+        write_corpus(corpus, count, non_english_ratio=args.non_english,
+                     multi_face_ratio=args.multi_face, seed=args.seed)
+        print(f"✅ Corpus ready in {time.perf_counter() - start:.1f} seconds: {corpus}")
+
+    options = {'workers': args.workers, 'slim_data': args.slim_data, 'compress_data': args.compress_data,
+               'layout': args.layout, 'covering_indexes': args.covering_indexes,
+               'split_oracle': args.split_oracle, 'json_codec': json_codec}
+    runs = []
+    for attempt in range(args.repeat):
+        with tempfile.TemporaryDirectory(prefix='mtg-bench-') as data_dir:
+            result_file = Path(data_dir) / 'result.json'
+            env = dict(os.environ, DESKTOPMTG_DATA_DIR=data_dir)
+            command = [sys.executable, str(Path(__file__).resolve()), '--run-one', str(corpus),
+                       '--options', json.dumps(options), '--result', str(result_file)]
+            print(f"⏱️ Building {count:,} cards (run {attempt + 1}/{args.repeat}"
+                  f"{f', {json_codec}' if json_codec else ''})...")
+            subprocess.run(command, env=env, check=True, cwd=SCRIPT_DIR,
+                           stdout=None if args.verbose else subprocess.DEVNULL)
+            run = json.loads(result_file.read_text())
+        print(f"   {run['cards_per_sec']:,} cards/sec, {run['seconds']['total']:.1f} s total, "
+              f"{run['db_mb']} MB, peak RSS {run['peak_rss_mb']} MB")
+        runs.append(run)
+
+    best = min(runs, key=lambda run: run['seconds']['total'])
+    return {
+        'cards': count,
+        'json_codec': json_codec,
+        'non_english_ratio': args.non_english,
+        'multi_face_ratio': args.multi_face,
+        'corpus_mb': round(corpus.stat().st_size / 1024 / 1024, 1),
+        **best,
+        'total_cards_per_sec': round(count / best['seconds']['total']),
+        'runs': runs if args.repeat > 1 else None,
+    }
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Benchmark the card database builder on synthetic data')
+    parser.add_argument('--sizes', nargs='+', type=parse_count, default=[10000, 100000],
+                        help='corpus sizes to benchmark, e.g. 10k 100k 500k')
+    parser.add_argument('--non-english', type=float, default=0.4,
+                        help='fraction of printings that are not English')
+    parser.add_argument('--multi-face', type=float, default=0.05,
+                        help='fraction of cards with two faces')
+    parser.add_argument('--seed', type=int, default=7, help='corpus random seed')
+    parser.add_argument('--corpus-dir', type=Path,
+                        help='where generated corpora are kept and reused (default: a temporary directory)')
+    parser.add_argument('--repeat', type=int, default=1, help='builds per size; the fastest is reported')
+    parser.add_argument('--output', type=Path, help='write the JSON report here as well as to stdout')
+    parser.add_argument('--verbose', action='store_true', help='show the builder output')
+    # Builder options
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--slim-data', action='store_true')
+    parser.add_argument('--compress-data', choices=['zlib', 'zstd'])
+    parser.add_argument('--layout', choices=TABLE_LAYOUTS, default='default')
+    parser.add_argument('--covering-indexes', action='store_true')
+    parser.add_argument('--split-oracle', action='store_true')
+    parser.add_argument('--json-codec', nargs='+', choices=available_json_codecs(),
+                        help='JSON codecs to compare, each size is built once per codec (default: the fastest)')
+    # Internal: a single measured build, run in a child process
+    parser.add_argument('--run-one', type=Path, help=argparse.SUPPRESS)
+    parser.add_argument('--options', help=argparse.SUPPRESS)
+    parser.add_argument('--result', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        result = run_build(args.run_one, json.loads(args.options))
+        args.result.write_text(json.dumps(result))
+        return
+
+    print("🃏 MTG Card Database Builder Benchmark")
+    print("=" * 40)
+
+    with tempfile.TemporaryDirectory(prefix='mtg-corpus-') as temp_dir:
+        corpus_dir = args.corpus_dir or Path(temp_dir)
+        corpus_dir.mkdir(parents=True, exist_ok=True)
+        results: List[Dict[str, Any]] = [benchmark(count, args, corpus_dir, json_codec)
+                                         for count in args.sizes for json_codec in args.json_codec or [None]]
+
+    report = {
+        'generated_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'builder_options': {'workers': args.workers, 'slim_data': args.slim_data,
+                            'compress_data': args.compress_data, 'layout': args.layout,
+                            'covering_indexes': args.covering_indexes, 'split_oracle': args.split_oracle},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text)
+        print(f"💾 Report saved: {args.output}")
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
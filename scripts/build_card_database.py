@@ -1,15 +1,44 @@
 import os
+import re
+import argparse
 import json
+import codecs
 import sqlite3
+import hashlib
 import requests
+import threading
 import time
+import unicodedata
+from contextlib import closing
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Iterable, Iterator, BinaryIO, Sequence, Tuple, Callable
 import gzip
+import zlib
+import queue
+import itertools
 from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from build_events import BuildEvents
+from json_codec import JsonCodec, available_json_codecs, get_json_codec
+from card_export import EXPORT_FORMATS, export_cards, export_path
+from card_patch import PatchError, make_patch
+
+try:
+    import zstandard
+except ImportError:  # optional – zlib with a preset dictionary is used instead
+    zstandard = None
 
 # Configuration
 SCRYFALL_BULK_API = 'https://api.scryfall.com/bulk-data'
+# Scryfall bulk files the builder can use. default_cards has every printing
+# in English (or its only language) and is all the English-only cards table
+# needs; all_cards adds every other language and is several times larger;
+# oracle_cards has a single printing per card.
+BULK_TYPES = ('default_cards', 'oracle_cards', 'all_cards')
+DEFAULT_BULK_TYPE = 'default_cards'
 # Allow the parent process to override the target data directory so that the
 # Python builder can write directly into Electron's `app.getPath('userData')`.
 # This avoids mismatches like "desktopmtg" vs. the application name directory.
@@ -27,68 +56,1634 @@ else:
 
 CARDS_FILE = DATA_DIR / 'cards.json'
 DATABASE_FILE = DATA_DIR / 'cards.db'
+# Full builds go into this shadow file (same directory, so the final rename is
+# atomic) and only replace cards.db once they are complete.
+BUILD_DATABASE_FILE = DATA_DIR / 'cards.db.tmp'
+# Non-English printings (opt-in, see ForeignPartition) live in their own file
+# so the English cards table and its queries stay exactly as they are.
+FOREIGN_DATABASE_FILE = DATA_DIR / 'cards-foreign.db'
+BUILD_FOREIGN_DATABASE_FILE = DATA_DIR / 'cards-foreign.db.tmp'
 METADATA_FILE = DATA_DIR / 'metadata.json'
+# Row-level patch from the previously published cards.db to the current one
+# (see card_patch), so clients can update without downloading the database.
+PATCH_FILE = DATA_DIR / 'cards.patch'
+# Per-phase timings of the last build (see build_events.BuildEvents).
+TIMINGS_FILE = DATA_DIR / 'build_timings.json'
+# Partial downloads live next to the final file together with a small state file
+# that records which bulk dump (and which byte ranges) they belong to.
+PARTIAL_CARDS_FILE = DATA_DIR / 'cards.json.part'
+DOWNLOAD_STATE_FILE = DATA_DIR / 'cards.json.download'
+# The copy a streamed build keeps (keep_raw) is written here, apart from the
+# resumable download's files, and renamed to cards.json once it is complete.
+STREAM_CARDS_FILE = DATA_DIR / 'cards.json.stream'
+
+# Persist download progress every this many bytes so an interrupted download
+# can resume close to where it stopped.
+DOWNLOAD_CHECKPOINT_BYTES = 8 * 1024 * 1024
+
+# Size of each read from the bulk file. The parser only ever holds roughly one
+# chunk plus one card in memory, so this bounds the RSS of the parse step.
+BULK_READ_SIZE = 1024 * 1024
+# Largest card object (in characters) the parser buffers while looking for its
+# end; real cards are a few KB, so anything longer is malformed input.
+BULK_MAX_CARD_SIZE = 16 * 1024 * 1024
+
+# JSON library used to parse cards and write the ``data`` column, the fastest
+# installed one unless a builder asks for another (see set_json_codec).
+_json = get_json_codec()
+
+
+def set_json_codec(name: Optional[str] = None) -> JsonCodec:
+    """Switch the JSON codec of this process (None = automatic choice) and return it."""
+    global _json
+    _json = get_json_codec(name)
+    return _json
+
+
+# Scryfall writes one card per line, which lets us check the language of a card
+# on its raw text and skip it without ever building the dict.
+_LANG_RE = re.compile(r'"lang"\s*:\s*"([^"]*)"')
+_SEPARATOR_RE = re.compile(r'[\s,]*')
+
+
+def iter_file_chunks(f: BinaryIO, chunk_size: int = BULK_READ_SIZE) -> Iterator[bytes]:
+    """Yield fixed-size byte chunks from a binary file object until EOF."""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_path_chunks(path: Path, chunk_size: int = BULK_READ_SIZE) -> Iterator[bytes]:
+    """Open ``path`` and yield its contents in byte chunks, closing it when exhausted."""
+    with open(path, 'rb') as f:
+        yield from iter_file_chunks(f, chunk_size)
+
+
+def iter_gunzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Decompress a stream of gzip byte chunks incrementally."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def iter_prefetched(chunks: Iterable[bytes], max_pending: int = 16) -> Iterator[bytes]:
+    """Pull ``chunks`` on a background thread so producer I/O (e.g. the network)
+    overlaps with whatever the consumer does with each chunk.
+    
+    At most ``max_pending`` chunks are buffered; errors raised by the producer
+    are re-raised in the consumer.
+    """
+    pending = queue.Queue(maxsize=max_pending)
+    done = object()
+    stop = threading.Event()
+    
+    def produce():
+        try:
+            for chunk in chunks:
+                while not stop.is_set():
+                    try:
+                        pending.put(chunk, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            pending.put(done)
+        except BaseException as e:  # propagate to the consumer
+            pending.put(e)
+    
+    producer = threading.Thread(target=produce, name='bulk-prefetch', daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_bulk_cards(chunks: Iterable[bytes], lang: Optional[str] = 'en',
+                    stats: Optional[Dict[str, int]] = None, raw: bool = False,
+                    skipped: Optional[Callable[[str], None]] = None) -> Iterator[Any]:
+    """Incrementally parse a Scryfall bulk JSON array, yielding one card at a time.
+
+    ``chunks`` is any iterable of UTF-8 encoded byte chunks (a file, an HTTP
+    response, ...). Cards whose ``lang`` differs from ``lang`` are skipped on
+    their raw text when the file is laid out one card per line, so they never
+    become dicts; pass ``lang=None`` to keep every language. With ``raw=True``
+    the JSON text of each card is yielded instead of a dict, leaving decoding
+    to the consumer (e.g. a worker process). If ``stats`` is given it is
+    updated in place with ``bytes_read``, ``cards`` and ``skipped``. The JSON
+    text of every card skipped for its language is passed to ``skipped``.
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault('bytes_read', 0)
+    stats.setdefault('cards', 0)
+    stats.setdefault('skipped', 0)
+
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunk_iter = iter(chunks)
+    buf = ''
+    pos = 0
+    eof = False
+    started = False
+    # Index of the next newline in ``buf`` (``len(buf)`` when there is none),
+    # cached so minified single-line input is not rescanned for every card.
+    newline = -1
+
+    def read_more(remaining: str) -> str:
+        nonlocal eof, newline
+        newline = -1
+        chunk = next(chunk_iter, None)
+        if chunk is None:
+            eof = True
+            return remaining + text_decoder.decode(b'', final=True)
+        stats['bytes_read'] += len(chunk)
+        return remaining + text_decoder.decode(chunk)
+
+    while True:
+        pos = _SEPARATOR_RE.match(buf, pos).end()
+
+        # Need more data: either the buffer is drained or we are at an object
+        # whose end is not buffered yet (handled below via the decode error).
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("Unexpected end of bulk data (missing closing ']')")
+            buf, pos = read_more(buf[pos:]), 0
+            continue
+
+        char = buf[pos]
+        if not started:
+            if char != '[':
+                raise ValueError(f"Bulk data must be a JSON array, found {char!r}")
+            started = True
+            pos += 1
+            continue
+        if char == ']':
+            return
+        if char != '{':
+            raise ValueError(f"Unexpected character {char!r} in bulk data")
+
+        # Fast path: the whole card sits on one line.
+        if newline < pos:
+            newline = buf.find('\n', pos)
+            if newline == -1:
+                newline = len(buf)
+        if newline < len(buf):
+            line = buf[pos:newline].rstrip()
+            if line.endswith(','):
+                line = line[:-1].rstrip()
+            # Braces inside card text can fool the count, so a card is only
+            # taken from the line if it also decodes; otherwise the general
+            # path finds the real end. Other languages are dropped undecoded
+            # (whoever takes them through ``skipped`` decodes them).
+            if line.endswith('}') and line.count('{') == line.count('}'):
+                if lang is not None:
+                    match = _LANG_RE.search(line)
+                    if match and match.group(1) != lang:
+                        stats['skipped'] += 1
+                        if skipped is not None:
+                            skipped(line)
+                        pos = newline + 1
+                        continue
+                try:
+                    card = _json.loads(line)
+                except ValueError:
+                    card = None
+                if card is not None:
+                    pos = newline + 1
+                    if lang is not None and card.get('lang', 'en') != lang:
+                        stats['skipped'] += 1
+                        if skipped is not None:
+                            skipped(line)
+                        continue
+                    stats['cards'] += 1
+                    yield line if raw else card
+                    continue
+
+        # General path: let the decoder find the end of the object, pulling in
+        # more data while the object is still incomplete.
+        try:
+            card, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            # Only an object cut off by the end of the buffer is worth reading more for
+            truncated = e.pos >= len(buf) - 6 or e.msg.startswith('Unterminated string')
+            if eof or not truncated:
+                raise
+            if len(buf) - pos > BULK_MAX_CARD_SIZE:
+                raise ValueError(f"Card in bulk data near byte {stats['bytes_read']} does not end "
+                                 f"within {BULK_MAX_CARD_SIZE:,} characters") from e
+            buf, pos = read_more(buf[pos:]), 0
+            continue
+        if lang is not None and card.get('lang', 'en') != lang:
+            stats['skipped'] += 1
+            if skipped is not None:
+                skipped(buf[pos:end])
+            pos = end
+            continue
+        stats['cards'] += 1
+        yield buf[pos:end] if raw else card
+        pos = end
+
+
+# Column order of the ``cards`` table as written by ``card_to_row``.
+CARD_COLUMNS = (
+    'id', 'oracle_id', 'lang', 'name', 'mana_cost', 'cmc', 'type_line', 'oracle_text',
+    'power', 'toughness', 'colors', 'color_identity', 'keywords', 'legalities',
+    'produced_mana', 'card_faces', 'set_id', 'set_code', 'set_name', 'set_type',
+    'collector_number', 'rarity', 'released_at', 'artist', 'border_color', 'frame',
+    'image_status', 'image_uris', 'layout', 'reserved', 'foil', 'nonfoil', 'digital',
+    'reprint', 'story_spotlight', 'full_art', 'textless', 'tcgplayer_id', 'mtgo_id',
+    'arena_id', 'prices', 'data', 'content_hash',
+    # Index-friendly shadows of the JSON/text columns above
+    'colors_mask', 'color_identity_mask', 'legal_mask', 'power_num', 'toughness_num',
+)
+
+INSERT_CARD_SQL = (
+    f"INSERT OR REPLACE INTO cards ({', '.join(CARD_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(CARD_COLUMNS))})"
+)
+
+# Gameplay columns shared by every printing of a card. With the oracle split
+# they live once per oracle_id in ``oracle_cards``; the remaining columns stay
+# per printing in ``printings`` and a ``cards`` view joins the two back.
+ORACLE_COLUMNS = (
+    'name', 'mana_cost', 'cmc', 'type_line', 'oracle_text', 'power', 'toughness',
+    'colors', 'color_identity', 'keywords', 'legalities', 'produced_mana', 'layout',
+    'reserved', 'colors_mask', 'color_identity_mask', 'legal_mask', 'power_num', 'toughness_num',
+)
+PRINTING_COLUMNS = tuple(column for column in CARD_COLUMNS if column not in ORACLE_COLUMNS)
+# Printings without an oracle_id (e.g. reversible cards) are their own oracle card.
+ORACLE_KEY_SQL = 'COALESCE(oracle_id, id)'
+
+_INDEX_TARGET_RE = re.compile(r' ON cards\((.*)\)$')
+_IDENTIFIER_RE = re.compile(r'[a-z_]+')
+
+
+def is_split_database(conn: sqlite3.Connection) -> bool:
+    """True if ``cards`` is the view over ``oracle_cards`` and ``printings``."""
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = 'cards'").fetchone()
+    return row is not None and row[0] == 'view'
+
+
+def split_index_sql(sql: str) -> str:
+    """Point a ``cards`` index at ``oracle_cards`` or ``printings`` by its leading column."""
+    match = _INDEX_TARGET_RE.search(sql)
+    if not match:
+        return sql
+    columns = match.group(1)
+    leading = next(word for word in _IDENTIFIER_RE.findall(columns) if word in CARD_COLUMNS)
+    if leading in ORACLE_COLUMNS:
+        return sql.replace(' ON cards(', ' ON oracle_cards(')
+    return sql[:match.start()] + f" ON printings({columns.replace('oracle_id', 'oracle_key')})"
+
+
+# Scryfall fields that are already stored in their own column, mapped to
+# (column, kind). "Slim" data drops these from the ``data`` JSON and
+# ``CardDataCodec.decode`` restores them from the row.
+SLIM_FIELDS = {
+    'id': ('id', 'value'), 'oracle_id': ('oracle_id', 'value'), 'lang': ('lang', 'value'),
+    'name': ('name', 'value'), 'mana_cost': ('mana_cost', 'value'), 'cmc': ('cmc', 'float'),
+    'type_line': ('type_line', 'value'), 'oracle_text': ('oracle_text', 'value'),
+    'power': ('power', 'value'), 'toughness': ('toughness', 'value'),
+    'colors': ('colors', 'json'), 'color_identity': ('color_identity', 'json'),
+    'keywords': ('keywords', 'json'), 'legalities': ('legalities', 'json'),
+    'produced_mana': ('produced_mana', 'json'), 'card_faces': ('card_faces', 'json'),
+    'set_id': ('set_id', 'value'), 'set': ('set_code', 'value'), 'set_name': ('set_name', 'value'),
+    'set_type': ('set_type', 'value'), 'collector_number': ('collector_number', 'value'),
+    'rarity': ('rarity', 'value'), 'released_at': ('released_at', 'value'),
+    'artist': ('artist', 'value'), 'border_color': ('border_color', 'value'),
+    'frame': ('frame', 'value'), 'image_status': ('image_status', 'value'),
+    'image_uris': ('image_uris', 'json'), 'layout': ('layout', 'value'),
+    'reserved': ('reserved', 'bool'), 'foil': ('foil', 'bool'), 'nonfoil': ('nonfoil', 'bool'),
+    'digital': ('digital', 'bool'), 'reprint': ('reprint', 'bool'),
+    'story_spotlight': ('story_spotlight', 'bool'), 'full_art': ('full_art', 'bool'),
+    'textless': ('textless', 'bool'), 'tcgplayer_id': ('tcgplayer_id', 'int'),
+    'mtgo_id': ('mtgo_id', 'int'), 'arena_id': ('arena_id', 'int'),
+    'prices': ('prices', 'json'),
+}
+
+# Key added to slim JSON listing the SLIM_FIELDS the card did not have, so
+# decoding does not invent them from column defaults.
+SLIM_ABSENT_KEY = '__absent__'
+
+# Compressed ``data`` values are BLOBs: one codec byte, a 2-byte dictionary
+# id, then the compressed JSON. Plain values stay TEXT.
+DATA_CODEC_ZLIB = b'z'
+DATA_CODEC_ZSTD = b's'
+DATA_DICTIONARY_SIZE = 32 * 1024  # zlib can only use a 32 KB window
+DATA_DICTIONARY_SAMPLES = 2000
+
+_DICTIONARY_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"\s*:?\s*')
+
+
+def train_data_dictionary(samples: List[bytes], size: int = DATA_DICTIONARY_SIZE) -> bytes:
+    """Build a zlib preset dictionary from the most common JSON fragments of ``samples``.
+
+    Fragments are ordered by increasing value so the most useful ones sit at
+    the end of the dictionary, closest to the data being compressed.
+    """
+    counts: Dict[str, int] = {}
+    for sample in samples:
+        for token in set(_DICTIONARY_TOKEN_RE.findall(sample.decode('utf-8'))):
+            counts[token] = counts.get(token, 0) + 1
+    # Fragments seen only once cannot help other cards.
+    scored = sorted((count * len(token), token) for token, count in counts.items() if count > 1)
+    picked = []
+    used = 0
+    for _, token in reversed(scored):
+        encoded = token.encode('utf-8')
+        if used + len(encoded) > size:
+            continue
+        picked.append(encoded)
+        used += len(encoded)
+    return b''.join(reversed(picked))
+
+
+class CardDataCodec:
+    """Encodes and decodes the full-JSON ``data`` column.
+
+    ``slim`` drops the fields already stored in columns; ``compression``
+    (``'zlib'`` or ``'zstd'``) compresses the JSON with a dictionary shared by
+    every row of the build, stored in the ``data_dictionaries`` table. With
+    neither option ``data`` stays the plain JSON text the builder always wrote.
+    Instances are picklable so they can be handed to row-building workers.
+    """
+
+    def __init__(self, slim: bool = False, compression: Optional[str] = None,
+                 dictionary: Optional[bytes] = None, dictionary_id: int = 0):
+        if compression not in (None, 'zlib', 'zstd'):
+            raise ValueError(f"Unknown data compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd data compression requires the 'zstandard' package")
+        self.slim = slim
+        self.compression = compression
+        self.dictionary = dictionary or b''
+        self.dictionary_id = dictionary_id
+        self._zstd_compressor = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_zstd_compressor'] = None
+        return state
+
+    @classmethod
+    def train(cls, cards: List[Dict[str, Any]], slim: bool = False, compression: Optional[str] = None,
+              dictionary_id: int = 0) -> 'CardDataCodec':
+        """Create a codec whose compression dictionary is trained on sample ``cards``."""
+        codec = cls(slim=slim, dictionary_id=dictionary_id)
+        if compression is None:
+            return codec
+        samples = [codec._to_json(card).encode('utf-8') for card in cards]
+        if compression == 'zstd':
+            if zstandard is None:
+                raise ValueError("zstd data compression requires the 'zstandard' package")
+            dictionary = zstandard.train_dictionary(DATA_DICTIONARY_SIZE * 4, samples).as_bytes()
+        else:
+            dictionary = train_data_dictionary(samples)
+        return cls(slim=slim, compression=compression, dictionary=dictionary,
+                   dictionary_id=dictionary_id)
+
+    @property
+    def is_plain(self) -> bool:
+        return not self.slim and self.compression is None
+
+    def _to_json(self, card: Dict[str, Any], data_json: Optional[str] = None) -> str:
+        if not self.slim:
+            return data_json if data_json is not None else _json.dumps(card)
+        slim = dict(card)
+        absent = []
+        for key, (_, kind) in SLIM_FIELDS.items():
+            if key not in card:
+                absent.append(key)
+                continue
+            value = card[key]
+            # Only drop values that round-trip exactly through their column.
+            if kind == 'json' or (kind == 'bool' and isinstance(value, bool)) \
+                    or (kind == 'float' and isinstance(value, float)) \
+                    or (kind in ('value', 'int') and value is not None and not isinstance(value, bool)):
+                del slim[key]
+        slim[SLIM_ABSENT_KEY] = absent
+        return _json.dumps(slim)
+
+    def encode(self, card: Dict[str, Any], data_json: Optional[str] = None) -> Any:
+        """Return the value to store in ``data`` for ``card`` (``data_json`` is its full JSON, if already dumped)."""
+        text = self._to_json(card, data_json)
+        if self.compression is None:
+            return text
+        header_id = self.dictionary_id.to_bytes(2, 'big')
+        payload = text.encode('utf-8')
+        if self.compression == 'zstd':
+            if self._zstd_compressor is None:
+                self._zstd_compressor = zstandard.ZstdCompressor(
+                    level=10, dict_data=zstandard.ZstdCompressionDict(self.dictionary))
+            return DATA_CODEC_ZSTD + header_id + self._zstd_compressor.compress(payload)
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=self.dictionary)
+        return DATA_CODEC_ZLIB + header_id + compressor.compress(payload) + compressor.flush()
+
+
+class CardDataReader:
+    """Reads the ``data`` column whatever format the builder stored it in.
+
+    Plain JSON, slim JSON and dictionary-compressed blobs are all decoded back
+    to the full Scryfall card dict. Slim values need the rest of the row,
+    passed as a mapping such as a ``sqlite3.Row``.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.dictionaries: Dict[int, bytes] = {}
+        self._zstd_decompressors: Dict[int, Any] = {}
+        has_table = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'data_dictionaries'").fetchone()
+        if has_table:
+            self.dictionaries = {row[0]: bytes(row[1]) for row in
+                                 conn.execute('SELECT id, dictionary FROM data_dictionaries')}
+
+    def decode(self, value: Any, row: Optional[Any] = None) -> Dict[str, Any]:
+        if isinstance(value, (bytes, memoryview)):
+            value = bytes(value)
+            codec, dictionary_id, payload = value[:1], int.from_bytes(value[1:3], 'big'), value[3:]
+            dictionary = self.dictionaries.get(dictionary_id, b'')
+            if codec == DATA_CODEC_ZSTD:
+                if zstandard is None:
+                    raise ValueError("Reading zstd-compressed card data requires the 'zstandard' package")
+                if dictionary_id not in self._zstd_decompressors:
+                    self._zstd_decompressors[dictionary_id] = zstandard.ZstdDecompressor(
+                        dict_data=zstandard.ZstdCompressionDict(dictionary))
+                text = self._zstd_decompressors[dictionary_id].decompress(payload)
+            elif codec == DATA_CODEC_ZLIB:
+                text = zlib.decompressobj(-zlib.MAX_WBITS, zdict=dictionary).decompress(payload)
+            else:
+                raise ValueError(f"Unknown card data codec: {codec!r}")
+            value = text
+        card = _json.loads(value)
+        if SLIM_ABSENT_KEY in card:
+            if row is None:
+                raise ValueError("Slim card data needs its row to be decoded")
+            absent = set(card.pop(SLIM_ABSENT_KEY))
+            for key, (column, kind) in SLIM_FIELDS.items():
+                if key in card or key in absent:
+                    continue
+                column_value = row[column]
+                if kind == 'json':
+                    column_value = json.loads(column_value)
+                elif kind == 'bool':
+                    column_value = bool(column_value)
+                card[key] = column_value
+        return card
+
+
+def read_card_data(conn: sqlite3.Connection, card_id: str,
+                   reader: Optional[CardDataReader] = None) -> Optional[Dict[str, Any]]:
+    """Return the full Scryfall card dict for ``card_id``, or None if it is not in the database."""
+    previous_factory = conn.row_factory
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute('SELECT * FROM cards WHERE id = ?', (card_id,)).fetchone()
+    finally:
+        conn.row_factory = previous_factory
+    if row is None:
+        return None
+    return (reader or CardDataReader(conn)).decode(row['data'], row)
+
+
+# Bit per color in ``colors_mask`` / ``color_identity_mask``.
+COLOR_BITS = {'W': 1, 'U': 2, 'B': 4, 'R': 8, 'G': 16}
+
+# Bit positions of ``legal_mask`` (bit i = LEGALITY_FORMATS[i]). New formats must
+# be appended so existing masks keep their meaning; the mapping is also stored in
+# the ``legality_formats`` table.
+LEGALITY_FORMATS = (
+    'standard', 'future', 'historic', 'timeless', 'gladiator', 'pioneer', 'explorer',
+    'modern', 'legacy', 'pauper', 'vintage', 'penny', 'commander', 'oathbreaker',
+    'standardbrawl', 'brawl', 'alchemy', 'paupercommander', 'duel', 'oldschool',
+    'premodern', 'predh',
+)
+# Formats that get a (legal bit, color identity) expression index.
+INDEXED_LEGALITY_FORMATS = ('standard', 'pioneer', 'modern', 'legacy', 'vintage', 'pauper', 'commander')
+# Statuses that make a card playable in a format.
+LEGAL_STATUSES = ('legal', 'restricted')
+
+SUPERTYPES = {'Basic', 'Legendary', 'Ongoing', 'Snow', 'World', 'Elite', 'Host'}
+
+_STAT_NUMBER_RE = re.compile(r'[+-]?(?:\d+(?:\.\d*)?|\.\d+)')
+
+# Physical layouts of the cards table (see MTGDatabaseBuilder.optimize_layout):
+#   default       – rowid table in download order, id index for the TEXT key
+#   clustered     – rowid table rewritten in (name, oracle_id) order, so the
+#                   implicit integer key keeps printings and name ranges together
+#   without-rowid – clustered on the id itself, no separate primary-key index;
+#                   only with slim or compressed data, as full JSON rows spill
+#                   out of the b-tree pages and grow the file
+TABLE_LAYOUTS = ('default', 'clustered', 'without-rowid')
+
+# Covering indexes for the common list queries; each replaces the narrow index
+# on the same leading column.
+COVERING_INDEXES = {
+    'idx_cover_name_lower': ('lower(name), name, set_code, set_name, collector_number, id', 'idx_name_lower'),
+    'idx_cover_printings': ('oracle_id, released_at, set_code, collector_number, id', 'idx_oracle_id'),
+    'idx_cover_set_list': ('set_code, collector_number, name, rarity, id', 'idx_set'),
+}
+
+# Queries timed by the layout report, with the sample-card fields they take.
+LAYOUT_REPORT_QUERIES = {
+    'id lookup': ('SELECT data FROM cards WHERE id = ?', ('id',)),
+    'name lookup': ('SELECT name, set_code, set_name, collector_number, id FROM cards '
+                    'WHERE lower(name) = lower(?)', ('name',)),
+    'printings': ('SELECT id, set_code, collector_number, released_at FROM cards '
+                  'WHERE oracle_id = ? ORDER BY released_at', ('oracle_id',)),
+    'set list': ('SELECT id, collector_number, name, rarity FROM cards '
+                 'WHERE set_code = ? ORDER BY collector_number', ('set_code',)),
+    'name page': ('SELECT id, name, set_code FROM cards ORDER BY name LIMIT 100 OFFSET 1000', ()),
+    'commander identity': (f"SELECT count(*) FROM cards WHERE ((legal_mask >> {LEGALITY_FORMATS.index('commander')}) & 1) = 1 "
+                           "AND color_identity_mask IN (0, 2, 16, 18)", ()),
+}
+
+
+def color_mask(colors: Optional[Iterable[str]]) -> int:
+    """Bitmask of a list of color letters (unknown letters are ignored)."""
+    mask = 0
+    for color in colors or ():
+        mask |= COLOR_BITS.get(color, 0)
+    return mask
+
+
+def legality_mask(legalities: Optional[Dict[str, str]]) -> int:
+    """Bitmask of the formats in which a card is legal (or restricted)."""
+    mask = 0
+    for bit, fmt in enumerate(LEGALITY_FORMATS):
+        if (legalities or {}).get(fmt) in LEGAL_STATUSES:
+            mask |= 1 << bit
+    return mask
+
+
+def stat_number(value: Optional[str]) -> Optional[float]:
+    """Numeric shadow of a power/toughness string: ``'3'`` -> 3, ``'1+*'`` -> 1, ``'*'`` -> None."""
+    if value is None:
+        return None
+    match = _STAT_NUMBER_RE.match(value)
+    return float(match.group(0)) if match else None
+
+
+def color_submasks(colors: Iterable[str]) -> List[int]:
+    """All masks that are subsets of ``colors`` – e.g. identities playable in a {U,G} deck."""
+    mask = color_mask(colors)
+    return [m for m in range(32) if m & ~mask == 0]
+
+
+def color_supermasks(colors: Iterable[str]) -> List[int]:
+    """All masks that contain every color in ``colors``."""
+    mask = color_mask(colors)
+    return [m for m in range(32) if m & mask == mask]
+
+
+def legality_expression(fmt: str) -> str:
+    """SQL expression that is 1 when a card is legal in ``fmt`` (the indexed form)."""
+    return f"((legal_mask >> {LEGALITY_FORMATS.index(fmt)}) & 1)"
+
+
+def legality_clause(fmt: str) -> str:
+    """SQL condition for "legal in ``fmt``".
+
+    The expression matches the ``idx_legal_<fmt>`` indexes exactly, so for
+    the formats in INDEXED_LEGALITY_FORMATS the planner can use them, e.g.::
+
+        WHERE {legality_clause('commander')} AND color_identity_mask IN (0, 2, 16, 18)
+    """
+    return f"{legality_expression(fmt)} = 1"
+
+
+def parse_type_line(type_line: Optional[str]) -> List[Tuple[str, str]]:
+    """Split a type line into ``(kind, name)`` pairs, kind being super/type/sub.
+
+    Multi-face type lines (``A // B``) contribute the types of every face.
+    """
+    parts = []
+    seen = set()
+    for face in (type_line or '').split(' // '):
+        main, _, sub = face.partition(' — ')
+        for word in main.split():
+            part = ('super' if word in SUPERTYPES else 'type', word)
+            if part not in seen:
+                seen.add(part)
+                parts.append(part)
+        for word in sub.split():
+            part = ('sub', word)
+            if part not in seen:
+                seen.add(part)
+                parts.append(part)
+    return parts
+
+
+# unicode61 with braces and slashes as token characters keeps mana and tap
+# symbols such as {T}, {G} and {W/U} as single searchable tokens.
+FTS_TOKENIZER = "unicode61 remove_diacritics 2 tokenchars '{}/'"
+# BM25 weights for (card_id, name, type_line, oracle_text).
+FTS_WEIGHTS = (0.0, 10.0, 3.0, 1.0)
+
+_ADJACENT_SYMBOLS_RE = re.compile(r'\}\{')
+_FTS_TERM_RE = re.compile(r'(\{[^}\s]*\}|[^\s{}"*]+)(\*?)')
+
+
+def fts_text(text: Optional[str]) -> str:
+    """Text as indexed by ``cards_fts``: adjacent symbols (``{2}{U}``) are split into tokens."""
+    return _ADJACENT_SYMBOLS_RE.sub('} {', text) if text else ''
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into a safe FTS5 query: every term quoted and AND-ed.
+
+    A trailing ``*`` on a term keeps prefix matching (``draw*``).
+    """
+    terms = [f'"{term}"{star}' for term, star in _FTS_TERM_RE.findall(fts_text(text))]
+    return ' '.join(terms)
+
+
+def search_text(conn: sqlite3.Connection, query: str, limit: int = 50,
+                unique_names: bool = True, raw: bool = False) -> List[Dict[str, Any]]:
+    """Ranked BM25 lookup of name, type line and oracle text in ``cards_fts``.
+
+    ``query`` is free text (see :func:`fts_query`) unless ``raw`` is set, in
+    which case it is passed to ``MATCH`` verbatim. With ``unique_names`` only
+    the best-ranked printing of each card name is returned.
+    """
+    match = query if raw else fts_query(query)
+    if not match:
+        return []
+    score = f"bm25(cards_fts, {', '.join(str(w) for w in FTS_WEIGHTS)})"
+    sql = f'SELECT card_id, name, type_line, oracle_text, {score} AS score FROM cards_fts WHERE cards_fts MATCH ?'
+    if unique_names:
+        # LIMIT -1 keeps SQLite from flattening bm25() into the aggregate query
+        sql = f'SELECT card_id, name, type_line, oracle_text, min(score) AS score FROM ({sql} LIMIT -1) GROUP BY name'
+    sql += ' ORDER BY score LIMIT ?'
+    return [
+        {'id': card_id, 'name': name, 'type_line': type_line, 'oracle_text': oracle_text, 'score': rank}
+        for card_id, name, type_line, oracle_text, rank in conn.execute(sql, (match, limit))
+    ]
+
+
+# Scryfall price fields kept in the typed ``prices`` table as integer cents
+# (hundredths of a ticket for tix). ``price_history`` stores, per card and
+# date, the change of each field since the previous entry (an absent price
+# counts as 0) plus a bit mask (bit = index here) of the fields that are absent.
+PRICE_FIELDS = ('usd', 'usd_foil', 'eur', 'tix')
+
+_PRICES_RE = re.compile(r'"prices"\s*:\s*(\{[^{}]*\})')
+_ID_RE = re.compile(r'"id"\s*:\s*"([^"]*)"')
+
+
+def price_cents(value: Any) -> Optional[int]:
+    """Scryfall price string ("1.23") in cents (123); None if absent or not a number."""
+    if value is None:
+        return None
+    try:
+        return int(round(float(value) * 100))
+    except (TypeError, ValueError):
+        return None
+
+
+def card_prices(prices: Optional[Dict[str, Any]]) -> Tuple[Optional[int], ...]:
+    """A card's ``prices`` object as a tuple of cents in PRICE_FIELDS order."""
+    prices = prices or {}
+    return tuple(price_cents(prices.get(field)) for field in PRICE_FIELDS)
+
+
+def price_history_delta(old: Sequence[Optional[int]], new: Sequence[Optional[int]]) -> tuple:
+    """The ``price_history`` values (deltas..., missing) for a change from ``old`` to ``new``."""
+    deltas = tuple((after or 0) - (before or 0) for before, after in zip(old, new))
+    missing = sum(1 << bit for bit, value in enumerate(new) if value is None)
+    return deltas + (missing,)
+
+
+def raw_card_prices(raw_card: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """(id, prices) of a card's JSON text without decoding the whole card.
+
+    The first ``"id"`` key is the card's own (nested objects come after it);
+    cards the patterns do not fit are decoded in full.
+    """
+    card_id = _ID_RE.search(raw_card)
+    prices = _PRICES_RE.search(raw_card)
+    if card_id and prices:
+        return card_id.group(1), _json.loads(prices.group(1))
+    card = _json.loads(raw_card)
+    return card.get('id'), card.get('prices')
+
+
+def read_price_history(conn: sqlite3.Connection, card_id: str) -> List[Dict[str, Any]]:
+    """Prices of one card by date, in cents, decoded from ``price_history``.
+
+    The same can be done in SQL with a running sum, e.g.
+    ``SUM(usd) OVER (PARTITION BY card_id ORDER BY date)``, NULL where the
+    field's bit is set in ``missing``.
+    """
+    totals = [0] * len(PRICE_FIELDS)
+    history = []
+    rows = conn.execute(f"SELECT date, {', '.join(PRICE_FIELDS)}, missing FROM price_history "
+                        'WHERE card_id = ? ORDER BY date', (card_id,))
+    for date, *deltas, missing in rows:
+        entry = {'date': date}
+        for bit, (field, delta) in enumerate(zip(PRICE_FIELDS, deltas)):
+            totals[bit] += delta
+            entry[field] = None if missing & (1 << bit) else totals[bit]
+        history.append(entry)
+    return history
+
+
+def iter_cursor_batches(cursor: sqlite3.Cursor, size: int = 5000) -> Iterator[List[tuple]]:
+    """Yield the rows of an executed query ``size`` at a time."""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def content_hash(data: str) -> str:
+    """Hash of a card's full JSON, stored per row so refreshes can skip unchanged cards."""
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def card_to_row(card: Dict[str, Any], codec: Optional[CardDataCodec] = None) -> tuple:
+    """Convert a Scryfall card object into a row tuple matching ``CARD_COLUMNS``.
+    
+    ``content_hash`` always covers the full JSON; ``codec`` only changes how
+    ``data`` is stored. The full JSON is compact and identical whichever JSON
+    codec wrote it, the small JSON columns keep the standard library's format.
+    """
+    data = _json.dumps(card)
+    return (
+        card.get('id'),
+        card.get('oracle_id'),
+        card.get('lang', 'en'),
+        card.get('name'),
+        card.get('mana_cost'),
+        card.get('cmc', 0.0),
+        card.get('type_line'),
+        card.get('oracle_text'),
+        card.get('power'),
+        card.get('toughness'),
+        json.dumps(card.get('colors', [])),
+        json.dumps(card.get('color_identity', [])),
+        json.dumps(card.get('keywords', [])),
+        json.dumps(card.get('legalities', {})),
+        json.dumps(card.get('produced_mana', [])),
+        json.dumps(card.get('card_faces', [])),
+        card.get('set_id'),
+        card.get('set'),
+        card.get('set_name'),
+        card.get('set_type'),
+        card.get('collector_number'),
+        card.get('rarity'),
+        card.get('released_at'),
+        card.get('artist'),
+        card.get('border_color'),
+        card.get('frame'),
+        card.get('image_status'),
+        json.dumps(card.get('image_uris', {})),
+        card.get('layout'),
+        int(card.get('reserved', False)),
+        int(card.get('foil', False)),
+        int(card.get('nonfoil', False)),
+        int(card.get('digital', False)),
+        int(card.get('reprint', False)),
+        int(card.get('story_spotlight', False)),
+        int(card.get('full_art', False)),
+        int(card.get('textless', False)),
+        card.get('tcgplayer_id'),
+        card.get('mtgo_id'),
+        card.get('arena_id'),
+        json.dumps(card.get('prices', {})),
+        codec.encode(card, data) if codec else data, # Keep the full JSON as a fallback
+        content_hash(data),
+        color_mask(card.get('colors')),
+        color_mask(card.get('color_identity')),
+        legality_mask(card.get('legalities')),
+        stat_number(card.get('power')),
+        stat_number(card.get('toughness')),
+    )
+
+
+# Defaults card_to_row stores for fields a card does not have, by column.
+RECORD_DEFAULTS = {
+    'lang': 'en', 'cmc': 0.0, 'colors': [], 'color_identity': [], 'keywords': [],
+    'legalities': {}, 'produced_mana': [], 'card_faces': [], 'image_uris': {}, 'prices': {},
+}
+
+
+def card_record(card: Dict[str, Any], include_card: bool = False) -> Dict[str, Any]:
+    """A Scryfall card as a normalized record: the ``cards`` columns (minus
+    ``data``/``content_hash``) with JSON columns as Python values and flags
+    as bools, the same values a database row holds.
+    
+    With ``include_card`` the full Scryfall dict is added under ``card``.
+    """
+    record = {}
+    for key, (column, kind) in SLIM_FIELDS.items():
+        value = card.get(key, RECORD_DEFAULTS.get(column))
+        record[column] = bool(value) if kind == 'bool' else value
+    record['colors_mask'] = color_mask(card.get('colors'))
+    record['color_identity_mask'] = color_mask(card.get('color_identity'))
+    record['legal_mask'] = legality_mask(card.get('legalities'))
+    record['power_num'] = stat_number(card.get('power'))
+    record['toughness_num'] = stat_number(card.get('toughness'))
+    if include_card:
+        record['card'] = card
+    return record
+
+
+def row_record(row: sqlite3.Row, reader: Optional[CardDataReader] = None) -> Dict[str, Any]:
+    """A ``cards`` row as the record :func:`card_record` makes from the card (``card`` added with a reader)."""
+    record = {}
+    for column, kind in SLIM_FIELDS.values():
+        value = row[column]
+        if kind == 'json':
+            value = json.loads(value) if value is not None else None
+        elif kind == 'bool':
+            value = bool(value)
+        record[column] = value
+    for column in ('colors_mask', 'color_identity_mask', 'legal_mask', 'power_num', 'toughness_num'):
+        record[column] = row[column]
+    if reader is not None:
+        record['card'] = reader.decode(row['data'], row)
+    return record
+
+
+def iter_chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group ``items`` into lists of up to ``size``."""
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Data codec of the current row-building worker process, see init_row_worker.
+_worker_codec: Optional[CardDataCodec] = None
+
+
+def init_row_worker(codec: Optional[CardDataCodec], json_codec: Optional[str] = None) -> None:
+    """Process-pool initializer that installs the build's ``data`` and JSON codecs."""
+    global _worker_codec
+    _worker_codec = codec
+    set_json_codec(json_codec)
+
+
+def rows_from_raw_cards(raw_cards: List[str]) -> List[tuple]:
+    """Decode a chunk of raw card JSON and convert it to rows (runs in worker processes)."""
+    return [card_to_row(_json.loads(raw), _worker_codec) for raw in raw_cards]
+
+
+class CardWriter(threading.Thread):
+    """Dedicated writer thread that owns the connection and the bulk-insert transaction.
+    
+    Producers hand over batches of rows through a bounded queue with
+    :meth:`put`, so parsing and row building never wait on SQLite (and vice
+    versa) beyond the queue depth. :meth:`close` commits everything that was
+    queued; :meth:`abort` rolls the whole transaction back instead.
+    """
+    
+    ABORT = object()  # queue sentinel: roll back rather than commit
+    
+    def __init__(self, conn: sqlite3.Connection, sql: str = INSERT_CARD_SQL, max_pending: int = 4):
+        super().__init__(name='sqlite-writer', daemon=True)
+        self.conn = conn
+        self.sql = sql
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.rows_written = 0
+        self.error: Optional[BaseException] = None
+        
+    def run(self) -> None:
+        try:
+            cursor = self.conn.cursor()
+            # Begin a single transaction – this is much faster than committing after
+            # every batch while still ensuring we don't use autocommit for each row.
+            self.conn.execute('BEGIN')
+            while True:
+                rows = self.pending.get()
+                if rows is None:
+                    break
+                if rows is self.ABORT:
+                    self.conn.rollback()
+                    return
+                cursor.executemany(self.sql, rows)
+                self.rows_written += len(rows)
+            # Commit the big transaction once all inserts are done
+            self.conn.commit()
+        except BaseException as e:
+            self.error = e
+            # Never leave a partial transaction behind for a later commit to pick up
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            
+    def put(self, rows: Optional[List[tuple]]) -> None:
+        """Queue a batch of rows (``None`` ends the stream), surfacing writer errors."""
+        while True:
+            if self.error is not None:
+                raise self.error
+            try:
+                self.pending.put(rows, timeout=0.5)
+                return
+            except queue.Full:
+                if not self.is_alive():
+                    raise RuntimeError("SQLite writer thread exited unexpectedly")
+                
+    def close(self) -> None:
+        """Flush the remaining batches, commit and wait for the writer to finish."""
+        self.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+            
+    def abort(self) -> None:
+        """Drop the queued batches, roll back and wait for the writer to finish."""
+        while self.is_alive():
+            try:
+                while True:
+                    self.pending.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self.pending.put(self.ABORT, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        self.join()
+
+
+def printed_name_key(name: str) -> str:
+    """Lookup key of a printed (possibly non-Latin) card name: NFKC-normalized and case-folded."""
+    return unicodedata.normalize('NFKC', name).casefold().strip()
+
+
+def lookup_printed_name(conn: sqlite3.Connection, name: str,
+                        lang: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Cards whose printed name is ``name``, from a ``cards-foreign.db`` connection.
+
+    Returns the ``oracle_id``, English ``name`` and ``lang`` of each match, so
+    the English printings can then be looked up in ``cards``.
+    """
+    sql = 'SELECT oracle_id, name, lang, printed_name FROM printed_names WHERE name_key = ?'
+    params = [printed_name_key(name)]
+    if lang is not None:
+        sql += ' AND lang = ?'
+        params.append(lang)
+    return [{'oracle_id': oracle_id, 'name': english, 'lang': card_lang, 'printed_name': printed}
+            for oracle_id, english, card_lang, printed in conn.execute(sql, params)]
+
+
+class ForeignPartition:
+    """Collects the non-English printings the English ingest skips into ``cards-foreign.db``.
+    
+    ``foreign_cards`` keeps the printed (translated) name, type line and text
+    of each printing next to its ids and English name; ``printed_names`` maps
+    :func:`printed_name_key` of every printed name (and face name) to the
+    ``oracle_id`` shared with the English ``cards`` rows.
+    """
+    
+    COLUMNS = ('id', 'oracle_id', 'lang', 'name', 'printed_name', 'type_line', 'printed_type_line',
+               'printed_text', 'set_code', 'collector_number', 'rarity', 'released_at', 'image_uris',
+               'card_faces')
+    
+    def __init__(self, path: Path, languages: Optional[Iterable[str]] = None, batch_size: int = 5000):
+        self.path = path
+        self.languages = set(languages) if languages is not None else None
+        self.batch_size = batch_size
+        self.counts = {'cards': 0, 'names': 0, 'ignored': 0}
+        self._rows: List[tuple] = []
+        self._names: List[tuple] = []
+        if path.exists():
+            path.unlink()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=OFF')
+        self.conn.execute('PRAGMA synchronous=OFF')
+        self.conn.execute(f"CREATE TABLE foreign_cards ({', '.join(self.COLUMNS)}, PRIMARY KEY (id)) WITHOUT ROWID")
+        self.conn.execute('''
+            CREATE TABLE printed_names (
+                name_key TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                oracle_id TEXT NOT NULL,
+                printed_name TEXT NOT NULL,
+                name TEXT,
+                PRIMARY KEY (name_key, lang, oracle_id)
+            ) WITHOUT ROWID
+        ''')
+    
+    def add(self, raw_card: str) -> None:
+        """Take one skipped card (its JSON text)."""
+        card = _json.loads(raw_card)
+        lang = card.get('lang')
+        if self.languages is not None and lang not in self.languages:
+            self.counts['ignored'] += 1
+            return
+        faces = card.get('card_faces') or []
+        printed_name = card.get('printed_name') or ' // '.join(
+            face.get('printed_name') or face.get('name') or '' for face in faces) or card.get('name')
+        self._rows.append((
+            card.get('id'), card.get('oracle_id'), lang, card.get('name'), printed_name,
+            card.get('type_line'), card.get('printed_type_line'), card.get('printed_text'),
+            card.get('set'), card.get('collector_number'), card.get('rarity'), card.get('released_at'),
+            json.dumps(card['image_uris']) if 'image_uris' in card else None,
+            json.dumps(faces) if faces else None,
+        ))
+        # Reversible cards only have oracle ids on their faces
+        oracle_id = card.get('oracle_id') or (faces[0].get('oracle_id') if faces else None)
+        if oracle_id:
+            names = {printed_name} | {face['printed_name'] for face in faces if face.get('printed_name')}
+            self._names.extend((printed_name_key(name), lang, oracle_id, name, card.get('name'))
+                               for name in names if name)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+    
+    def flush(self) -> None:
+        self.conn.executemany(f"INSERT OR REPLACE INTO foreign_cards VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                              self._rows)
+        self.conn.executemany('INSERT OR IGNORE INTO printed_names VALUES (?, ?, ?, ?, ?)', self._names)
+        self.counts['cards'] += len(self._rows)
+        self._rows, self._names = [], []
+    
+    def close(self) -> Dict[str, int]:
+        """Write what is pending, then index and analyze the partition; returns the counts."""
+        self.flush()
+        self.conn.execute('CREATE INDEX idx_foreign_oracle_id ON foreign_cards(oracle_id)')
+        self.conn.execute('CREATE INDEX idx_foreign_set_number ON foreign_cards(set_code, collector_number, lang)')
+        self.conn.execute('CREATE INDEX idx_printed_names_oracle_id ON printed_names(oracle_id)')
+        self.counts['names'] = self.conn.execute('SELECT COUNT(*) FROM printed_names').fetchone()[0]
+        self.conn.commit()
+        self.conn.execute('ANALYZE')
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.close()
+        return self.counts
+    
+    def discard(self) -> None:
+        """Drop an unfinished partition."""
+        self.conn.close()
+        if self.path.exists():
+            self.path.unlink()
+
+
+class DeltaTracker:
+    """Compares incoming rows with the content hashes already stored in ``cards``.
+    
+    :meth:`filter` drops rows whose hash is unchanged and counts inserts and
+    updates; ids that were never seen by the end of the run are returned by
+    :meth:`vanished_ids` so they can be deleted.
+    """
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self.existing = dict(conn.execute('SELECT id, content_hash FROM cards'))
+        self.counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+        # Ids written by this run, used to refresh tables derived from ``cards``.
+        self.changed_ids: List[str] = []
+        self._id_index = CARD_COLUMNS.index('id')
+        self._hash_index = CARD_COLUMNS.index('content_hash')
+        
+    def filter(self, rows: List[tuple]) -> List[tuple]:
+        """Return only the rows that are new or whose content changed."""
+        changed = []
+        for row in rows:
+            old_hash = self.existing.pop(row[self._id_index], None)
+            if old_hash is None:
+                self.counts['inserted'] += 1
+            elif old_hash == row[self._hash_index]:
+                self.counts['unchanged'] += 1
+                continue
+            else:
+                self.counts['updated'] += 1
+            changed.append(row)
+            self.changed_ids.append(row[self._id_index])
+        return changed
+        
+    def vanished_ids(self) -> List[str]:
+        """Ids present in the database but absent from the processed bulk data."""
+        return list(self.existing)
+
+
+class RangeNotSupportedError(IOError):
+    """Raised when the server answers a byte-range request with the full file."""
+
 
 class MTGDatabaseBuilder:
-    def __init__(self):
+    def __init__(self, bulk_api_url: str = SCRYFALL_BULK_API, connections: int = 1,
+                 force: bool = False, stream: bool = False, keep_raw: bool = False,
+                 workers: int = 1, incremental: bool = False, slim_data: bool = False,
+                 compress_data: Optional[str] = None, layout: str = 'default',
+                 page_size: Optional[int] = None, covering_indexes: bool = False,
+                 layout_report: bool = False, source_file: Optional[Path] = None,
+                 events: Optional[BuildEvents] = None, split_oracle: bool = False,
+                 prices_only: bool = False, bulk_type: Optional[str] = None,
+                 json_codec: Optional[str] = None, export: Optional[str] = None,
+                 languages: Optional[Sequence[str]] = None, patch: bool = False):
+        """
+        Args:
+            bulk_api_url: Bulk-data endpoint; point it at a local server for testing.
+            connections: Number of pooled connections used to fetch byte ranges of
+                the bulk file in parallel (1 = a single sequential stream).
+            force: Rebuild even if the bulk data has not changed since the last build.
+            incremental: Update the existing database in place, writing only new
+                or changed cards and deleting vanished ones, instead of rebuilding.
+            stream: Feed the HTTP response straight into the parser and database
+                instead of downloading ``cards.json`` first.
+            keep_raw: Keep ``cards.json`` after the build (in stream mode it is
+                written alongside the ingest).
+            workers: Processes used to turn raw cards into rows (0 = one per CPU).
+            slim_data: Leave fields that already have a column out of the ``data`` JSON.
+            compress_data: Compress ``data`` with a shared dictionary trained on
+                sample cards (``'zlib'``, or ``'zstd'`` if installed). Read it
+                back with :class:`CardDataReader`.
+            layout: Physical layout of the cards table, one of TABLE_LAYOUTS.
+            page_size: SQLite page size applied by the final VACUUM (default 4096).
+            covering_indexes: Replace the name/oracle_id/set indexes with the
+                covering indexes in COVERING_INDEXES.
+            layout_report: Time LAYOUT_REPORT_QUERIES and measure the size before
+                and after the layout stage, and record the result in metadata.json.
+            source_file: Build from this local bulk file (``.json`` or ``.json.gz``)
+                instead of downloading one, e.g. a synthetic corpus.
+            events: Receives structured phase/progress events; by default they are
+                only collected for the ``build_timings.json`` summary.
+            split_oracle: Store gameplay fields once per oracle_id in ``oracle_cards``
+                and per-printing fields in ``printings``, with a ``cards`` view of
+                the original shape (full builds only).
+            prices_only: Only refresh the ``prices`` and ``price_history`` tables of
+                the existing database from the (streamed) bulk data.
+            bulk_type: Scryfall bulk file (one of BULK_TYPES); by default
+                ``default_cards``, which has every English printing.
+            json_codec: JSON library for parsing and the ``data`` column ('orjson',
+                'msgspec' or 'json'); by default the fastest one installed.
+            export: Also write the card table as ``cards.parquet`` or ``cards.arrow``
+                (one of EXPORT_FORMATS) for the embedding builders; needs pyarrow.
+            languages: Also keep non-English printings of these languages (``['all']``
+                for every one) in ``cards-foreign.db`` with a printed-name index;
+                builds from ``all_cards`` unless ``bulk_type`` says otherwise.
+            patch: On full builds, write ``cards.patch`` from the cards.db being
+                replaced to the new one (see card_patch.apply_patch).
+        """
+        self.bulk_api_url = bulk_api_url
+        self.connections = max(1, connections)
+        self.force = force
+        self.incremental = incremental
+        self.stream = stream
+        self.keep_raw = keep_raw
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.slim_data = slim_data
+        self.compress_data = compress_data
+        self.layout = layout
+        if layout == 'without-rowid' and not (slim_data or compress_data):
+            # Full card JSON rows overflow the clustered b-tree pages, which
+            # makes the database far larger than the rowid layout
+            print("⚠️ The 'without-rowid' layout needs --slim-data or --compress-data; using the default layout")
+            self.layout = 'default'
+        self.page_size = page_size
+        self.covering_indexes = covering_indexes
+        self.layout_report = layout_report
+        self.source_file = Path(source_file) if source_file else None
+        self.events = events or BuildEvents('cards', summary_file=TIMINGS_FILE)
+        self.split_oracle = split_oracle
+        self.prices_only = prices_only
+        if bulk_type is not None and bulk_type not in BULK_TYPES:
+            raise ValueError(f"Unknown bulk type '{bulk_type}', expected one of {', '.join(BULK_TYPES)}")
+        self.bulk_type = bulk_type
+        self.json_codec = set_json_codec(json_codec).name
+        if export is not None and export not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{export}', expected one of {', '.join(EXPORT_FORMATS)}")
+        self.export = export
+        # Whether to build cards-foreign.db, and for which languages (None = all)
+        self.foreign_partition = languages is not None
+        self.foreign_languages = (None if languages is None or 'all' in languages
+                                  else {lang for lang in languages if lang != 'en'})
+        if self.foreign_languages is not None and not self.foreign_languages:
+            raise ValueError("languages must name at least one non-English language (or 'all')")
+        self.patch = patch
+        # Partition receiving the skipped non-English cards during process_cards().
+        self.foreign: Optional[ForeignPartition] = None
+        # Bytes transferred (compressed, if so encoded) by the last download or stream.
+        self.bytes_downloaded = 0
+        # Before/after figures of the last layout stage (only with layout_report).
+        self.last_layout_report: Optional[Dict[str, Any]] = None
+        # Codec used for the ``data`` column of the current build (set while processing).
+        self.data_codec: Optional[CardDataCodec] = None
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'User-Agent': 'DesktopMTG/1.0 Python Builder',
             'Accept': 'application/json'
         })
         
+    def choose_bulk_type(self) -> str:
+        """The Scryfall bulk file to build from: the requested one, else the smallest with every printing needed.
+        
+        That is ``all_cards`` for a foreign-language partition and
+        ``default_cards`` (every English printing) otherwise.
+        """
+        if self.bulk_type:
+            return self.bulk_type
+        return 'all_cards' if self.foreign_partition else DEFAULT_BULK_TYPE
+        
     def get_bulk_data_info(self) -> Dict[str, Any]:
         """Get information about available bulk data"""
         print("📡 Fetching bulk data information from Scryfall...")
         
-        response = self.session.get(SCRYFALL_BULK_API, timeout=30)
+        response = self.session.get(self.bulk_api_url, timeout=30)
         response.raise_for_status()
         
         bulk_data = response.json()
+        available = {item['type']: item for item in bulk_data['data']}
         
-        # Find the "all_cards" bulk data
-        all_cards = next((item for item in bulk_data['data'] if item['type'] == 'all_cards'), None)
-        if not all_cards:
-            raise ValueError("All cards bulk data not found")
+        bulk_type = self.choose_bulk_type()
+        bulk_info = available.get(bulk_type)
+        if bulk_info is None and self.bulk_type is None and 'all_cards' in available:
+            # all_cards holds every printing in every language, a superset
+            print(f"⚠️ {bulk_type} bulk data not offered, using all_cards")
+            bulk_info = available['all_cards']
+        if not bulk_info:
+            raise ValueError(f"{bulk_type} bulk data not found")
             
-        print(f"📋 Found bulk data: {all_cards['name']}")
-        print(f"📦 Size: {all_cards['size'] / 1024 / 1024:.1f} MB")
-        print(f"📅 Updated: {all_cards['updated_at']}")
+        print(f"📋 Found bulk data: {bulk_info['name']} ({bulk_info['type']})")
+        print(f"📦 Size: {bulk_info['size'] / 1024 / 1024:.1f} MB")
+        print(f"📅 Updated: {bulk_info['updated_at']}")
         
-        return all_cards
+        return bulk_info
+        
+    def get_file_info(self, path: Path) -> Dict[str, Any]:
+        """Bulk data information for a local bulk file, shaped like the API's."""
+        stat = path.stat()
+        print(f"📋 Using local bulk data: {path}")
+        print(f"📦 Size: {stat.st_size / 1024 / 1024:.1f} MB")
+        return {
+            'type': 'local_file',
+            'name': path.name,
+            'download_uri': path.resolve().as_uri(),
+            'size': stat.st_size,
+            'updated_at': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        }
+        
+    def is_up_to_date(self, bulk_info: Dict[str, Any], key: str = 'updated_at') -> bool:
+        """Return True if the last build used the same bulk dump and its database still exists.
+        
+        ``key`` is the metadata entry to compare, ``prices_updated_at`` for a
+        prices-only refresh.
+        """
+        if not DATABASE_FILE.exists() or not METADATA_FILE.exists():
+            return False
+        try:
+            with open(METADATA_FILE, 'r') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if metadata.get('type') != bulk_info.get('type'):
+            return False
+        if self.foreign_partition and not FOREIGN_DATABASE_FILE.exists():
+            return False
+        return bool(metadata.get(key)) and metadata.get(key) == bulk_info.get('updated_at')
+        
+    def _load_download_state(self, bulk_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Load the saved download state if it belongs to the same bulk dump."""
+        if not DOWNLOAD_STATE_FILE.exists():
+            return None
+        try:
+            with open(DOWNLOAD_STATE_FILE, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (state.get('updated_at') != bulk_info.get('updated_at')
+                or state.get('download_uri') != bulk_info.get('download_uri')):
+            return None
+        return state
+        
+    def _save_download_state(self, state: Dict[str, Any]) -> None:
+        with open(DOWNLOAD_STATE_FILE, 'w') as f:
+            json.dump(state, f)
+        
+    def _probe_download(self, url: str) -> Dict[str, Any]:
+        """HEAD the bulk file to learn its size and whether byte ranges are supported."""
+        try:
+            response = self.session.head(url, timeout=30, allow_redirects=True,
+                                         headers={'Accept-Encoding': 'identity'})
+            response.raise_for_status()
+        except requests.RequestException:
+            return {'size': None, 'ranges': False}
+        size = response.headers.get('content-length')
+        return {
+            'size': int(size) if size and size.isdigit() else None,
+            'ranges': response.headers.get('accept-ranges', '').lower() == 'bytes',
+        }
         
     def download_bulk_data(self, bulk_info: Dict[str, Any]) -> None:
-        """Download bulk data file"""
+        """Download bulk data file, resuming a previous partial download when possible"""
+        state = self._load_download_state(bulk_info)
         if CARDS_FILE.exists():
-            print(f"📁 Cards file already exists: {CARDS_FILE}")
-            return
+            if state and state.get('complete') and CARDS_FILE.stat().st_size == state.get('size'):
+                print(f"📁 Cards file already downloaded: {CARDS_FILE}")
+                return
+            CARDS_FILE.unlink()
+            
+        url = bulk_info['download_uri']
+        print(f"⬇️ Downloading bulk data from {url}")
+        
+        probe = self._probe_download(url)
+        total_size = probe['size'] or bulk_info.get('size')
+        
+        if state is None or state.get('size') != total_size or not PARTIAL_CARDS_FILE.exists():
+            # Nothing usable to resume from – start over.
+            if PARTIAL_CARDS_FILE.exists():
+                PARTIAL_CARDS_FILE.unlink()
+            state = {
+                'updated_at': bulk_info.get('updated_at'),
+                'download_uri': url,
+                'size': total_size,
+            }
+        else:
+            print(f"↩️ Resuming partial download: {PARTIAL_CARDS_FILE}")
+            
+        if self.connections > 1 and probe['ranges'] and total_size:
+            try:
+                self._download_ranges(url, state)
+            except RangeNotSupportedError:
+                print("⚠️ Server does not honour range requests, falling back to a single connection")
+                self._download_sequential(url, state)
+        else:
+            self._download_sequential(url, state)
+            
+        actual_size = PARTIAL_CARDS_FILE.stat().st_size
+        if total_size and actual_size != total_size:
+            PARTIAL_CARDS_FILE.unlink()
+            DOWNLOAD_STATE_FILE.unlink()
+            raise IOError(f"Downloaded {actual_size:,} bytes but expected {total_size:,}")
             
-        print(f"⬇️ Downloading bulk data from {bulk_info['download_uri']}")
+        PARTIAL_CARDS_FILE.replace(CARDS_FILE)
+        self.events.progress('download', actual_size, total_size, unit='bytes', force=True)
+        state['size'] = actual_size
+        state['complete'] = True
+        state.pop('segments', None)
+        self._save_download_state(state)
+        print(f"✅ Download complete: {CARDS_FILE} ({actual_size / 1024 / 1024:.1f} MB)")
         
-        response = self.session.get(bulk_info['download_uri'], stream=True, timeout=300)
+    def _download_sequential(self, url: str, state: Dict[str, Any]) -> None:
+        """Fetch the file on one connection, continuing from the end of the partial file."""
+        offset = PARTIAL_CARDS_FILE.stat().st_size if PARTIAL_CARDS_FILE.exists() else 0
+        if state.get('segments'):
+            # A previous ranged download leaves a pre-allocated file with holes.
+            offset = 0
+        # Resuming needs byte offsets into the plain file, not into a
+        # compressed transfer.
+        headers = {}
+        if offset:
+            headers = {'Accept-Encoding': 'identity', 'Range': f'bytes={offset}-'}
+            
+        response = self.session.get(url, stream=True, timeout=300, headers=headers)
+        if response.status_code == 416:
+            # Requested range starts at the end of the file – it is already complete.
+            return
         response.raise_for_status()
+        if offset and response.status_code != 206:
+            print("⚠️ Server ignored the range request, restarting download")
+            offset = 0
+        state.pop('segments', None)
+        self._save_download_state(state)
         
-        total_size = int(response.headers.get('content-length', 0))
-        downloaded = 0
+        total_size = state.get('size') or 0
+        downloaded = offset
+        next_report = downloaded + 10 * 1024 * 1024
         
-        with open(CARDS_FILE, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
+        with open(PARTIAL_CARDS_FILE, 'ab' if offset else 'wb') as f:
+            for chunk in response.iter_content(chunk_size=BULK_READ_SIZE):
                 if chunk:
                     f.write(chunk)
                     downloaded += len(chunk)
                     
+                    self.events.progress('download', downloaded, total_size or None, unit='bytes')
                     # Progress update every 10MB
-                    if downloaded % (10 * 1024 * 1024) < 8192:
+                    if downloaded >= next_report:
+                        next_report += 10 * 1024 * 1024
                         progress = (downloaded / total_size * 100) if total_size else 0
                         print(f"📥 Progress: {progress:.1f}% ({downloaded / 1024 / 1024:.1f} MB)")
+        self.bytes_downloaded = response.raw.tell()
+        if response.headers.get('content-encoding'):
+            print(f"🗜️ {response.headers['content-encoding']} transfer: {self.bytes_downloaded / 1024 / 1024:.1f} MB "
+                  f"for {(downloaded - offset) / 1024 / 1024:.1f} MB of JSON")
+        
+    def _download_ranges(self, url: str, state: Dict[str, Any]) -> None:
+        """Fetch byte ranges of the file concurrently over the pooled connections.
+        
+        The partial file is pre-allocated to its final size and every worker
+        writes its own segment in place. Per-segment progress is checkpointed in
+        the state file so an interrupted download only refetches what is missing.
+        """
+        total_size = state['size']
+        segments = state.get('segments')
+        if not segments:
+            step = -(-total_size // self.connections)
+            segments = [[start, min(start + step, total_size), 0]
+                        for start in range(0, total_size, step)]
+            state['segments'] = segments
+            with open(PARTIAL_CARDS_FILE, 'wb') as f:
+                f.truncate(total_size)
+        self._save_download_state(state)
+        
+        lock = threading.Lock()
+        progress = {'downloaded': sum(done for _, _, done in segments),
+                    'next_report': 10 * 1024 * 1024}
         
-        print(f"✅ Download complete: {CARDS_FILE}")
+        def fetch(segment):
+            start, end, done = segment
+            if start + done >= end:
+                return
+            headers = {'Accept-Encoding': 'identity', 'Range': f'bytes={start + done}-{end - 1}'}
+            response = self.session.get(url, stream=True, timeout=300, headers=headers)
+            response.raise_for_status()
+            if response.status_code != 206:
+                response.close()
+                raise RangeNotSupportedError("Server ignored the range request")
+            unsaved = 0
+            try:
+                with open(PARTIAL_CARDS_FILE, 'r+b') as f:
+                    f.seek(start + done)
+                    for chunk in response.iter_content(chunk_size=BULK_READ_SIZE):
+                        if not chunk:
+                            continue
+                        chunk = chunk[:end - start - done]
+                        f.write(chunk)
+                        done += len(chunk)
+                        unsaved += len(chunk)
+                        with lock:
+                            progress['downloaded'] += len(chunk)
+                            self.events.progress('download', progress['downloaded'], total_size, unit='bytes')
+                            if unsaved >= DOWNLOAD_CHECKPOINT_BYTES:
+                                f.flush()
+                                segment[2] = done
+                                unsaved = 0
+                                self._save_download_state(state)
+                            if progress['downloaded'] >= progress['next_report']:
+                                progress['next_report'] += 10 * 1024 * 1024
+                                pct = progress['downloaded'] / total_size * 100
+                                print(f"📥 Progress: {pct:.1f}% ({progress['downloaded'] / 1024 / 1024:.1f} MB)")
+                        if start + done >= end:
+                            break
+            finally:
+                # Record what reached the file even if the connection dropped.
+                with lock:
+                    segment[2] = done
+                    self._save_download_state(state)
+            if start + done != end:
+                raise IOError(f"Range {start}-{end - 1} ended early at {start + done}")
         
-    def _apply_sqlite_optimizations(self, conn: sqlite3.Connection) -> None:
+        print(f"🔀 Downloading {len(segments)} byte ranges over {self.connections} connections")
+        with ThreadPoolExecutor(max_workers=self.connections) as pool:
+            for future in [pool.submit(fetch, segment) for segment in segments]:
+                future.result()
+        self.bytes_downloaded = progress['downloaded']
+        
+    def iter_cards(self, source: Any = None, lang: Optional[str] = 'en',
+                   layouts: Optional[Iterable[str]] = None, sets: Optional[Iterable[str]] = None,
+                   chunk_size: Optional[int] = None, include_card: bool = False) -> Iterator[Any]:
+        """Stream normalized card records (see :func:`card_record`) at constant memory.
+        
+        ``source`` is one of:
+          * None: this builder's source, i.e. ``source_file`` or the bulk data
+            streamed from ``bulk_api_url``
+          * a path to a bulk JSON (or ``.json.gz``) file
+          * a path to a ``.db``/``.sqlite`` file or an open ``sqlite3.Connection``
+            built by this script
+          * a binary file object or an iterable of bytes chunks holding bulk JSON
+        Records are kept when their ``lang`` matches (None = every language),
+        their ``layout`` is in ``layouts`` and their set code is in ``sets``
+        (None = no filter). With ``chunk_size`` lists of up to that many
+        records are yielded instead of single records. ``include_card`` adds
+        the full Scryfall dict under ``card``.
+        """
+        layouts = set(layouts) if layouts is not None else None
+        sets = {code.lower() for code in sets} if sets is not None else None
+        
+        if isinstance(source, (str, Path)) and Path(source).suffix in ('.db', '.sqlite'):
+            source = sqlite3.connect(str(source))
+        if isinstance(source, sqlite3.Connection):
+            records = self._iter_database_records(source, lang, layouts, sets, include_card)
+        else:
+            if source is None:
+                bulk_info = (self.get_file_info(self.source_file) if self.source_file is not None
+                             else self.get_bulk_data_info())
+                chunks, _ = self._open_chunks(bulk_info)
+            elif isinstance(source, (str, Path)):
+                chunks = iter_path_chunks(Path(source))
+                if Path(source).suffix == '.gz':
+                    chunks = iter_gunzip(chunks)
+            elif hasattr(source, 'read'):
+                chunks = iter_file_chunks(source)
+            else:
+                chunks = source
+            records = (card_record(card, include_card) for card in iter_bulk_cards(chunks, lang=lang)
+                       if (layouts is None or card.get('layout') in layouts)
+                       and (sets is None or (card.get('set') or '').lower() in sets))
+        return iter_chunked(records, chunk_size) if chunk_size else records
+        
+    def _iter_database_records(self, conn: sqlite3.Connection, lang: Optional[str],
+                               layouts: Optional[set], sets: Optional[set],
+                               include_card: bool) -> Iterator[Dict[str, Any]]:
+        """Records of the ``cards`` rows matching the filters, read in batches."""
+        clauses, params = [], []
+        if lang is not None:
+            clauses.append('lang = ?')
+            params.append(lang)
+        for column, values in (('layout', layouts), ('set_code', sets)):
+            if values is not None:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(sorted(values))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        reader = CardDataReader(conn) if include_card else None
+        # a separate cursor with its own row factory leaves the connection as it was
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute(f'SELECT * FROM cards{where}', params)
+        for batch in iter_cursor_batches(cursor):
+            for row in batch:
+                yield row_record(row, reader)
+                
+    def _open_chunks(self, bulk_info: Dict[str, Any]) -> Tuple[Iterable[bytes], Optional[int]]:
+        """Raw chunks of the local source file or the streamed download, and their size if known."""
+        if self.source_file is not None:
+            chunks = iter_path_chunks(self.source_file)
+            if self.source_file.suffix == '.gz':
+                # progress counts decompressed bytes, so the size is unknown
+                return iter_gunzip(chunks), None
+            return chunks, bulk_info['size']
+        # Download and insert overlap: the response is read on a background
+        # thread while this one parses and writes rows.
+        return iter_prefetched(self.stream_bulk_data(bulk_info)), bulk_info.get('size')
+        
+    def stream_bulk_data(self, bulk_info: Dict[str, Any]) -> Iterator[bytes]:
+        """Yield the decoded bulk file straight from the HTTP response.
+        
+        A compressed transfer encoding is decoded transparently. With
+        ``keep_raw`` the decoded bytes are also written to ``cards.json``;
+        otherwise nothing touches the disk.
+        """
+        url = bulk_info['download_uri']
+        print(f"⬇️ Streaming bulk data from {url}")
+        
+        response = self.session.get(url, stream=True, timeout=300)
+        response.raise_for_status()
+        
+        chunks = response.iter_content(chunk_size=BULK_READ_SIZE)
+        raw_file = open(STREAM_CARDS_FILE, 'wb') if self.keep_raw else None
+        complete = False
+        try:
+            for chunk in chunks:
+                if raw_file:
+                    raw_file.write(chunk)
+                self.events.progress('download', response.raw.tell(), bulk_info.get('size'), unit='bytes')
+                yield chunk
+            complete = True
+        finally:
+            response.close()
+            if raw_file:
+                raw_file.close()
+                if not complete:
+                    STREAM_CARDS_FILE.unlink()
+                
+        if raw_file:
+            STREAM_CARDS_FILE.replace(CARDS_FILE)
+            # Lets a later download reuse the kept file instead of fetching it again
+            self._save_download_state({'updated_at': bulk_info.get('updated_at'), 'download_uri': url,
+                                       'size': CARDS_FILE.stat().st_size, 'complete': True})
+            print(f"💾 Raw bulk data kept: {CARDS_FILE}")
+        self.bytes_downloaded = response.raw.tell()
+        self.events.progress('download', self.bytes_downloaded, bulk_info.get('size'), unit='bytes', force=True)
+        print(f"✅ Stream complete ({self.bytes_downloaded / 1024 / 1024:.1f} MB transferred)")
+        
+    def _apply_sqlite_optimizations(self, conn: sqlite3.Connection, durable: bool = False) -> None:
         """Apply PRAGMA settings that speed up bulk inserts. These settings should only
         be used while **building** the database – they trade resiliency for speed.
+        
+        With ``durable=True`` (updating a database in place) a WAL journal is kept
+        so an interrupted update cannot corrupt the existing data.
         """
         cursor = conn.cursor()
+        if durable:
+            pragmas = [
+                "PRAGMA journal_mode=WAL",
+                "PRAGMA synchronous=NORMAL",
+                "PRAGMA temp_store=MEMORY",
+                "PRAGMA cache_size=-32768"
+            ]
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            conn.commit()
+            return
         # Disable the rollback journal & fsync ‑ we don't need durability while
         # the database is being built and no other process is using it.
         pragmas = [
@@ -105,30 +1700,472 @@ class MTGDatabaseBuilder:
         """Create indexes after the bulk insert step for much faster overall build."""
         cursor = conn.cursor()
         indexes = [
-            'CREATE INDEX idx_name            ON cards(name)',
-            'CREATE INDEX idx_name_lower      ON cards(lower(name))',
-            'CREATE INDEX idx_oracle_id       ON cards(oracle_id)',
-            'CREATE INDEX idx_set            ON cards(set_code)',
-            'CREATE INDEX idx_type           ON cards(type_line)',
-            'CREATE INDEX idx_rarity         ON cards(rarity)',
-            'CREATE INDEX idx_colors         ON cards(colors)',
-            'CREATE INDEX idx_color_identity ON cards(color_identity)',
-            'CREATE INDEX idx_cmc            ON cards(cmc)'
+            'CREATE INDEX IF NOT EXISTS idx_name            ON cards(name)',
+            'CREATE INDEX IF NOT EXISTS idx_name_lower      ON cards(lower(name))',
+            'CREATE INDEX IF NOT EXISTS idx_oracle_id       ON cards(oracle_id)',
+            'CREATE INDEX IF NOT EXISTS idx_set            ON cards(set_code)',
+            'CREATE INDEX IF NOT EXISTS idx_type           ON cards(type_line)',
+            'CREATE INDEX IF NOT EXISTS idx_rarity         ON cards(rarity)',
+            'CREATE INDEX IF NOT EXISTS idx_colors         ON cards(colors)',
+            'CREATE INDEX IF NOT EXISTS idx_color_identity ON cards(color_identity)',
+            'CREATE INDEX IF NOT EXISTS idx_cmc            ON cards(cmc)',
+            'CREATE INDEX IF NOT EXISTS idx_colors_mask    ON cards(colors_mask)',
+            'CREATE INDEX IF NOT EXISTS idx_identity_mask  ON cards(color_identity_mask)',
+            'CREATE INDEX IF NOT EXISTS idx_power_num      ON cards(power_num)',
+            'CREATE INDEX IF NOT EXISTS idx_toughness_num  ON cards(toughness_num)',
+            'CREATE INDEX IF NOT EXISTS idx_card_types     ON card_types(kind, name, card_id)',
+            'CREATE INDEX IF NOT EXISTS idx_card_types_card ON card_types(card_id)',
+            'CREATE INDEX IF NOT EXISTS idx_card_keywords  ON card_keywords(keyword, card_id)',
+            'CREATE INDEX IF NOT EXISTS idx_card_keywords_card ON card_keywords(card_id)',
         ]
+        # Legal-in-format + identity lookups ("commander, within {U,G}") for the
+        # popular formats; the expression must match legality_clause().
+        indexes += [
+            f'CREATE INDEX IF NOT EXISTS idx_legal_{fmt} ON cards({legality_expression(fmt)}, color_identity_mask)'
+            for fmt in INDEXED_LEGALITY_FORMATS
+        ]
+        split = is_split_database(conn)
+        if split:
+            indexes = [split_index_sql(index) for index in indexes]
+        # Once a database has covering indexes it keeps them on later updates
+        # (they would span both tables of a split database, so not there)
+        existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        if not split and (self.covering_indexes or existing & set(COVERING_INDEXES)):
+            for name, (columns, replaces) in COVERING_INDEXES.items():
+                indexes = [index for index in indexes if f' {replaces} ' not in index]
+                indexes.append(f'CREATE INDEX IF NOT EXISTS {name} ON cards({columns})')
+                cursor.execute(f'DROP INDEX IF EXISTS {replaces}')
         for index in indexes:
             cursor.execute(index)
         conn.commit()
         print("✅ Indexes created")
         
-    def create_database(self) -> sqlite3.Connection:
+    def _create_data_dictionaries_table(self, conn: sqlite3.Connection) -> None:
+        """Table of the dictionaries compressed ``data`` values refer to by id."""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS data_dictionaries (
+                id INTEGER PRIMARY KEY,
+                codec TEXT NOT NULL,
+                dictionary BLOB NOT NULL,
+                created_at TEXT
+            )
+        ''')
+        
+    def _create_filter_tables(self, conn: sqlite3.Connection) -> None:
+        """Junction tables for type-line parts and keywords, plus the legality bit map."""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS card_types (
+                card_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                name TEXT NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS card_keywords (
+                card_id TEXT NOT NULL,
+                keyword TEXT NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS legality_formats (
+                format TEXT PRIMARY KEY,
+                bit INTEGER NOT NULL
+            )
+        ''')
+        conn.executemany('INSERT OR REPLACE INTO legality_formats (format, bit) VALUES (?, ?)',
+                         [(fmt, bit) for bit, fmt in enumerate(LEGALITY_FORMATS)])
+        
+    def build_filter_tables(self, conn: sqlite3.Connection, ids: Optional[Sequence[str]] = None) -> None:
+        """(Re)populate ``card_types`` and ``card_keywords`` from the ``cards`` table.
+        
+        With ``ids`` only those cards are refreshed (an incremental update),
+        otherwise both tables are rebuilt from scratch.
+        """
+        cursor = conn.cursor()
+        if ids is None:
+            cursor.execute('DELETE FROM card_types')
+            cursor.execute('DELETE FROM card_keywords')
+            # read through a second cursor in batches instead of holding every row
+            rows = iter_cursor_batches(conn.execute('SELECT id, type_line, card_faces, keywords FROM cards'))
+        else:
+            id_rows = [(card_id,) for card_id in ids]
+            cursor.executemany('DELETE FROM card_types WHERE card_id = ?', id_rows)
+            cursor.executemany('DELETE FROM card_keywords WHERE card_id = ?', id_rows)
+            rows = []
+            for start in range(0, len(ids), 500):
+                chunk = list(ids[start:start + 500])
+                rows.append(cursor.execute(
+                    f"SELECT id, type_line, card_faces, keywords FROM cards WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk).fetchall())
+                    
+        type_count = keyword_count = 0
+        for batch in rows:
+            type_rows = []
+            keyword_rows = []
+            for card_id, type_line, card_faces, keywords in batch:
+                if not type_line and card_faces:
+                    type_line = ' // '.join(face.get('type_line') or '' for face in json.loads(card_faces))
+                type_rows.extend((card_id, kind, name) for kind, name in parse_type_line(type_line))
+                keyword_rows.extend((card_id, keyword) for keyword in dict.fromkeys(json.loads(keywords or '[]')))
+            cursor.executemany('INSERT INTO card_types (card_id, kind, name) VALUES (?, ?, ?)', type_rows)
+            cursor.executemany('INSERT INTO card_keywords (card_id, keyword) VALUES (?, ?)', keyword_rows)
+            type_count += len(type_rows)
+            keyword_count += len(keyword_rows)
+        conn.commit()
+        print(f"✅ Filter tables built ({type_count:,} type parts, {keyword_count:,} keywords)")
+        
+    def _layout_snapshot(self, conn: sqlite3.Connection, sample: Dict[str, Any],
+                         repeat: int = 20) -> Dict[str, Any]:
+        """Database size and median timings (ms) of LAYOUT_REPORT_QUERIES."""
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        timings = {}
+        for label, (sql, fields) in LAYOUT_REPORT_QUERIES.items():
+            params = tuple(sample[field] for field in fields)
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(sql, params).fetchall()
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[label] = round(sorted(samples)[len(samples) // 2], 3)
+        return {'size_mb': round(page_size * page_count / 1024 / 1024, 1),
+                'page_size': page_size, 'query_ms': timings}
+        
+    def optimize_layout(self, conn: sqlite3.Connection) -> None:
+        """Layout stage of a full build, run once data, tables and indexes exist.
+        
+        Rewrites the cards table into the configured layout, VACUUMs (applying
+        ``page_size``) and refreshes the planner statistics with ANALYZE and
+        ``PRAGMA optimize``.
+        """
+        start_time = time.time()
+        cursor = conn.cursor()
+        sample = None
+        if self.layout_report:
+            count = cursor.execute('SELECT count(*) FROM cards').fetchone()[0]
+            row = cursor.execute('SELECT id, name, oracle_id, set_code FROM cards LIMIT 1 OFFSET ?',
+                                 (count // 2,)).fetchone()
+            sample = dict(zip(('id', 'name', 'oracle_id', 'set_code'), row or (None,) * 4))
+            before = self._layout_snapshot(conn, sample)
+            
+        if self.layout != 'default' and is_split_database(conn):
+            print(f"ℹ️ Layout '{self.layout}' applies to a cards table, not the oracle split; keeping the default")
+        elif self.layout != 'default':
+            # Copy the rows into a fresh table in key order, so pages fill up
+            # sequentially instead of by random UUID, then swap it in.
+            table_sql = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'cards'").fetchone()[0]
+            table_sql = re.sub(r'\s*WITHOUT ROWID\s*$', '', table_sql.replace('CREATE TABLE cards', 'CREATE TABLE cards_layout', 1))
+            if self.layout == 'without-rowid':
+                table_sql += ' WITHOUT ROWID'
+                order_by = 'id'
+            else:
+                order_by = 'name, oracle_id, released_at, id'
+            cursor.execute('DROP TABLE IF EXISTS cards_layout')
+            cursor.execute(table_sql)
+            cursor.execute(f'INSERT INTO cards_layout SELECT * FROM cards ORDER BY {order_by}')
+            cursor.execute('DROP TABLE cards')
+            cursor.execute('ALTER TABLE cards_layout RENAME TO cards')
+            conn.commit()
+            self._create_indexes(conn)
+            
+        if self.page_size:
+            cursor.execute(f'PRAGMA page_size = {int(self.page_size)}')
+        # VACUUM copies the whole database through a temp database; keep that
+        # on disk rather than in RAM (temp_store=MEMORY is set for the build).
+        cursor.execute('PRAGMA temp_store=DEFAULT')
+        cursor.execute('VACUUM')
+        cursor.execute('ANALYZE')
+        cursor.execute('PRAGMA optimize')
+        conn.commit()
+        print(f"✅ Layout '{self.layout}' applied and statistics gathered in {time.time() - start_time:.1f} seconds")
+        
+        if self.layout_report:
+            after = self._layout_snapshot(conn, sample)
+            self.last_layout_report = {'layout': self.layout, 'covering_indexes': self.covering_indexes,
+                                       'before': before, 'after': after}
+            print(f"📏 Size: {before['size_mb']} MB → {after['size_mb']} MB "
+                  f"(page size {before['page_size']} → {after['page_size']})")
+            for label in LAYOUT_REPORT_QUERIES:
+                print(f"   ⏱️ {label:<20} {before['query_ms'][label]:>8.3f} ms → {after['query_ms'][label]:>8.3f} ms")
+        
+    def split_oracle_tables(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        """Move ``cards`` into ``oracle_cards`` + ``printings`` and replace it with a view.
+        
+        Gameplay columns (ORACLE_COLUMNS) are taken from the newest printing of
+        each oracle card. The ``cards`` view has the columns of the old table in
+        the same order, so readers do not notice the difference.
+        """
+        cursor = conn.cursor()
+        column_types = {row[1]: (row[2], row[3]) for row in cursor.execute('PRAGMA table_info(cards)')}
+        
+        def definitions(columns):
+            return ', '.join(f"{column} {column_types[column][0]}{' NOT NULL' if column_types[column][1] else ''}"
+                             for column in columns)
+            
+        cursor.execute('DROP TABLE IF EXISTS oracle_cards')
+        cursor.execute('DROP TABLE IF EXISTS printings')
+        cursor.execute(f'CREATE TABLE oracle_cards (oracle_id TEXT PRIMARY KEY, {definitions(ORACLE_COLUMNS)}, '
+                       'printings INTEGER NOT NULL)')
+        # Bare columns next to max() come from the row holding the maximum,
+        # i.e. the newest printing.
+        cursor.execute(f'''
+            INSERT INTO oracle_cards (oracle_id, {', '.join(ORACLE_COLUMNS)}, printings)
+            SELECT oracle_key, {', '.join(ORACLE_COLUMNS)}, printings FROM (
+                SELECT {ORACLE_KEY_SQL} AS oracle_key, {', '.join(ORACLE_COLUMNS)},
+                       max(released_at) AS newest, COUNT(*) AS printings
+                FROM cards GROUP BY oracle_key
+            )
+        ''')
+        cursor.execute(f'CREATE TABLE printings (id TEXT PRIMARY KEY, oracle_key TEXT NOT NULL, '
+                       f'{definitions(PRINTING_COLUMNS[1:])})')
+        cursor.execute(f'''
+            INSERT INTO printings (id, oracle_key, {', '.join(PRINTING_COLUMNS[1:])})
+            SELECT id, {ORACLE_KEY_SQL}, {', '.join(PRINTING_COLUMNS[1:])} FROM cards
+        ''')
+        cursor.execute('DROP TABLE cards')
+        view_columns = ', '.join(f"{'o' if column in ORACLE_COLUMNS else 'p'}.{column} AS {column}"
+                                 for column in CARD_COLUMNS)
+        cursor.execute(f'CREATE VIEW cards AS SELECT {view_columns} '
+                       'FROM printings p JOIN oracle_cards o ON o.oracle_id = p.oracle_key')
+        conn.commit()
+        counts = {
+            'oracle_cards': cursor.execute('SELECT COUNT(*) FROM oracle_cards').fetchone()[0],
+            'printings': cursor.execute('SELECT COUNT(*) FROM printings').fetchone()[0],
+        }
+        print(f"✅ Split into {counts['oracle_cards']:,} oracle cards and {counts['printings']:,} printings")
+        return counts
+        
+    def build_fts_index(self, conn: sqlite3.Connection, ids: Optional[Sequence[str]] = None) -> bool:
+        """(Re)build the ``cards_fts`` FTS5 index over name, type line and oracle text.
+        
+        With ``ids`` only those cards are re-indexed (an incremental update).
+        Returns False if this SQLite build has no FTS5 support.
+        """
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5(
+                    card_id UNINDEXED, name, type_line, oracle_text,
+                    tokenize = "{FTS_TOKENIZER}"
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Full-text index skipped, FTS5 unavailable: {e}")
+            return False
+            
+        select_sql = 'SELECT id, name, type_line, oracle_text, card_faces FROM cards'
+        if ids is None:
+            cursor.execute('DELETE FROM cards_fts')
+            rows = conn.execute(select_sql)
+        else:
+            # card_id is unindexed, so delete through one scan with a temp id table
+            cursor.execute('CREATE TEMP TABLE IF NOT EXISTS fts_refresh_ids (id TEXT PRIMARY KEY)')
+            cursor.execute('DELETE FROM fts_refresh_ids')
+            cursor.executemany('INSERT OR IGNORE INTO fts_refresh_ids (id) VALUES (?)', [(i,) for i in ids])
+            cursor.execute('DELETE FROM cards_fts WHERE card_id IN (SELECT id FROM fts_refresh_ids)')
+            rows = conn.execute(select_sql + ' WHERE id IN (SELECT id FROM fts_refresh_ids)')
+            
+        count = 0
+        for batch in iter_cursor_batches(rows):
+            entries = []
+            for card_id, name, type_line, oracle_text, card_faces in batch:
+                if card_faces and (not oracle_text or not type_line):
+                    faces = json.loads(card_faces)
+                    type_line = type_line or ' // '.join(face.get('type_line') or '' for face in faces)
+                    oracle_text = oracle_text or '\n//\n'.join(face.get('oracle_text') or '' for face in faces)
+                entries.append((card_id, name, type_line, fts_text(oracle_text)))
+            cursor.executemany('INSERT INTO cards_fts (card_id, name, type_line, oracle_text) VALUES (?, ?, ?, ?)',
+                               entries)
+            count += len(entries)
+        if ids is None:
+            cursor.execute("INSERT INTO cards_fts (cards_fts) VALUES ('optimize')")
+        conn.commit()
+        print(f"✅ Full-text index built ({count:,} cards)")
+        return True
+        
+    def _create_price_tables(self, conn: sqlite3.Connection) -> None:
+        """Typed current prices and their delta-encoded history (see PRICE_FIELDS)."""
+        columns = ', '.join(f'{field} INTEGER' for field in PRICE_FIELDS)
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS prices (
+                card_id TEXT PRIMARY KEY,
+                {columns},
+                updated_on TEXT NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        deltas = ', '.join(f'{field} INTEGER NOT NULL DEFAULT 0' for field in PRICE_FIELDS)
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS price_history (
+                card_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                {deltas},
+                missing INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (card_id, date)
+            ) WITHOUT ROWID
+        ''')
+        conn.commit()
+        
+    def carry_price_tables(self, conn: sqlite3.Connection) -> int:
+        """Copy ``prices`` and ``price_history`` from the live database into a new build.
+        
+        A full build starts from an empty file, but the price history has to
+        outlive it. Returns the number of history rows carried over.
+        """
+        self._create_price_tables(conn)
+        if not DATABASE_FILE.exists():
+            return 0
+        conn.execute('ATTACH DATABASE ? AS live', (str(DATABASE_FILE),))
+        try:
+            tables = {row[0] for row in conn.execute("SELECT name FROM live.sqlite_master WHERE type = 'table'")}
+            if not {'prices', 'price_history'} <= tables:
+                return 0
+            conn.execute('INSERT INTO prices SELECT * FROM live.prices')
+            carried = conn.execute('INSERT INTO price_history SELECT * FROM live.price_history').rowcount
+            conn.commit()
+        finally:
+            conn.execute('DETACH DATABASE live')
+        print(f"📈 Carried over {carried:,} price history entries")
+        return carried
+        
+    def update_prices(self, conn: sqlite3.Connection, card_prices_iter: Iterable[Tuple[str, Optional[Dict[str, Any]]]],
+                      as_of: str, known_ids: Optional[set] = None) -> Dict[str, int]:
+        """Write (card id, Scryfall prices) pairs to ``prices`` and ``price_history``.
+        
+        Only cards whose prices differ from the stored ones are written; each
+        change adds one history row dated ``as_of`` (a second run on the same
+        date folds into that row). Ids outside ``known_ids`` are skipped.
+        Cards that come back after leaving ``prices`` continue from the last
+        prices in their history, so its running sums stay right.
+        """
+        self._create_price_tables(conn)
+        fields = ', '.join(PRICE_FIELDS)
+        current = {row[0]: row[1:] for row in conn.execute(f'SELECT card_id, {fields} FROM prices')}
+        returning = self._history_prices(conn)
+        upsert_sql = (f"INSERT OR REPLACE INTO prices (card_id, {fields}, updated_on) "
+                      f"VALUES ({', '.join('?' * (len(PRICE_FIELDS) + 2))})")
+        history_sql = (
+            f"INSERT INTO price_history (card_id, date, {fields}, missing) "
+            f"VALUES ({', '.join('?' * (len(PRICE_FIELDS) + 3))}) "
+            f"ON CONFLICT (card_id, date) DO UPDATE SET "
+            f"{', '.join(f'{field} = {field} + excluded.{field}' for field in PRICE_FIELDS)}, missing = excluded.missing"
+        )
+        counts = {'cards': 0, 'changed': 0, 'new': 0, 'unknown': 0}
+        empty = (None,) * len(PRICE_FIELDS)
+        
+        def flush(price_rows, history_rows):
+            conn.executemany(upsert_sql, price_rows)
+            conn.executemany(history_sql, history_rows)
+        
+        price_rows, history_rows = [], []
+        for card_id, prices in card_prices_iter:
+            if known_ids is not None and card_id not in known_ids:
+                counts['unknown'] += 1
+                continue
+            counts['cards'] += 1
+            new = card_prices(prices)
+            old = current.get(card_id)
+            if old == new:
+                continue
+            if old is None:
+                old = returning.get(card_id)
+                if old is None:
+                    counts['new'] += 1
+            price_rows.append((card_id, *new, as_of))
+            if old != new:
+                counts['changed'] += 1
+                history_rows.append((card_id, as_of, *price_history_delta(old or empty, new)))
+            if len(price_rows) >= 5000:
+                flush(price_rows, history_rows)
+                price_rows, history_rows = [], []
+        flush(price_rows, history_rows)
+        conn.commit()
+        return counts
+        
+    def _history_prices(self, conn: sqlite3.Connection) -> Dict[str, Tuple[Optional[int], ...]]:
+        """Last prices recorded in ``price_history`` of cards that have no ``prices`` row."""
+        sums = ', '.join(f'SUM({field})' for field in PRICE_FIELDS)
+        rows = conn.execute(f"""
+            SELECT h.card_id, {sums},
+                   (SELECT missing FROM price_history l WHERE l.card_id = h.card_id ORDER BY date DESC LIMIT 1)
+            FROM price_history h
+            WHERE h.card_id NOT IN (SELECT card_id FROM prices)
+            GROUP BY h.card_id
+        """)
+        return {card_id: tuple(None if missing & (1 << bit) else total for bit, total in enumerate(totals))
+                for card_id, *totals, missing in rows}
+        
+    def refresh_prices(self, conn: sqlite3.Connection, as_of: str) -> Dict[str, int]:
+        """Bring the price tables in line with the ``prices`` JSON of the ``cards`` table."""
+        cursor = conn.execute('SELECT id, prices FROM cards')
+        pairs = ((card_id, json.loads(prices) if prices else None)
+                 for batch in iter_cursor_batches(cursor) for card_id, prices in batch)
+        counts = self.update_prices(conn, pairs, as_of)
+        # Cards that left the bulk data keep their history but no current price
+        conn.execute('DELETE FROM prices WHERE card_id NOT IN (SELECT id FROM cards)')
+        conn.commit()
+        print(f"💰 Prices updated ({counts['changed']:,} of {counts['cards']:,} cards changed)")
+        return counts
+        
+    def update_prices_only(self, bulk_info: Dict[str, Any]) -> Dict[str, int]:
+        """Refresh only ``prices``/``price_history`` of the existing database from the bulk data.
+        
+        The bulk file is streamed (never saved) and only each card's id and
+        prices are decoded; the rest of the database is left untouched.
+        """
+        if not DATABASE_FILE.exists():
+            raise FileNotFoundError(f"{DATABASE_FILE} does not exist, run a full build first")
+        print(f"💰 Updating prices in {DATABASE_FILE}")
+        chunks, total_bytes = self._open_chunks(bulk_info)
+        stats = {}
+        
+        def pairs():
+            for raw_card in iter_bulk_cards(chunks, lang='en', stats=stats, raw=True):
+                self.events.progress('prices', stats['bytes_read'], total_bytes, unit='bytes', cards=stats['cards'])
+                yield raw_card_prices(raw_card)
+        
+        start_time = time.time()
+        with closing(sqlite3.connect(DATABASE_FILE, timeout=30)) as conn:
+            self._apply_sqlite_optimizations(conn, durable=True)
+            known_ids = {row[0] for row in conn.execute('SELECT id FROM cards')}
+            counts = self.update_prices(conn, pairs(), bulk_info['updated_at'][:10], known_ids)
+        print(f"✅ Prices of {counts['cards']:,} cards checked in {time.time() - start_time:.1f} seconds: "
+              f"{counts['changed']:,} changed, {counts['unknown']:,} not in the database")
+        return counts
+        
+    def open_database(self) -> Optional[sqlite3.Connection]:
+        """Open the existing database for an incremental update.
+        
+        Returns None when there is no database or it predates the
+        ``content_hash`` column, in which case a full rebuild is needed.
+        """
+        if not DATABASE_FILE.exists():
+            return None
+        conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
+        if is_split_database(conn):
+            conn.close()
+            print("⚠️ Existing database uses the oracle split, doing a full rebuild")
+            return None
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(cards)')}
+        if not set(CARD_COLUMNS) <= columns:
+            conn.close()
+            print("⚠️ Existing database predates the current schema, doing a full rebuild")
+            return None
+        print(f"🗄️ Updating existing database: {DATABASE_FILE}")
+        self._apply_sqlite_optimizations(conn, durable=True)
+        self._create_filter_tables(conn)
+        conn.commit()
+        return conn
+        
+    def create_database(self, path: Path = DATABASE_FILE) -> sqlite3.Connection:
         """Create an empty SQLite database ready for card data."""
-        print(f"🗄️ Creating database: {DATABASE_FILE}")
+        print(f"🗄️ Creating database: {path}")
         
-        # Remove any previous database build
-        if DATABASE_FILE.exists():
-            DATABASE_FILE.unlink()
+        # Remove any previous (possibly interrupted) build
+        if path.exists():
+            path.unlink()
             
-        conn = sqlite3.connect(DATABASE_FILE)
+        # The connection is handed to the CardWriter thread during the bulk insert.
+        conn = sqlite3.connect(path, check_same_thread=False)
         self._apply_sqlite_optimizations(conn)
         cursor = conn.cursor()
         
@@ -177,189 +2214,555 @@ class MTGDatabaseBuilder:
                 mtgo_id INTEGER,
                 arena_id INTEGER,
                 prices TEXT,
-                data TEXT
+                data TEXT,
+                content_hash TEXT,
+                colors_mask INTEGER,
+                color_identity_mask INTEGER,
+                legal_mask INTEGER,
+                power_num REAL,
+                toughness_num REAL
             )
         ''')
+        self._create_data_dictionaries_table(conn)
+        self._create_filter_tables(conn)
         conn.commit()
         print("✅ Table created (indexes deferred)")
         return conn
         
-    def process_cards(self, conn: sqlite3.Connection) -> int:
-        """Process cards from JSON file and insert into the detailed database schema"""
-        print(f"🔄 Processing cards from {CARDS_FILE}")
+    def publish_database(self, path: Path) -> None:
+        """Bring a finished shadow build live as ``cards.db``.
         
-        cursor = conn.cursor()
+        A live database is updated by copying the build into it through SQLite
+        (see :meth:`_copy_into_live`), never by renaming over it: processes
+        that have it open share its ``-wal``/``-shm`` files, which must not
+        end up paired with a different database file. Only when the page size
+        changed, which the copy cannot do in WAL mode, is the file renamed,
+        and only once no other connection has the live database open.
+        """
+        with closing(sqlite3.connect(path)) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        # The build ran with synchronous=OFF: flush it before it becomes live.
+        with open(path, 'rb+') as f:
+            os.fsync(f.fileno())
+            
+        if not DATABASE_FILE.exists():
+            os.replace(path, DATABASE_FILE)
+            print(f"🔀 New database swapped in: {DATABASE_FILE}")
+            return
+            
+        with closing(sqlite3.connect(DATABASE_FILE, timeout=30)) as live:
+            live_page_size = live.execute('PRAGMA page_size').fetchone()[0]
+        if live_page_size == page_size:
+            self._copy_into_live(path)
+            return
+            
+        # Leaving WAL mode needs the only connection to the database; it also
+        # checkpoints and removes cards.db-wal and cards.db-shm.
+        try:
+            with closing(sqlite3.connect(DATABASE_FILE, timeout=30)) as live:
+                mode = live.execute('PRAGMA journal_mode=DELETE').fetchone()[0]
+        except sqlite3.OperationalError:  # database is locked
+            mode = None
+        if mode != 'delete':
+            raise RuntimeError(f"{DATABASE_FILE} is open in another process; close it to publish "
+                               f"the new page size ({live_page_size} -> {page_size}), or build with the current one")
+        os.replace(path, DATABASE_FILE)
+        print(f"🔀 New database swapped in: {DATABASE_FILE} (page size {live_page_size} -> {page_size})")
+        
+    def _copy_into_live(self, path: Path) -> None:
+        """Copy a finished build into the live ``cards.db`` through SQLite.
+        
+        Readers see this as a single write transaction on the live database,
+        so it is safe while other processes hold the file and its WAL open.
+        """
+        print("📋 Copying the new build into the live database")
+        with closing(sqlite3.connect(path)) as src, \
+                closing(sqlite3.connect(DATABASE_FILE, timeout=30)) as dst:
+            src.backup(dst)
+        path.unlink()
+        print(f"🔀 New database copied in: {DATABASE_FILE}")
+        
+    def process_cards(self, conn: sqlite3.Connection, chunks: Optional[Iterable[bytes]] = None,
+                      total_bytes: Optional[int] = None,
+                      delta: Optional[DeltaTracker] = None) -> int:
+        """Process cards and insert them into the detailed database schema.
+        
+        Cards are read from ``CARDS_FILE`` unless ``chunks`` (an iterable of raw
+        JSON bytes, e.g. from :meth:`stream_bulk_data`) is given, in which case
+        ``total_bytes`` is only used for progress reporting. With a ``delta``
+        tracker only new or changed rows are written and vanished ids are
+        deleted; the return value is always the number of cards in the bulk data.
+        """
+        if chunks is None:
+            print(f"🔄 Processing cards from {CARDS_FILE}")
+            chunks = iter_path_chunks(CARDS_FILE)
+            total_bytes = CARDS_FILE.stat().st_size
+        else:
+            print("🔄 Processing cards from stream")
         
-        # Prepare insert statement to match the new schema
-        insert_sql = '''
-            INSERT OR REPLACE INTO cards (
-                id, oracle_id, lang, name, mana_cost, cmc, type_line, oracle_text, 
-                power, toughness, colors, color_identity, keywords, legalities, 
-                produced_mana, card_faces, set_id, set_code, set_name, set_type, 
-                collector_number, rarity, released_at, artist, border_color, frame, 
-                image_status, image_uris, layout, reserved, foil, nonfoil, digital, 
-                reprint, story_spotlight, full_art, textless, tcgplayer_id, mtgo_id, 
-                arena_id, prices, data
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        '''
-        
-        card_count = 0
-        english_cards = 0
-        non_english_cards = 0
         batch_size = 5000  # Larger batch gives better throughput with the explicit transaction
-        batch = []
+        stats = {}
         
         start_time = time.time()
         
-        # Begin a single transaction – this is much faster than committing after
-        # every batch while still ensuring we don't use autocommit for each row.
-        conn.execute('BEGIN')
+        if total_bytes:
+            print(f"📊 Streaming {total_bytes / 1024 / 1024:.1f} MB of card data")
         
-        with open(CARDS_FILE, 'r', encoding='utf-8') as f:
-            cards_data = json.load(f)
-            total_cards = len(cards_data)
-            print(f"📊 Total cards to process: {total_cards:,}")
-            
-            for i, card in enumerate(cards_data):
-                card_lang = card.get('lang', 'en')
-                
-                if card_lang == 'en':
-                    english_cards += 1
-                else:
-                    non_english_cards += 1
-                    # Skip non-English cards entirely
-                    continue
-                
-                # Prepare card data tuple matching the schema
-                card_row = (
-                    card.get('id'),
-                    card.get('oracle_id'),
-                    card_lang,
-                    card.get('name'),
-                    card.get('mana_cost'),
-                    card.get('cmc', 0.0),
-                    card.get('type_line'),
-                    card.get('oracle_text'),
-                    card.get('power'),
-                    card.get('toughness'),
-                    json.dumps(card.get('colors', [])),
-                    json.dumps(card.get('color_identity', [])),
-                    json.dumps(card.get('keywords', [])),
-                    json.dumps(card.get('legalities', {})),
-                    json.dumps(card.get('produced_mana', [])),
-                    json.dumps(card.get('card_faces', [])),
-                    card.get('set_id'),
-                    card.get('set'),
-                    card.get('set_name'),
-                    card.get('set_type'),
-                    card.get('collector_number'),
-                    card.get('rarity'),
-                    card.get('released_at'),
-                    card.get('artist'),
-                    card.get('border_color'),
-                    card.get('frame'),
-                    card.get('image_status'),
-                    json.dumps(card.get('image_uris', {})),
-                    card.get('layout'),
-                    int(card.get('reserved', False)),
-                    int(card.get('foil', False)),
-                    int(card.get('nonfoil', False)),
-                    int(card.get('digital', False)),
-                    int(card.get('reprint', False)),
-                    int(card.get('story_spotlight', False)),
-                    int(card.get('full_art', False)),
-                    int(card.get('textless', False)),
-                    card.get('tcgplayer_id'),
-                    card.get('mtgo_id'),
-                    card.get('arena_id'),
-                    json.dumps(card.get('prices', {})),
-                    json.dumps(card) # Keep the full JSON as a fallback
-                )
-                
-                batch.append(card_row)
-                
-                if len(batch) >= batch_size:
-                    batch_len = len(batch)
-                    cursor.executemany(insert_sql, batch)
-                    batch.clear()
-                    card_count += batch_len
-                    progress = (i + 1) / total_cards * 100
-                    elapsed = time.time() - start_time
-                    rate = card_count / elapsed if elapsed > 0 else 0
-                    print(f"🚀 Progress: {progress:.1f}% ({card_count:,}/{total_cards:,} cards) - {rate:.0f} cards/sec", end='\r')
-            
-            if batch:
-                batch_len = len(batch)
-                cursor.executemany(insert_sql, batch)
-                card_count += batch_len
-        
-        # Commit the big transaction once all inserts are done
+        # Compressed rows reference their dictionary by id; earlier dictionaries
+        # stay valid for rows an incremental update leaves untouched, and an
+        # incremental update keeps compressing with the newest one.
+        self._create_data_dictionaries_table(conn)
+        dictionary_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM data_dictionaries').fetchone()[0]
+        codec = self._latest_data_codec(conn) if delta is not None else None
         conn.commit()
         
+        # Parsing/row building (here or in worker processes) feeds a single
+        # writer thread that owns the connection and the transaction.
+        writer = CardWriter(conn, INSERT_CARD_SQL, max_pending=max(2, self.workers))
+        writer.start()
+        try:
+            for batch in self._iter_row_batches(chunks, stats, batch_size, dictionary_id, codec):
+                if delta is not None:
+                    batch = delta.filter(batch)
+                    if not batch:
+                        continue
+                writer.put(batch)
+                progress = stats['bytes_read'] / total_bytes * 100 if total_bytes else 0
+                elapsed = time.time() - start_time
+                # rows_written trails the writer queue; the parsed card count does not
+                rate = stats['cards'] / elapsed if elapsed > 0 else 0
+                self.events.progress('ingest', stats['bytes_read'], total_bytes, unit='bytes',
+                                     rows=writer.rows_written, cards=stats['cards'], cards_per_sec=round(rate, 1))
+                if not self.events.json_lines:
+                    # the \r line would garble the JSON lines
+                    print(f"🚀 Progress: {progress:.1f}% ({stats['cards']:,} cards) - {rate:.0f} cards/sec", end='\r')
+        except BaseException:
+            # A truncated or interrupted stream must not commit partial card
+            # updates: the derived tables would never be refreshed for them.
+            writer.abort()
+            raise
+        writer.close()
+        card_count = stats['cards']
+        english_cards = stats['cards']
+        
+        codec = self.data_codec
+        # A newly trained dictionary is only stored if some row uses it
+        if codec is not None and codec.compression and codec.dictionary_id == dictionary_id \
+                and writer.rows_written:
+            conn.execute('INSERT INTO data_dictionaries (id, codec, dictionary, created_at) VALUES (?, ?, ?, ?)',
+                         (codec.dictionary_id, codec.compression, codec.dictionary, datetime.now().isoformat()))
+            conn.commit()
+        
+        if delta is not None:
+            vanished = delta.vanished_ids()
+            if vanished:
+                conn.executemany('DELETE FROM cards WHERE id = ?', [(card_id,) for card_id in vanished])
+                conn.commit()
+            delta.counts['deleted'] = len(vanished)
+            if writer.rows_written or vanished:
+                delta.counts['dictionaries_removed'] = self._prune_data_dictionaries(conn)
+        
         print() # Newline after progress bar
         elapsed = time.time() - start_time
         print(f"✅ Processed {card_count:,} cards in {elapsed:.1f} seconds")
+        non_english_cards = stats['skipped']
         print(f"🌍 Language breakdown: {english_cards:,} English, {non_english_cards:,} non-English")
         
-        if non_english_cards > 0:
-            print(f"ℹ️ Non-English cards are included. You can filter by the 'lang' column.")
+        if self.foreign is not None:
+            print(f"🌐 Non-English cards go to the foreign-language partition: {FOREIGN_DATABASE_FILE.name}")
+        elif non_english_cards > 0:
+            print(f"ℹ️ Non-English cards were skipped while parsing.")
+        
+        if delta is not None:
+            counts = delta.counts
+            print(f"🔁 Delta: {counts['inserted']:,} new, {counts['updated']:,} changed, "
+                  f"{counts['unchanged']:,} unchanged, {counts['deleted']:,} deleted")
         
         return card_count
         
-    def save_metadata(self, bulk_info: Dict[str, Any], card_count: int) -> None:
+    def _latest_data_codec(self, conn: sqlite3.Connection) -> Optional[CardDataCodec]:
+        """A codec using the newest stored dictionary, if it matches the compression option."""
+        if not self.compress_data:
+            return None
+        row = conn.execute('SELECT id, dictionary FROM data_dictionaries WHERE codec = ? '
+                           'ORDER BY id DESC LIMIT 1', (self.compress_data,)).fetchone()
+        if row is None:
+            return None
+        return CardDataCodec(slim=self.slim_data, compression=self.compress_data,
+                             dictionary=bytes(row[1]), dictionary_id=row[0])
+        
+    def _prune_data_dictionaries(self, conn: sqlite3.Connection) -> int:
+        """Delete the dictionaries no ``data`` value refers to any more; returns how many."""
+        # Compressed values start with a codec byte and the 2-byte dictionary id
+        used = [int.from_bytes(bytes(row[0]), 'big') for row in conn.execute(
+            "SELECT DISTINCT substr(data, 2, 2) FROM cards WHERE typeof(data) = 'blob'")]
+        deleted = conn.execute(f"DELETE FROM data_dictionaries WHERE id NOT IN ({', '.join('?' * len(used))})",
+                               used).rowcount
+        conn.commit()
+        return deleted
+        
+    def _iter_row_batches(self, chunks: Iterable[bytes], stats: Dict[str, int],
+                          batch_size: int, dictionary_id: int = 1,
+                          codec: Optional[CardDataCodec] = None) -> Iterator[List[tuple]]:
+        """Yield lists of row tuples in input order.
+        
+        With a single worker rows are built in this process. Otherwise raw card
+        JSON is chunked and both ``json.loads`` and ``card_to_row`` run in a
+        process pool, with at most two chunks per worker in flight. If the
+        ``data`` column is slimmed or compressed, the codec is trained on the
+        first cards of the stream (unless one is given) and kept in
+        ``self.data_codec``.
+        """
+        raw = self.workers > 1
+        # Cards are parsed one at a time so memory stays flat regardless of
+        # the size of the bulk file; non-English cards are skipped by the parser.
+        foreign = self.foreign
+        cards = iter_bulk_cards(chunks, lang='en', stats=stats, raw=raw,
+                                skipped=foreign.add if foreign is not None else None)
+        
+        if codec is None and (self.slim_data or self.compress_data):
+            sample = list(itertools.islice(cards, DATA_DICTIONARY_SAMPLES))
+            codec = CardDataCodec.train([_json.loads(card) for card in sample] if raw else sample,
+                                        slim=self.slim_data, compression=self.compress_data,
+                                        dictionary_id=dictionary_id)
+            cards = itertools.chain(sample, cards)
+        self.data_codec = codec
+        
+        if not raw:
+            batch = []
+            for card in cards:
+                batch.append(card_to_row(card, codec))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+            return
+            
+        print(f"🧵 Building rows with {self.workers} worker processes")
+        in_flight = deque()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_row_worker,
+                                 initargs=(codec, self.json_codec)) as pool:
+            raw_batch = []
+            for raw_card in cards:
+                raw_batch.append(raw_card)
+                if len(raw_batch) >= batch_size:
+                    in_flight.append(pool.submit(rows_from_raw_cards, raw_batch))
+                    raw_batch = []
+                    if len(in_flight) >= self.workers * 2:
+                        yield in_flight.popleft().result()
+            if raw_batch:
+                in_flight.append(pool.submit(rows_from_raw_cards, raw_batch))
+            while in_flight:
+                yield in_flight.popleft().result()
+        
+    def save_metadata(self, bulk_info: Dict[str, Any], card_count: int,
+                      delta_counts: Optional[Dict[str, int]] = None,
+                      foreign_counts: Optional[Dict[str, int]] = None,
+                      patch_summary: Optional[Dict[str, Any]] = None) -> None:
         """Save metadata about the build"""
         metadata = {
             **bulk_info,
             'card_count': card_count,
             'database_built_at': datetime.now().isoformat(),
-            'built_with': 'Python Builder v2.0'
+            'built_with': 'Python Builder v2.0',
+            'prices_updated_at': bulk_info.get('updated_at'),
+            'bulk_type': bulk_info.get('type'),
+            'bytes_transferred': self.bytes_downloaded or None,
+            'json_codec': self.json_codec,
         }
+        if delta_counts is not None:
+            metadata['delta'] = delta_counts
+        if self.split_oracle and not delta_counts:
+            metadata['split_oracle'] = True
+        if foreign_counts is not None:
+            metadata['languages'] = (sorted(self.foreign_languages) if self.foreign_languages is not None
+                                     else 'all')
+            metadata['foreign_cards'] = foreign_counts['cards']
+            metadata['printed_names'] = foreign_counts['names']
+        if patch_summary is not None:
+            metadata['content_checksum'] = patch_summary['target_checksum']
+            metadata['patch'] = {key: patch_summary[key] for key in ('base_checksum', 'target_checksum', 'bytes')}
+            metadata['patch']['file'] = PATCH_FILE.name
+            metadata['patch']['base_updated_at'] = patch_summary['info'].get('base_updated_at')
+        if self.last_layout_report is not None:
+            metadata['layout_report'] = self.last_layout_report
         
         with open(METADATA_FILE, 'w') as f:
             json.dump(metadata, f, indent=2)
             
         print(f"💾 Metadata saved: {METADATA_FILE}")
         
+    def export_card_table(self) -> Optional[Path]:
+        """Write the published database's card table in the ``export`` format next to it.
+        
+        A missing pyarrow only skips the export; the database is already built.
+        """
+        path = export_path(DATABASE_FILE, self.export)
+        start_time = time.time()
+        try:
+            with closing(sqlite3.connect(DATABASE_FILE)) as conn:
+                count = export_cards(conn, path, self.export, price_fields=PRICE_FIELDS,
+                                     card_prices=card_prices, decode_data=CardDataReader(conn).decode)
+        except ImportError as e:
+            print(f"⚠️ Card table export skipped: {e}")
+            return None
+        print(f"🏹 Exported {count:,} cards to {path} "
+              f"({path.stat().st_size / 1024 / 1024:.1f} MB) in {time.time() - start_time:.1f} seconds")
+        return path
+        
+    def make_database_patch(self, path: Path, bulk_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Write PATCH_FILE from the live cards.db to the finished build at ``path``.
+        
+        Returns None (and leaves no patch behind) when there is no previous
+        database or its schema differs, e.g. after a change of layout options.
+        """
+        if PATCH_FILE.exists():
+            PATCH_FILE.unlink()
+        if not DATABASE_FILE.exists():
+            print("ℹ️ No previous database to make a patch from")
+            return None
+        try:
+            with open(METADATA_FILE, 'r') as f:
+                base_updated_at = json.load(f).get('updated_at')
+        except (OSError, ValueError):
+            base_updated_at = None
+        start_time = time.time()
+        try:
+            summary = make_patch(DATABASE_FILE, path, PATCH_FILE,
+                                 info={'base_updated_at': base_updated_at,
+                                       'target_updated_at': bulk_info.get('updated_at')})
+        except PatchError as e:
+            print(f"⚠️ No patch made: {e}")
+            return None
+        rows = sum(counts['upserts'] + counts['deletes'] for counts in summary['tables'].values())
+        print(f"🩹 Patch written: {PATCH_FILE.name} ({summary['bytes'] / 1024 / 1024:.2f} MB, "
+              f"{summary['bytes'] / summary['target_bytes']:.1%} of the database, {rows:,} rows) "
+              f"in {time.time() - start_time:.1f} seconds")
+        return summary
+        
+    def save_prices_metadata(self, bulk_info: Dict[str, Any]) -> None:
+        """Record a prices-only refresh, keeping the metadata of the last full build."""
+        try:
+            with open(METADATA_FILE, 'r') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            metadata = {}
+        metadata['prices_updated_at'] = bulk_info.get('updated_at')
+        metadata['prices_refreshed_at'] = datetime.now().isoformat()
+        with open(METADATA_FILE, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        print(f"💾 Metadata saved: {METADATA_FILE}")
+        
     def build_database(self) -> None:
         """Main build process"""
         print("🏗️ Starting MTG Card Database Build")
         print(f"📂 Data directory: {DATA_DIR}")
+        print(f"🧩 JSON codec: {self.json_codec}")
         
         DATA_DIR.mkdir(parents=True, exist_ok=True)
         
+        events = self.events
         try:
-            bulk_info = self.get_bulk_data_info()
-            self.download_bulk_data(bulk_info)
-            conn = self.create_database()
-            card_count = self.process_cards(conn)
+            with events.phase('bulk_info'):
+                if self.source_file is not None:
+                    bulk_info = self.get_file_info(self.source_file)
+                else:
+                    bulk_info = self.get_bulk_data_info()
+            if not self.force and self.is_up_to_date(bulk_info, 'prices_updated_at' if self.prices_only else 'updated_at'):
+                print(f"✅ Database is up to date with bulk data from {bulk_info['updated_at']}, skipping build")
+                events.write_summary('skipped', bulk_updated_at=bulk_info.get('updated_at'))
+                return
+            if self.prices_only:
+                with events.phase('prices') as phase:
+                    counts = self.update_prices_only(bulk_info)
+                    phase.update(counts, rows=counts['cards'])
+                self.save_prices_metadata(bulk_info)
+                if self.export:
+                    with events.phase('export', format=self.export):
+                        self.export_card_table()
+                events.write_summary('ok', prices_only=True, **counts)
+                return
+            if self.source_file is not None or self.stream:
+                chunks, total_bytes = self._open_chunks(bulk_info)
+            else:
+                with events.phase('download') as phase:
+                    self.download_bulk_data(bulk_info)
+                    phase['bytes'] = CARDS_FILE.stat().st_size
+                    phase['bytes_downloaded'] = self.bytes_downloaded
+                chunks, total_bytes = None, None
+                
+            # Incremental updates write in place through WAL; full builds go
+            # into a shadow file so readers never see a half-built database.
+            conn = self.open_database() if self.incremental else None
+            delta = DeltaTracker(conn) if conn is not None else None
+            if conn is None:
+                conn = self.create_database(BUILD_DATABASE_FILE)
+            if self.foreign_partition:
+                self.foreign = ForeignPartition(BUILD_FOREIGN_DATABASE_FILE, self.foreign_languages)
+            foreign_counts = None
+            try:
+                with events.phase('ingest', streamed=self.stream and self.source_file is None) as phase:
+                    card_count = self.process_cards(conn, chunks, total_bytes, delta=delta)
+                    phase['rows'] = card_count
+                    if self.stream and self.source_file is None:
+                        phase['bytes_downloaded'] = self.bytes_downloaded
+                    if delta is not None:
+                        phase.update(delta.counts)
+                if self.foreign is not None:
+                    with events.phase('foreign_partition') as phase:
+                        foreign_counts = self.foreign.close()
+                        self.foreign = None
+                        phase.update(foreign_counts, rows=foreign_counts['cards'])
+                    print(f"🌐 Foreign-language partition: {foreign_counts['cards']:,} printings, "
+                          f"{foreign_counts['names']:,} printed names")
+                if self.split_oracle and delta is None:
+                    with events.phase('oracle_split') as phase:
+                        phase.update(self.split_oracle_tables(conn))
+                elif self.split_oracle:
+                    print("ℹ️ The oracle split is only built by full builds")
+                with events.phase('prices') as phase:
+                    if delta is None:
+                        phase['history_carried'] = self.carry_price_tables(conn)
+                    phase.update(self.refresh_prices(conn, bulk_info['updated_at'][:10]))
+                changed_ids = delta.changed_ids + delta.vanished_ids() if delta else None
+                with events.phase('filter_tables'):
+                    self.build_filter_tables(conn, changed_ids)
+                with events.phase('fts_index'):
+                    self.build_fts_index(conn, changed_ids)
+                # Indexes are created after the data is loaded
+                with events.phase('indexes'):
+                    self._create_indexes(conn)
+                with events.phase('layout', layout=self.layout if delta is None else 'incremental'):
+                    if delta is None:
+                        self.optimize_layout(conn)
+                    else:
+                        conn.execute('PRAGMA optimize')
+            except BaseException:
+                conn.close()
+                if delta is None and BUILD_DATABASE_FILE.exists():
+                    BUILD_DATABASE_FILE.unlink()
+                if self.foreign is not None:
+                    self.foreign.discard()
+                    self.foreign = None
+                if BUILD_FOREIGN_DATABASE_FILE.exists():
+                    BUILD_FOREIGN_DATABASE_FILE.unlink()
+                raise
             conn.close()
-            self.save_metadata(bulk_info, card_count)
+            patch_summary = None
+            if self.patch and delta is None:
+                with events.phase('patch') as phase:
+                    patch_summary = self.make_database_patch(BUILD_DATABASE_FILE, bulk_info)
+                    if patch_summary is not None:
+                        phase['bytes'] = patch_summary['bytes']
+            elif self.patch:
+                print("ℹ️ Patches are only made by full builds")
+            if delta is None:
+                with events.phase('publish'):
+                    self.publish_database(BUILD_DATABASE_FILE)
+            if foreign_counts is not None:
+                # The partition is only ever replaced as a whole, like cards.db
+                os.replace(BUILD_FOREIGN_DATABASE_FILE, FOREIGN_DATABASE_FILE)
+            if self.export:
+                with events.phase('export', format=self.export) as phase:
+                    exported = self.export_card_table()
+                    phase['rows'] = card_count if exported else 0
+            self.save_metadata(bulk_info, card_count, delta.counts if delta else None, foreign_counts,
+                               patch_summary)
             
             print(f"🎉 Database build complete!")
             print(f"📊 Total cards: {card_count:,}")
             print(f"🗄️ Database: {DATABASE_FILE}")
             print(f"📦 Size: {DATABASE_FILE.stat().st_size / 1024 / 1024:.1f} MB")
             
-            if CARDS_FILE.exists():
+            if CARDS_FILE.exists() and not self.keep_raw and self.source_file is None:
                 CARDS_FILE.unlink()
+                # The state file goes with the file it describes; with keep_raw it
+                # vouches for the kept cards.json, and next to a partial file it
+                # is what lets that download resume.
+                if DOWNLOAD_STATE_FILE.exists() and not PARTIAL_CARDS_FILE.exists():
+                    DOWNLOAD_STATE_FILE.unlink()
                 print(f"🧹 Cleaned up temporary JSON file")
-                
-            # Create indexes **after** data is loaded – re-open connection
-            conn = sqlite3.connect(DATABASE_FILE)
-            self._apply_sqlite_optimizations(conn)  # same pragmas during indexing
-            self._create_indexes(conn)
-            conn.close()
+            events.write_summary('ok', cards=card_count,
+                                 database_mb=round(DATABASE_FILE.stat().st_size / 1024 / 1024, 1))
+            print(f"⏱️ Timing summary: {TIMINGS_FILE}")
             
         except Exception as e:
             print(f"❌ Error during build: {e}")
+            events.write_summary('error', error=str(e))
             raise
 
 def main():
     """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Build the MTG card database from Scryfall bulk data')
+    parser.add_argument('--force', action='store_true',
+                        help='rebuild even if the bulk data has not changed since the last build')
+    parser.add_argument('--connections', type=int, default=1,
+                        help='number of parallel HTTP range requests used for the download')
+    parser.add_argument('--bulk-api', default=SCRYFALL_BULK_API,
+                        help='bulk-data endpoint (e.g. a local server for testing)')
+    parser.add_argument('--stream', action='store_true',
+                        help='ingest straight from the HTTP response without writing cards.json')
+    parser.add_argument('--keep-raw', action='store_true',
+                        help='keep cards.json after the build')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes used to build rows from cards (0 = one per CPU)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='update the existing database in place, writing only changed cards')
+    parser.add_argument('--slim-data', action='store_true',
+                        help='leave fields that already have a column out of the stored card JSON')
+    parser.add_argument('--compress-data', choices=['zlib', 'zstd'],
+                        help='compress the stored card JSON with a dictionary trained on sample cards')
+    parser.add_argument('--layout', choices=TABLE_LAYOUTS, default='default',
+                        help='physical layout of the cards table (clustered = rows ordered by name/oracle_id, '
+                             'without-rowid = clustered on id; requires --slim-data or --compress-data)')
+    parser.add_argument('--page-size', type=int, choices=[1024, 2048, 4096, 8192, 16384, 32768, 65536],
+                        help='SQLite page size of the finished database')
+    parser.add_argument('--covering-indexes', action='store_true',
+                        help='use covering indexes for the name, printings and set list queries')
+    parser.add_argument('--layout-report', action='store_true',
+                        help='print (and save to metadata.json) size and query timings before/after the layout stage')
+    parser.add_argument('--from-file', type=Path,
+                        help='build from a local bulk JSON (or .json.gz) file instead of downloading')
+    parser.add_argument('--events', action='store_true',
+                        help='also print progress and phase timings as JSON lines (one {"event": ...} object per line)')
+    parser.add_argument('--split-oracle', action='store_true',
+                        help='store gameplay fields once per card in oracle_cards and per-printing fields in '
+                             'printings, behind a cards view of the usual shape (forces full rebuilds)')
+    parser.add_argument('--bulk-type', choices=BULK_TYPES,
+                        help=f'Scryfall bulk file to build from (default: {DEFAULT_BULK_TYPE}, every English printing)')
+    parser.add_argument('--json-codec', choices=available_json_codecs(),
+                        help='JSON library used to parse cards (default: the fastest installed)')
+    parser.add_argument('--export', choices=EXPORT_FORMATS,
+                        help='also write the card table as cards.parquet or cards.arrow (needs pyarrow)')
+    parser.add_argument('--languages', nargs='+', metavar='LANG',
+                        help='also keep these non-English printings (e.g. de ja, or all) in cards-foreign.db, '
+                             'with a printed name to oracle_id index; builds from all_cards')
+    parser.add_argument('--patch', action='store_true',
+                        help='also write cards.patch, the rows that changed since the previous build '
+                             '(apply it with card_patch.py apply)')
+    parser.add_argument('--prices-only', action='store_true',
+                        help='only refresh the prices and price_history tables of the existing database')
+    args = parser.parse_args()
+    if args.languages is not None and set(args.languages) <= {'en'}:
+        parser.error("--languages needs at least one non-English language (or all); English is always kept")
+    
     print("🃏 MTG Card Database Builder")
     print("=" * 40)
     
-    builder = MTGDatabaseBuilder()
+    builder = MTGDatabaseBuilder(bulk_api_url=args.bulk_api, connections=args.connections,
+                                 force=args.force, stream=args.stream, keep_raw=args.keep_raw,
+                                 workers=args.workers, incremental=args.incremental,
+                                 slim_data=args.slim_data, compress_data=args.compress_data,
+                                 layout=args.layout, page_size=args.page_size,
+                                 covering_indexes=args.covering_indexes, layout_report=args.layout_report,
+                                 source_file=args.from_file,
+                                 events=BuildEvents('cards', json_lines=args.events, summary_file=TIMINGS_FILE),
+                                 split_oracle=args.split_oracle, prices_only=args.prices_only,
+                                 bulk_type=args.bulk_type, json_codec=args.json_codec,
+                                 export=args.export, languages=args.languages,
+                                 patch=args.patch)
     builder.build_database()
 
 if __name__ == '__main__':
@@ -1,10 +1,24 @@
 import sqlite3
 import json
+from pathlib import Path
 import numpy as np
 import lancedb
 from lancedb.pydantic import LanceModel, Vector
 from sentence_transformers import SentenceTransformer
 
+from card_export import find_card_export, read_card_export
+
+CARDS_DATABASE = Path('C:/Users/csdj9/AppData/Roaming/desktopmtg/scryfall-data/cardsupdated.db')
+# Database written by build_card_database.py in the same directory; its
+# `--export parquet|arrow` column export sits next to it. When an export exists
+# only the columns below are read from it, memory-mapped, instead of every
+# column of every row from SQLite. These are the columns
+# create_card_document() uses from the SQLite rows, so both give the same
+# documents.
+BUILDER_DATABASE = CARDS_DATABASE.with_name('cards.db')
+EXPORT_COLUMNS = ['name', 'mana_cost', 'type_line', 'oracle_text', 'keywords',
+                  'power', 'toughness', 'image_uris']
+
 # --- Step 1: Define the data schema for LanceDB ---
 # This tells our vector database what kind of data we're going to store.
 # It includes the card's information and its vector embedding.
@@ -56,6 +70,41 @@ def create_card_document(card: dict) -> str:
     # Join all the parts into a single string.
     return ". ".join(filter(None, parts))
 
+def export_card_data(table: 'pyarrow.Table') -> tuple:
+    """
+    The documents and LanceDB rows of the cards in an export table, built
+    column by column with Arrow kernels instead of one dict per card.
+    Gives the same documents as create_card_document() and skips the same
+    cards (no normal image) as the SQLite path in main().
+    """
+    import pyarrow.compute as pc
+
+    image_uri = pc.map_lookup(table['image_uris'], 'normal', 'first')
+    table = table.append_column('image_uri', image_uri)
+    table = table.filter(pc.fill_null(pc.not_equal(image_uri, ''), False))
+
+    def labelled(label, name):
+        # Missing values read "None", as they do in the f-strings above
+        return pc.binary_join_element_wise(label, pc.fill_null(table[name], 'None'), '')
+
+    keywords = table['keywords']
+    has_keywords = pc.fill_null(pc.greater(pc.list_value_length(keywords), 0), False)
+    has_stats = pc.and_(pc.is_valid(table['power']), pc.is_valid(table['toughness']))
+    parts = [
+        labelled('Name: ', 'name'),
+        labelled('Mana Cost: ', 'mana_cost'),
+        labelled('Type: ', 'type_line'),
+        labelled('Text: ', 'oracle_text'),
+        pc.if_else(has_keywords,
+                   pc.binary_join_element_wise('Keywords: ', pc.binary_join(keywords, ', '), ''), None),
+        pc.if_else(has_stats,
+                   pc.binary_join_element_wise('Power: ', table['power'], '. Toughness: ',
+                                               table['toughness'], '.', ''), None),
+    ]
+    documents = pc.binary_join_element_wise(*parts, '. ', null_handling='skip')
+    rows = table.select(['name', 'mana_cost', 'type_line', 'oracle_text', 'image_uri'])
+    return documents.to_pylist(), rows
+
 def main():
     """
     Main function to read from SQLite, generate embeddings,
@@ -69,55 +118,65 @@ def main():
     model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
     print("Model loaded.")
 
-    # --- Step 3: Read data from the SQLite database ---
-    print("Connecting to SQLite database: cardsupdated.db")
-    conn = sqlite3.connect('C:/Users/csdj9/AppData/Roaming/desktopmtg/scryfall-data/cardsupdated.db')
-    # This is a crucial step! It makes the database return dictionary-like rows
-    # so we can access columns by name (e.g., card['name']).
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    # Fetch all English cards from the database
-    cursor.execute("SELECT * FROM cards WHERE lang = 'en'")
-    all_english_cards = cursor.fetchall()
-    conn.close()
-    print(f"Found {len(all_english_cards)} English cards in the database.")
-
-    # --- Step 4: Prepare the data for embedding and storage ---
-    card_documents_for_embedding = []
-    card_data_for_lancedb = []
-
-    print("Preparing card data...")
-    for card_row in all_english_cards:
-        # Convert the SQLite Row object to a standard Python dictionary
-        card_dict = dict(card_row)
-        
-        # We only process cards that have an English image URI
-        image_uris = card_dict.get('image_uris')
-        if image_uris:
-            try:
-                # Assuming image_uris is a JSON string, parse it
-                uris = json.loads(image_uris)
-                image_uri = uris.get('normal', '')
-            except (json.JSONDecodeError, AttributeError):
+    # --- Step 3: Read the English cards, from the column export if there is one ---
+    cards_export = find_card_export(BUILDER_DATABASE)
+    if cards_export:
+        print(f"Reading card columns from export: {cards_export}")
+        table = read_card_export(cards_export, EXPORT_COLUMNS, where={'lang': 'en'})
+        print(f"Found {table.num_rows} English cards in the export.")
+
+        # --- Step 4: Prepare the data for embedding and storage, column by column ---
+        print("Preparing card data...")
+        card_documents_for_embedding, card_data_for_lancedb = export_card_data(table)
+    else:
+        print(f"Connecting to SQLite database: {CARDS_DATABASE.name}")
+        conn = sqlite3.connect(CARDS_DATABASE)
+        # This is a crucial step! It makes the database return dictionary-like rows
+        # so we can access columns by name (e.g., card['name']).
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        # Fetch all English cards from the database
+        cursor.execute("SELECT * FROM cards WHERE lang = 'en'")
+        all_english_cards = cursor.fetchall()
+        conn.close()
+        print(f"Found {len(all_english_cards)} English cards in the database.")
+
+        # --- Step 4: Prepare the data for embedding and storage ---
+        card_documents_for_embedding = []
+        card_data_for_lancedb = []
+
+        print("Preparing card data...")
+        for card_row in all_english_cards:
+            # Convert the SQLite Row object to a standard Python dictionary
+            card_dict = dict(card_row)
+
+            # We only process cards that have an English image URI
+            image_uris = card_dict.get('image_uris')
+            if image_uris:
+                try:
+                    # Assuming image_uris is a JSON string, parse it
+                    uris = json.loads(image_uris)
+                    image_uri = uris.get('normal', '')
+                except (json.JSONDecodeError, AttributeError):
+                    image_uri = ''
+            else:
                 image_uri = ''
-        else:
-            image_uri = ''
-
-        if not image_uri:
-            continue # Skip cards without a normal image
-
-        # Create the clean text document for the embedding model
-        card_documents_for_embedding.append(create_card_document(card_dict))
-        
-        # Prepare the data we want to save in LanceDB
-        card_data_for_lancedb.append({
-            "name": card_dict.get('name', ''),
-            "mana_cost": card_dict.get('mana_cost', ''),
-            "type_line": card_dict.get('type_line', ''),
-            "oracle_text": card_dict.get('oracle_text', ''),
-            "image_uri": image_uri
-        })
+
+            if not image_uri:
+                continue # Skip cards without a normal image
+
+            # Create the clean text document for the embedding model
+            card_documents_for_embedding.append(create_card_document(card_dict))
+
+            # Prepare the data we want to save in LanceDB
+            card_data_for_lancedb.append({
+                "name": card_dict.get('name', ''),
+                "mana_cost": card_dict.get('mana_cost', ''),
+                "type_line": card_dict.get('type_line', ''),
+                "oracle_text": card_dict.get('oracle_text', ''),
+                "image_uri": image_uri
+            })
 
     # --- Step 5: Generate the Embeddings ---
     print(f"Generating embeddings for {len(card_documents_for_embedding)} cards. This will take some time...")
@@ -128,8 +187,13 @@ def main():
 
     # --- Step 6: Store Everything in LanceDB ---
     # Add the generated vector to each card's data
-    for i, card_data in enumerate(card_data_for_lancedb):
-        card_data['vector'] = embeddings[i]
+    if isinstance(card_data_for_lancedb, pa.Table):
+        vectors = pa.FixedSizeListArray.from_arrays(
+            pa.array(np.asarray(embeddings, dtype=np.float32).ravel()), embeddings.shape[1])
+        card_data_for_lancedb = card_data_for_lancedb.append_column('vector', vectors)
+    else:
+        for i, card_data in enumerate(card_data_for_lancedb):
+            card_data['vector'] = embeddings[i]
 
     print("Connecting to LanceDB and creating table...")
     db = lancedb.connect("C:/Users/csdj9/AppData/Roaming/desktopmtg/vectordb")
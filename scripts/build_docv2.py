@@ -4,14 +4,79 @@ import re
 import hashlib
 import pickle
 import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
 import numpy as np
 import lancedb
 from lancedb.pydantic import LanceModel, Vector
 from sentence_transformers import SentenceTransformer
 import torch  # GPU detection
+from tqdm import tqdm
+
+try:
+    import onnxruntime as ort
+except ImportError:  # optional, only needed for the ONNX backends
+    ort = None
+
+from build_events import BuildEvents
+from card_export import find_card_export, read_card_export
+from embedding_store import (
+    EVICTION_POLICIES,
+    KEY_BYTES,
+    EmbeddingNamespace,
+    cache_bytes,
+    compact_cache,
+    embedding_key,
+    enforce_cache_limit,
+)
+
+VECTORDB_PATH = "C:/Users/csdj9/AppData/Roaming/desktopmtg/vectordb"
+# Per-phase timings of the last run, next to the vector database.
+TIMINGS_FILE = Path(VECTORDB_PATH).parent / "docv2_build_timings.json"
+# Card source: the MTGJSON database (default) or the column export written by
+# `build_card_database.py --export parquet|arrow` next to its cards.db. The two
+# use different card ids, so a table built from one cannot be updated from the
+# other.
+CARDS_SOURCES = ("mtgjson", "export")
+CARDS_SOURCE_ENV = "DESKTOPMTG_CARDS_SOURCE"
+CARDS_DATABASE = Path(VECTORDB_PATH).parent / "scryfall-data" / "cards.db"
+# Set to a number of worker processes (0 = half the CPUs) to encode on CPU
+# with a process pool, see OptimizedSentenceTransformer.start_pool().
+ENCODE_WORKERS_ENV = "DESKTOPMTG_ENCODE_WORKERS"
+# Embedding backends: PyTorch, or ONNX Runtime (CPU) in full precision or with
+# dynamically int8-quantized weights. Pick one with DESKTOPMTG_EMBED_BACKEND.
+EMBED_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBED_BACKEND_ENV = "DESKTOPMTG_EMBED_BACKEND"
+# Hugging Face model cache shipped with the app; exported ONNX models go in
+# its onnx/<model>/<revision>/, see onnx_model_dir().
+MODEL_CACHE_DIR = Path(__file__).resolve().parent.parent / "cache"
+# An ONNX backend is only used if its vectors agree this well with PyTorch's
+# (mean cosine similarity over BACKEND_CHECK_SAMPLE primary documents).
+BACKEND_MIN_COSINE = 0.99
+BACKEND_CHECK_SAMPLE = 512
+# Size cap of the embedding cache directory (see EmbeddingCache).
+EMBEDDING_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# Export column -> key used by the document builders (MTGJSON naming).
+EXPORT_FIELDS = {
+    "id": "uuid",
+    "name": "name",
+    "mana_cost": "manaCost",
+    "cmc": "manaValue",
+    "type_line": "type",
+    "oracle_text": "text",
+    "keywords": "keywords",
+    "colors": "colors",
+    "color_identity": "colorIdentity",
+    "power": "power",
+    "toughness": "toughness",
+    "loyalty": "loyalty",
+    "rarity": "rarity",
+    "set_code": "setCode",
+}
 
 
 class MagicCard(LanceModel):
@@ -108,6 +173,9 @@ def create_card_document(card: dict) -> str:
 class EnhancedDocumentProcessor:
     """Enhanced document processor that creates multiple document representations for each card"""
 
+    # Bump whenever the documents change, so cached embeddings of the old ones are not reused
+    VERSION = "1"
+
     def __init__(self):
         # MTG-specific mappings and patterns
         self.color_names = {
@@ -872,59 +940,132 @@ class EnhancedDocumentProcessor:
 
 
 class EmbeddingCache:
-    """Caching system for embeddings to avoid regenerating identical embeddings"""
+    """Caching system for embeddings to avoid regenerating identical embeddings
+
+    Embeddings live in memory-mapped float32 stores (see embedding_store), in a
+    namespace per model revision, max_seq_length and document processor
+    version, so entries made under another setup are never reused. The cache
+    directory is kept under ``max_bytes``: other namespaces are dropped first,
+    then the least recently (``"lru"``) or least frequently (``"lfu"``) used
+    embeddings of this one.
+    """
 
-    def __init__(self, cache_dir: str = "cache/embeddings"):
+    def __init__(
+        self,
+        cache_dir: str = "cache/embeddings",
+        namespace: Optional[Dict[str, Any]] = None,
+        max_bytes: Optional[int] = EMBEDDING_CACHE_MAX_BYTES,
+        policy: str = "lru",
+    ):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(
+                f"Unknown eviction policy '{policy}', expected one of {', '.join(EVICTION_POLICIES)}"
+            )
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
-        self.cache_stats = {"hits": 0, "misses": 0, "saves": 0}
-
-    def _get_cache_key(self, text: str, model_name: str, embedding_type: str) -> str:
-        """Generate a cache key for the given text and model"""
-        content = f"{model_name}:{embedding_type}:{text}"
-        return hashlib.sha256(content.encode()).hexdigest()
-
-    def _get_cache_path(self, cache_key: str) -> Path:
-        """Get the cache file path for a given cache key"""
-        return self.cache_dir / f"{cache_key}.pkl"
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.cache_stats = {"hits": 0, "misses": 0, "saves": 0, "evictions": 0}
+        self.namespace = EmbeddingNamespace(self.cache_dir, namespace or {})
+        self._migrate_legacy()
+
+    def _migrate_legacy(self) -> None:
+        """Adopt the pickle files of older caches into a new namespace
+
+        The pickle cache (one file per text) predates namespaces. Its entries
+        are moved into the namespace if it is still empty, and removed
+        otherwise.
+        """
+        paths = list(self.cache_dir.glob("*.pkl"))
+        if not paths:
+            return
+        if len(self.namespace) == 0:
+            print(
+                f"Migrating cached embeddings to namespace {self.namespace.directory.name}..."
+            )
+            by_dim: Dict[int, Tuple[List[bytes], List[np.ndarray]]] = {}
+            for path in paths:
+                try:
+                    with open(path, "rb") as f:
+                        embedding = np.asarray(pickle.load(f), dtype=np.float32).ravel()
+                    keys, vectors = by_dim.setdefault(embedding.shape[0], ([], []))
+                    # The file name is the hex SHA-256 the store keys are cut from
+                    keys.append(bytes.fromhex(path.stem)[:KEY_BYTES])
+                    vectors.append(embedding)
+                except Exception as e:
+                    print(
+                        f"Warning: Skipping unreadable cached embedding {path.name}: {e}"
+                    )
+            for keys, vectors in by_dim.values():
+                self.namespace.append(keys, np.stack(vectors))
+            self.namespace.flush()
+        for path in paths:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def get_many(
+        self, texts: List[str], model_name: str, embedding_type: str
+    ) -> List[Optional[np.ndarray]]:
+        """Retrieve the cached embedding of each text (None where there is none)"""
+        keys = [embedding_key(text, model_name, embedding_type) for text in texts]
+        results = self.namespace.lookup(keys)
+        hits = sum(result is not None for result in results)
+        self.cache_stats["hits"] += hits
+        self.cache_stats["misses"] += len(texts) - hits
+        return results
 
     def get(
         self, text: str, model_name: str, embedding_type: str
     ) -> Optional[np.ndarray]:
         """Retrieve embedding from cache if it exists"""
-        cache_key = self._get_cache_key(text, model_name, embedding_type)
-        cache_path = self._get_cache_path(cache_key)
+        return self.get_many([text], model_name, embedding_type)[0]
 
-        if cache_path.exists():
-            try:
-                with open(cache_path, "rb") as f:
-                    embedding = pickle.load(f)
-                self.cache_stats["hits"] += 1
-                return embedding
-            except Exception as e:
-                print(f"Warning: Failed to load cached embedding {cache_key}: {e}")
-                # Remove corrupted cache file
-                try:
-                    cache_path.unlink()
-                except:
-                    pass
-
-        self.cache_stats["misses"] += 1
-        return None
+    def set_many(
+        self,
+        texts: List[str],
+        model_name: str,
+        embedding_type: str,
+        embeddings: List[np.ndarray],
+    ) -> None:
+        """Store embeddings in cache, evicting old ones if it grows past ``max_bytes``"""
+        if not texts:
+            return
+        try:
+            keys = [embedding_key(text, model_name, embedding_type) for text in texts]
+            self.cache_stats["saves"] += self.namespace.append(keys, embeddings)
+            if self.max_bytes is not None:
+                result = enforce_cache_limit(
+                    self.cache_dir, self.max_bytes, self.policy, self.namespace
+                )
+                self.cache_stats["evictions"] += result["evicted"]
+            self.namespace.flush()
+        except Exception as e:
+            print(f"Warning: Failed to cache {len(texts)} embeddings: {e}")
 
     def set(
         self, text: str, model_name: str, embedding_type: str, embedding: np.ndarray
     ) -> None:
         """Store embedding in cache"""
-        cache_key = self._get_cache_key(text, model_name, embedding_type)
-        cache_path = self._get_cache_path(cache_key)
-
-        try:
-            with open(cache_path, "wb") as f:
-                pickle.dump(embedding, f)
-            self.cache_stats["saves"] += 1
-        except Exception as e:
-            print(f"Warning: Failed to cache embedding {cache_key}: {e}")
+        self.set_many([text], model_name, embedding_type, [embedding])
+
+    def flush(self) -> None:
+        """Save the use counts and times that eviction is based on"""
+        self.namespace.flush()
+
+    def compact(self, keep_namespaces: int = 1) -> Dict[str, int]:
+        """Drop all but the most recent namespaces (this one included) and apply the size cap"""
+        self.namespace.flush()
+        result = compact_cache(
+            self.cache_dir,
+            self.max_bytes,
+            self.policy,
+            self.namespace,
+            keep_namespaces,
+        )
+        self.cache_stats["evictions"] += result["evicted"]
+        return result
 
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
@@ -937,6 +1078,11 @@ class EmbeddingCache:
             **self.cache_stats,
             "total_requests": total_requests,
             "hit_rate": hit_rate,
+            "entries": len(self.namespace),
+            "bytes": cache_bytes(self.cache_dir),
+            "max_bytes": self.max_bytes,
+            "policy": self.policy,
+            "namespace": self.namespace.fields,
         }
 
     def clear(self) -> None:
@@ -946,21 +1092,218 @@ class EmbeddingCache:
         if self.cache_dir.exists():
             shutil.rmtree(self.cache_dir)
             self.cache_dir.mkdir(parents=True, exist_ok=True)
-        self.cache_stats = {"hits": 0, "misses": 0, "saves": 0}
+        self.namespace = EmbeddingNamespace(self.cache_dir, self.namespace.fields)
+        self.cache_stats = {"hits": 0, "misses": 0, "saves": 0, "evictions": 0}
+
+
+def onnx_model_dir(model_name: str, revision: str) -> Path:
+    """Where the ONNX exports of one revision of a model are kept
+
+    The revision (see model_revision) is part of the path, so a model is
+    exported again, and checked again, whenever its weights change.
+    """
+    return MODEL_CACHE_DIR / "onnx" / model_name / revision
+
+
+def export_onnx(model: SentenceTransformer, path: Path) -> None:
+    """Export the transformer of ``model`` (up to its token embeddings) to ONNX"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    transformer = model[0].auto_model.to("cpu")
+    features = model.tokenize(["Flying. When this creature enters, draw a card."])
+    names = [
+        name
+        for name in ("input_ids", "attention_mask", "token_type_ids")
+        if name in features
+    ]
+    dynamic_axes = {
+        name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]
+    }
+    temp_path = path.with_name(path.name + ".tmp")
+    print(f"Exporting {path.parent.parent.name} to ONNX: {path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(features[name] for name in names),
+            str(temp_path),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            do_constant_folding=True,
+        )
+    os.replace(temp_path, path)
+
+
+def quantize_onnx(source: Path, path: Path) -> None:
+    """Write a copy of an ONNX model with dynamically int8-quantized weights"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    temp_path = path.with_name(path.name + ".tmp")
+    print(f"Quantizing ONNX model to int8: {path}")
+    quantize_dynamic(str(source), str(temp_path), weight_type=QuantType.QInt8)
+    os.replace(temp_path, path)
+
+
+class OnnxEmbeddingBackend:
+    """ONNX Runtime inference of a sentence-transformers model on CPU
+
+    The ONNX graph ends at the transformer's token embeddings; mean pooling
+    over the attention mask and L2 normalization are applied here, as the
+    model's Pooling and Normalize modules do. The model is exported to (and
+    quantized in) ``onnx_dir`` the first time. The last comparison with
+    PyTorch (see OptimizedSentenceTransformer.check_backend) is kept next to
+    the ONNX file, so it only has to run again when that file changes.
+    """
+
+    def __init__(
+        self,
+        model: SentenceTransformer,
+        onnx_dir: Path,
+        quantize: bool = False,
+        threads: int = 0,
+    ):
+        if ort is None:
+            raise ImportError("The ONNX backends require the 'onnxruntime' package")
+        modules = {type(module).__name__: module for module in model}
+        pooling = modules.get("Pooling")
+        if pooling is None or not getattr(pooling, "pooling_mode_mean_tokens", False):
+            raise ValueError("The ONNX backends only implement mean pooling")
+        self.normalize = "Normalize" in modules
+
+        full_precision = onnx_dir / "model.onnx"
+        self.path = onnx_dir / "model_quantized.onnx" if quantize else full_precision
+        if not full_precision.exists():
+            export_onnx(model, full_precision)
+        if quantize and not self.path.exists():
+            quantize_onnx(full_precision, self.path)
+        self.check_file = self.path.with_suffix(".check.json")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads or torch.get_num_threads()
+        self.session = ort.InferenceSession(
+            str(self.path), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [
+            graph_input.name for graph_input in self.session.get_inputs()
+        ]
+
+    def encode(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Sentence embeddings of a padded batch (input_ids, attention_mask, ...)"""
+        inputs = {
+            name: np.asarray(features[name], dtype=np.int64)
+            for name in self.input_names
+        }
+        token_embeddings = self.session.run(None, inputs)[0]
+        mask = np.asarray(features["attention_mask"], dtype=np.float32)[..., None]
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.maximum(
+            mask.sum(axis=1), 1e-9
+        )
+        if self.normalize:
+            embeddings /= np.maximum(
+                np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12
+            )
+        return embeddings.astype(np.float32)
+
+    def fingerprint(self) -> Dict[str, Any]:
+        """Identifies the ONNX file a check report was made with"""
+        stat = self.path.stat()
+        return {
+            "file": str(self.path.relative_to(MODEL_CACHE_DIR)),
+            "bytes": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+    def load_check(self) -> Optional[Dict[str, Any]]:
+        """The saved check report of this ONNX file, if there is one"""
+        try:
+            report = json.loads(self.check_file.read_text())
+        except (OSError, ValueError):
+            return None
+        if report.get("fingerprint") != self.fingerprint():
+            return None
+        report["accepted"] = report["mean_cosine"] >= BACKEND_MIN_COSINE
+        return report
+
+    def save_check(self, report: Dict[str, Any]) -> None:
+        """Keep a check report of this ONNX file for later runs"""
+        report = dict(report, fingerprint=self.fingerprint())
+        temp_path = self.check_file.with_name(self.check_file.name + ".tmp")
+        temp_path.write_text(json.dumps(report, indent=2))
+        os.replace(temp_path, self.check_file)
+
+
+def model_revision(model: SentenceTransformer) -> str:
+    """Commit of the model snapshot it was loaded from, else a hash of its config"""
+    try:
+        config = model[0].auto_model.config
+    except (AttributeError, IndexError, KeyError, TypeError):
+        return "unknown"
+    revision = getattr(config, "_commit_hash", None)
+    if revision:
+        return revision
+    return hashlib.sha256(config.to_json_string().encode()).hexdigest()[:12]
 
 
 class OptimizedSentenceTransformer:
     """Optimized wrapper for SentenceTransformer with MTG-specific optimizations"""
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", device: str = "cpu"):
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        device: str = "cpu",
+        processor_version: str = EnhancedDocumentProcessor.VERSION,
+        cache_max_bytes: Optional[int] = EMBEDDING_CACHE_MAX_BYTES,
+        cache_policy: str = "lru",
+        use_cache: bool = True,
+        backend: str = "torch",
+    ):
+        if backend not in EMBED_BACKENDS:
+            raise ValueError(
+                f"Unknown embedding backend '{backend}', expected one of {', '.join(EMBED_BACKENDS)}"
+            )
+        if backend != "torch" and str(device) != "cpu":
+            raise ValueError(f"The {backend} backend only runs on CPU")
         self.model_name = model_name
         self.device = device
+        self.backend = backend
         self.model = SentenceTransformer(model_name, device=device)
-        self.cache = EmbeddingCache()
+        # When set, encoding reports "progress" events per batch
+        self.events: Optional[BuildEvents] = None
+        # Padding statistics of the last encode_with_cache call that encoded texts
+        self.last_batching_stats: Optional[Dict[str, Any]] = None
+        # CPU worker processes, see start_pool()
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pool_workers = 0
 
         # Apply MTG-specific optimizations
         self._apply_model_optimizations()
 
+        # The PyTorch model still tokenizes, and is what an ONNX model is exported from
+        self.onnx: Optional[OnnxEmbeddingBackend] = None
+        if backend != "torch":
+            self.onnx = OnnxEmbeddingBackend(
+                self.model,
+                onnx_model_dir(model_name, model_revision(self.model)),
+                quantize=backend == "onnx-int8",
+            )
+
+        # Cached embeddings are only valid for this model, truncation and documents.
+        # Pool workers (use_cache=False) leave the cache to the parent process.
+        self.cache = None
+        if use_cache:
+            namespace = {
+                "model": model_name,
+                "revision": model_revision(self.model),
+                "max_seq_length": getattr(self.model, "max_seq_length", None),
+                "processor_version": processor_version,
+            }
+            if backend != "torch":
+                namespace["backend"] = backend
+            self.cache = EmbeddingCache(
+                namespace=namespace, max_bytes=cache_max_bytes, policy=cache_policy
+            )
+
     def _apply_model_optimizations(self):
         """Apply model parameter optimizations for MTG-specific content"""
         # Set optimal batch size based on device
@@ -976,6 +1319,13 @@ class OptimizedSentenceTransformer:
             # MTG card text is typically shorter, so we can optimize for that
             self.model.max_seq_length = min(self.model.max_seq_length, 256)
 
+        # Batches are filled up to this many padded tokens: as many texts as
+        # one fixed batch of full-length texts, far more for short documents
+        self.token_budget = self.optimal_batch_size * getattr(
+            self.model, "max_seq_length", 256
+        )
+        self.max_batch_size = self.optimal_batch_size * 8
+
     def encode_with_cache(
         self,
         texts: List[str],
@@ -983,18 +1333,15 @@ class OptimizedSentenceTransformer:
         show_progress_bar: bool = True,
     ) -> List[np.ndarray]:
         """Encode texts with caching support"""
-        cached_embeddings = []
-        texts_to_encode = []
-        cache_indices = []
-
-        # Check cache for each text
-        for i, text in enumerate(texts):
-            cached_embedding = self.cache.get(text, self.model_name, embedding_type)
-            if cached_embedding is not None:
-                cached_embeddings.append((i, cached_embedding))
-            else:
-                texts_to_encode.append(text)
-                cache_indices.append(i)
+        self.last_batching_stats = None
+        cached = self.cache.get_many(texts, self.model_name, embedding_type)
+        cached_embeddings = [
+            (i, embedding)
+            for i, embedding in enumerate(cached)
+            if embedding is not None
+        ]
+        cache_indices = [i for i, embedding in enumerate(cached) if embedding is None]
+        texts_to_encode = [texts[i] for i in cache_indices]
 
         # Encode uncached texts
         new_embeddings = []
@@ -1004,17 +1351,40 @@ class OptimizedSentenceTransformer:
                     f"Encoding {len(texts_to_encode)} new {embedding_type} embeddings (cache hit rate: {self.cache.get_stats()['hit_rate']:.2%})"
                 )
 
-            new_embeddings = self.model.encode(
-                texts_to_encode,
-                show_progress_bar=show_progress_bar,
-                device=self.device,
-                convert_to_numpy=True,
-                batch_size=self.optimal_batch_size,
+            # Identical documents (e.g. of reprints) are encoded once
+            unique_texts = list(dict.fromkeys(texts_to_encode))
+            encode = (
+                self._encode_in_pool
+                if self.pool is not None and len(unique_texts) >= self.pool_workers * 64
+                else self._encode_bucketed
+            )
+            unique_embeddings = encode(
+                unique_texts,
+                embedding_type,
+                show_progress_bar,
+                cache_hits=len(cached_embeddings),
             )
+            if len(unique_texts) == len(texts_to_encode):
+                new_embeddings = unique_embeddings
+            else:
+                positions = {text: i for i, text in enumerate(unique_texts)}
+                new_embeddings = unique_embeddings[
+                    [positions[text] for text in texts_to_encode]
+                ]
+            stats = self.last_batching_stats
+            if show_progress_bar:
+                print(
+                    f"Padding waste: {stats['padding_waste']:.1%} in {stats['batches']} length-bucketed batches "
+                    f"(arrival order: {stats['arrival_order_padding_waste']:.1%})"
+                )
 
             # Cache new embeddings
-            for text, embedding in zip(texts_to_encode, new_embeddings):
-                self.cache.set(text, self.model_name, embedding_type, embedding)
+            self.cache.set_many(
+                texts_to_encode, self.model_name, embedding_type, new_embeddings
+            )
+
+        # Keep the use counts eviction relies on, also for fully cached sets
+        self.cache.flush()
 
         # Combine cached and new embeddings in correct order
         result = [None] * len(texts)
@@ -1029,6 +1399,239 @@ class OptimizedSentenceTransformer:
 
         return result
 
+    def _embed_batch(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Sentence embeddings of one padded batch, from the selected backend"""
+        if self.onnx is not None:
+            return self.onnx.encode(features)
+        tensors = {
+            key: torch.from_numpy(value).to(self.device)
+            for key, value in features.items()
+        }
+        with torch.inference_mode():
+            vectors = self.model(tensors)["sentence_embedding"]
+        return vectors.float().cpu().numpy()
+
+    def check_backend(self, texts: List[str]) -> Dict[str, Any]:
+        """Compare the ONNX backend with PyTorch on ``texts``
+
+        Reports the cosine similarity between the vectors of both backends
+        and their throughput. ``accepted`` is False when the mean cosine is
+        below BACKEND_MIN_COSINE, i.e. the backend should not be used.
+        """
+        onnx = self.onnx
+        events, self.events = self.events, None
+        vectors = {}
+        seconds = {}
+        try:
+            for name, backend in (("torch", None), (self.backend, onnx)):
+                self.onnx = backend
+                self._encode_bucketed(texts[:8], "check", False)  # warm-up
+                start = time.perf_counter()
+                vectors[name] = self._encode_bucketed(texts, "check", False)
+                seconds[name] = time.perf_counter() - start
+        finally:
+            self.onnx = onnx
+            self.events = events
+        reference, candidate = vectors["torch"], vectors[self.backend]
+        cosine = (reference * candidate).sum(axis=1) / np.maximum(
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1),
+            1e-12,
+        )
+        report = {
+            "backend": self.backend,
+            "sample": len(texts),
+            "mean_cosine": round(float(cosine.mean()), 5),
+            "min_cosine": round(float(cosine.min()), 5),
+            "torch_per_sec": round(len(texts) / seconds["torch"], 1),
+            "backend_per_sec": round(len(texts) / seconds[self.backend], 1),
+            "speedup": round(seconds["torch"] / seconds[self.backend], 2),
+        }
+        report["accepted"] = report["mean_cosine"] >= BACKEND_MIN_COSINE
+        return report
+
+    def _length_buckets(self, lengths: np.ndarray) -> List[np.ndarray]:
+        """Split text indices into batches of similar token length within the token budget"""
+        # Longest first, so the largest padded batch is allocated up front
+        order = np.argsort(-lengths, kind="stable")
+        batches = []
+        start = 0
+        while start < len(order):
+            longest = max(int(lengths[order[start]]), 1)
+            size = max(1, min(self.max_batch_size, self.token_budget // longest))
+            batches.append(order[start : start + size])
+            start += size
+        return batches
+
+    def _encode_bucketed(
+        self,
+        texts: List[str],
+        embedding_type: str,
+        show_progress_bar: bool,
+        cache_hits: int = 0,
+    ) -> np.ndarray:
+        """Encode texts in length-bucketed batches, each padded only to its longest text
+
+        The texts are tokenized once, sorted by token count and cut into
+        batches of up to ``token_budget`` padded tokens, so short documents go
+        in large batches and long ones in small batches. The embeddings come
+        back in the order of ``texts``. Padding statistics of the run are left
+        in ``last_batching_stats``.
+        """
+        if getattr(self.model[0], "do_lower_case", False):
+            texts = [text.lower() for text in texts]
+        tokens = self.model.tokenizer(
+            texts,
+            truncation=True,
+            max_length=self.model.max_seq_length,
+            return_attention_mask=False,
+        )
+        lengths = np.fromiter((len(ids) for ids in tokens["input_ids"]), np.int64)
+        batches = self._length_buckets(lengths)
+
+        embeddings: Optional[np.ndarray] = None
+        done = 0
+        progress = tqdm(
+            total=len(texts),
+            disable=not show_progress_bar,
+            desc=f"Encoding {embedding_type}",
+        )
+        for batch in batches:
+            features = self.model.tokenizer.pad(
+                {key: [values[i] for i in batch] for key, values in tokens.items()},
+                padding=True,
+                return_tensors="np",
+            )
+            vectors = self._embed_batch(features)
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+            done += len(batch)
+            progress.update(len(batch))
+            if self.events is not None:
+                self.events.progress(
+                    f"embed_{embedding_type}",
+                    done,
+                    len(texts),
+                    unit="embeddings",
+                    force=done == len(texts),
+                    cache_hits=cache_hits,
+                )
+        progress.close()
+
+        real_tokens = int(lengths.sum())
+        padded_tokens = sum(len(batch) * int(lengths[batch].max()) for batch in batches)
+        arrival_padded = sum(
+            len(chunk) * int(chunk.max())
+            for chunk in np.array_split(
+                lengths,
+                range(self.optimal_batch_size, len(lengths), self.optimal_batch_size),
+            )
+        )
+        self.last_batching_stats = batching_stats(
+            [
+                {
+                    "documents": len(texts),
+                    "batches": len(batches),
+                    "tokens": real_tokens,
+                    "padded_tokens": padded_tokens,
+                    "arrival_padded_tokens": arrival_padded,
+                }
+            ]
+        )
+        return embeddings
+
+    def start_pool(self, workers: int = 0, threads_per_worker: int = 0) -> None:
+        """Encode on CPU with worker processes, each holding its own copy of the model
+
+        ``workers`` = 0 uses half the CPUs. ``threads_per_worker`` = 0 splits
+        the CPUs evenly between the workers: a 6-layer MiniLM gains little
+        from intra-op threads, so a few threads in each of several processes
+        keep more cores busy than one process with many threads.
+        """
+        cpus = os.cpu_count() or 1
+        workers = workers if workers > 0 else max(1, cpus // 2)
+        threads_per_worker = threads_per_worker or max(1, cpus // workers)
+        self.close_pool()
+        print(
+            f"Starting {workers} encoding workers with {threads_per_worker} threads each"
+        )
+        # Spawned (not forked) workers: torch's thread pools do not survive a fork
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_encode_worker,
+            initargs=(
+                self.model_name,
+                threads_per_worker,
+                self.model.max_seq_length,
+                self.backend,
+            ),
+        )
+        self.pool_workers = workers
+
+    def close_pool(self) -> None:
+        """Stop the encoding workers, if any"""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+            self.pool_workers = 0
+
+    def _encode_in_pool(
+        self,
+        texts: List[str],
+        embedding_type: str,
+        show_progress_bar: bool,
+        cache_hits: int = 0,
+    ) -> np.ndarray:
+        """Encode texts across the worker pool and return them in input order
+
+        Texts are sorted by length (longest first, so no worker is left with
+        a long tail) and cut into several chunks per worker; each worker
+        batches its chunk like ``_encode_bucketed``.
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        chunk_size = max(64, -(-len(texts) // (self.pool_workers * 4)))
+        chunks = [
+            order[start : start + chunk_size]
+            for start in range(0, len(order), chunk_size)
+        ]
+        futures = [
+            self.pool.submit(
+                encode_texts_in_worker, [texts[i] for i in chunk], embedding_type
+            )
+            for chunk in chunks
+        ]
+
+        embeddings: Optional[np.ndarray] = None
+        chunk_stats = []
+        done = 0
+        progress = tqdm(
+            total=len(texts),
+            disable=not show_progress_bar,
+            desc=f"Encoding {embedding_type} ({self.pool_workers} workers)",
+        )
+        for chunk, future in zip(chunks, futures):
+            vectors, stats = future.result()
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[chunk] = vectors
+            chunk_stats.append(stats)
+            done += len(chunk)
+            progress.update(len(chunk))
+            if self.events is not None:
+                self.events.progress(
+                    f"embed_{embedding_type}",
+                    done,
+                    len(texts),
+                    unit="embeddings",
+                    force=done == len(texts),
+                    cache_hits=cache_hits,
+                    workers=self.pool_workers,
+                )
+        progress.close()
+        self.last_batching_stats = batching_stats(chunk_stats)
+        return embeddings
+
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
         return self.cache.get_stats()
@@ -1038,6 +1641,53 @@ class OptimizedSentenceTransformer:
         self.cache.clear()
 
 
+def batching_stats(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Padding statistics of one or more encoded runs (e.g. the chunks of the workers)"""
+    stats = {
+        key: sum(part[key] for part in parts)
+        for key in (
+            "documents",
+            "batches",
+            "tokens",
+            "padded_tokens",
+            "arrival_padded_tokens",
+        )
+    }
+    stats["padding_waste"] = round(1 - stats["tokens"] / stats["padded_tokens"], 4)
+    stats["arrival_order_padding_waste"] = round(
+        1 - stats["tokens"] / stats["arrival_padded_tokens"], 4
+    )
+    return stats
+
+
+# Model of the current encoding worker process, see init_encode_worker.
+_worker_model: Optional[OptimizedSentenceTransformer] = None
+
+
+def init_encode_worker(
+    model_name: str, threads: int, max_seq_length: int, backend: str = "torch"
+) -> None:
+    """Process-pool initializer that loads the model once per worker"""
+    global _worker_model
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # only possible before the first parallel operation
+    _worker_model = OptimizedSentenceTransformer(
+        model_name, "cpu", use_cache=False, backend=backend
+    )
+    _worker_model.model.max_seq_length = max_seq_length
+
+
+def encode_texts_in_worker(
+    texts: List[str], embedding_type: str
+) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Encode a chunk of texts (runs in worker processes)"""
+    embeddings = _worker_model._encode_bucketed(texts, embedding_type, False)
+    return embeddings, _worker_model.last_batching_stats
+
+
 def validate_embedding_quality(
     embeddings: List[np.ndarray], documents: List[str], embedding_type: str
 ) -> Dict[str, Any]:
@@ -1126,9 +1776,12 @@ def validate_embedding_quality(
 def generate_embeddings_sequential(
     model: OptimizedSentenceTransformer,
     document_sets: Dict[str, List[str]],
+    events: Optional[BuildEvents] = None,
 ) -> Dict[str, List[np.ndarray]]:
     """Generate embeddings for multiple document types sequentially to avoid GPU conflicts"""
     results = {}
+    events = events or BuildEvents("docv2")
+    model.events = events
 
     def encode_document_type(
         embedding_type: str, documents: List[str]
@@ -1144,7 +1797,18 @@ def generate_embeddings_sequential(
     # Process each document type sequentially to avoid GPU conflicts
     for doc_type, docs in document_sets.items():
         try:
-            embedding_type, embeddings = encode_document_type(doc_type, docs)
+            before = model.get_cache_stats()
+            with events.phase(f"embed_{doc_type}") as phase:
+                embedding_type, embeddings = encode_document_type(doc_type, docs)
+                after = model.get_cache_stats()
+                hits = after["hits"] - before["hits"]
+                phase["documents"] = len(docs)
+                phase["embeddings"] = after["misses"] - before["misses"]
+                phase["cache_hits"] = hits
+                phase["cache_hit_rate"] = round(hits / len(docs), 4) if docs else 0.0
+                if model.last_batching_stats:
+                    phase["padding_waste"] = model.last_batching_stats["padding_waste"]
+                    phase["batches"] = model.last_batching_stats["batches"]
             results[embedding_type] = embeddings
             print(
                 f"✅ {embedding_type} embeddings completed ({len(embeddings)} embeddings)"
@@ -1213,6 +1877,15 @@ def generate_embeddings_batch(
     return all_embeddings
 
 
+def iter_export_cards(table: Any) -> Iterator[Dict[str, Any]]:
+    """Cards of an export ``pyarrow.Table`` as document builder dicts, one record batch at a time"""
+    keys = [EXPORT_FIELDS[name] for name in table.column_names]
+    for batch in table.to_batches():
+        columns = [column.to_pylist() for column in batch.columns]
+        for values in zip(*columns):
+            yield dict(zip(keys, values))
+
+
 def calculate_complexity_score(card: Dict[str, Any]) -> float:
     """Calculate a complexity score for the card (0.0-1.0)"""
     score = 0.0
@@ -1334,12 +2007,22 @@ def main():
         print("CUDA is not available")
     print(f"Using device: {device}")
 
+    # Progress/timing events (JSON lines on stdout with DESKTOPMTG_EVENTS=1)
+    events = BuildEvents("docv2", summary_file=TIMINGS_FILE)
+
     # Initialize optimized model and document processor
-    model = OptimizedSentenceTransformer("all-MiniLM-L6-v2", device)
+    backend = os.environ.get(EMBED_BACKEND_ENV, "torch")
+    if backend != "torch" and device != "cpu":
+        print(f"The {backend} backend runs on CPU only, using PyTorch on {device}")
+        backend = "torch"
+    with events.phase("load_model", device=str(device), backend=backend):
+        model = OptimizedSentenceTransformer(
+            "all-MiniLM-L6-v2", device, backend=backend
+        )
     doc_processor = EnhancedDocumentProcessor()
 
     # Connect to LanceDB and get existing card UUIDs
-    db = lancedb.connect("C:/Users/csdj9/AppData/Roaming/desktopmtg/vectordb")
+    db = lancedb.connect(VECTORDB_PATH)
     table_names = db.table_names()
     existing_uuids = set()
     table_exists = "magic_cards" in table_names
@@ -1363,26 +2046,69 @@ def main():
     from pathlib import Path
 
     DB_PATH = r"C:\Users\csdj9\AppData\Roaming\desktopmtg\Database\database.sqlite"
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM cards")
-    rows = cursor.fetchall()
-    conn.close()
-
-    print(f"Loaded {len(rows)} cards from database. Filtering for new cards...")
-    
-    new_cards = []
-    for row in rows:
-        card = dict(row)
-        if card.get('uuid') not in existing_uuids:
-            new_cards.append(card)
-
-    if not new_cards:
+    card_source = os.environ.get(CARDS_SOURCE_ENV, "mtgjson")
+    if card_source not in CARDS_SOURCES:
+        raise ValueError(
+            f"Unknown card source '{card_source}', expected one of {', '.join(CARDS_SOURCES)}"
+        )
+    with events.phase("load_cards", source=card_source) as phase:
+        if card_source == "export":
+            # pyarrow is only needed for the export source, see card_export
+            import pyarrow as pa
+            import pyarrow.compute as pc
+
+            # Only the needed columns are read (memory-mapped) from the export,
+            # and only the new cards are turned into Python objects
+            cards_export = find_card_export(CARDS_DATABASE)
+            if cards_export is None:
+                raise FileNotFoundError(
+                    f"No card export next to {CARDS_DATABASE}; run "
+                    "build_card_database.py --export parquet (or arrow)"
+                )
+            print(f"Reading card columns from export: {cards_export}")
+            table = read_card_export(
+                cards_export, list(EXPORT_FIELDS), where={"lang": "en"}
+            )
+            card_count = table.num_rows
+            if existing_uuids:
+                known = pc.is_in(
+                    table["id"], value_set=pa.array(list(existing_uuids), pa.string())
+                )
+                table = table.filter(pc.invert(known))
+            new_count = table.num_rows
+            new_cards = iter_export_cards(table)
+        else:
+            conn = sqlite3.connect(DB_PATH)
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM cards")
+            rows = cursor.fetchall()
+            conn.close()
+            card_count = len(rows)
+
+            new_cards = []
+            for row in rows:
+                card = dict(row)
+                if card.get("uuid") not in existing_uuids:
+                    new_cards.append(card)
+            new_count = len(new_cards)
+        phase["rows"] = card_count
+
+    print(f"Loaded {card_count} cards from database.")
+    # Scryfall ids (export) and MTGJSON uuids never match: the table was built
+    # from the other source and would end up holding every card twice
+    if existing_uuids and card_count and new_count == card_count:
+        raise ValueError(
+            f"The 'magic_cards' table was not built from the {card_source} card source; "
+            f"set {CARDS_SOURCE_ENV} to the source it was built from, or delete the table to rebuild it"
+        )
+
+    if not new_count:
         print("No new cards to add to the vector database. Exiting.")
+        events.write_summary("skipped", cards=card_count)
         return
 
-    print(f"Found {len(new_cards)} new cards to process.")
+    print(f"Found {new_count} new cards to process.")
 
     # Prepare documents and records
     primary_docs: List[str] = []
@@ -1391,72 +2117,73 @@ def main():
     records: List[dict] = []
 
     print("Processing new cards and creating document representations...")
+    with events.phase("documents") as phase:
+        for card in new_cards:
+            # Parse string fields that might contain multiple values
+            if isinstance(card.get("keywords"), str):
+                card["keywords"] = (
+                    [k.strip() for k in card["keywords"].split(",") if k.strip()]
+                    if card["keywords"]
+                    else []
+                )
 
-    for card in new_cards:
-        # Parse string fields that might contain multiple values
-        if isinstance(card.get("keywords"), str):
-            card["keywords"] = (
-                [k.strip() for k in card["keywords"].split(",") if k.strip()]
-                if card["keywords"]
-                else []
-            )
-
-        if isinstance(card.get("colors"), str):
-            card["colors"] = list(card["colors"]) if card["colors"] else []
+            if isinstance(card.get("colors"), str):
+                card["colors"] = list(card["colors"]) if card["colors"] else []
 
-        if isinstance(card.get("colorIdentity"), str):
-            card["colorIdentity"] = (
-                list(card["colorIdentity"]) if card["colorIdentity"] else []
-            )
-
-        # Skip non-English or incomplete entries
-        if not card.get("name") or not isinstance(card.get("text"), (str, type(None))):
-            continue
-
-        # Create multiple document representations
-        enhanced_docs = doc_processor.create_enhanced_document(card)
-
-        primary_docs.append(enhanced_docs["primary_doc"])
-        keyword_docs.append(enhanced_docs["keyword_doc"])
-        context_docs.append(enhanced_docs["context_doc"])
-
-        # Generate additional metadata
-        complexity_score = calculate_complexity_score(card)
-        popularity_score = calculate_popularity_score(card)
-        search_tags = generate_search_tags(card)
-        gameplay_context = doc_processor._generate_strategic_context(card)
-
-        # For now, set empty image_uri since the database doesn't seem to have image_uris field
-        image_uri = ""
-
-        # Build record for LanceDB with enhanced fields
-        record = {
-            "uuid": card.get("uuid"),
-            "name": card.get("name", ""),
-            "mana_cost": card.get("manaCost") or "",
-            "mana_value": card.get("manaValue") or 0,
-            "type_line": card.get("type", ""),
-            "oracle_text": card.get("text"),
-            "image_uri": image_uri,
-            "keywords": card.get("keywords") or [],
-            "colors": card.get("colors") or [],
-            "color_identity": card.get("colorIdentity") or [],
-            "power": card.get("power"),
-            "toughness": card.get("toughness"),
-            "loyalty": card.get("loyalty"),
-            "rarity": card.get("rarity", ""),
-            "legalities": "{}",  # No legalities field in the database
-            "set_name": card.get("setCode", ""),
-            # Enhanced search fields
-            "normalized_text": enhanced_docs["primary_doc"],  # MTG-normalized text
-            "expanded_abilities": enhanced_docs["context_doc"],  # Expanded abilities
-            "gameplay_context": gameplay_context,  # Strategic context
-            "search_tags": search_tags,  # Search tags
-            "complexity_score": complexity_score,  # Complexity score
-            "popularity_score": popularity_score,  # Popularity score
-        }
+            if isinstance(card.get("colorIdentity"), str):
+                card["colorIdentity"] = (
+                    list(card["colorIdentity"]) if card["colorIdentity"] else []
+                )
 
-        records.append(record)
+            # Skip non-English or incomplete entries
+            if not card.get("name") or not isinstance(card.get("text"), (str, type(None))):
+                continue
+
+            # Create multiple document representations
+            enhanced_docs = doc_processor.create_enhanced_document(card)
+
+            primary_docs.append(enhanced_docs["primary_doc"])
+            keyword_docs.append(enhanced_docs["keyword_doc"])
+            context_docs.append(enhanced_docs["context_doc"])
+
+            # Generate additional metadata
+            complexity_score = calculate_complexity_score(card)
+            popularity_score = calculate_popularity_score(card)
+            search_tags = generate_search_tags(card)
+            gameplay_context = doc_processor._generate_strategic_context(card)
+
+            # For now, set empty image_uri since the database doesn't seem to have image_uris field
+            image_uri = ""
+
+            # Build record for LanceDB with enhanced fields
+            record = {
+                "uuid": card.get("uuid"),
+                "name": card.get("name", ""),
+                "mana_cost": card.get("manaCost") or "",
+                "mana_value": card.get("manaValue") or 0,
+                "type_line": card.get("type", ""),
+                "oracle_text": card.get("text"),
+                "image_uri": image_uri,
+                "keywords": card.get("keywords") or [],
+                "colors": card.get("colors") or [],
+                "color_identity": card.get("colorIdentity") or [],
+                "power": card.get("power"),
+                "toughness": card.get("toughness"),
+                "loyalty": card.get("loyalty"),
+                "rarity": card.get("rarity", ""),
+                "legalities": "{}",  # No legalities field in the database
+                "set_name": card.get("setCode", ""),
+                # Enhanced search fields
+                "normalized_text": enhanced_docs["primary_doc"],  # MTG-normalized text
+                "expanded_abilities": enhanced_docs["context_doc"],  # Expanded abilities
+                "gameplay_context": gameplay_context,  # Strategic context
+                "search_tags": search_tags,  # Search tags
+                "complexity_score": complexity_score,  # Complexity score
+                "popularity_score": popularity_score,  # Popularity score
+            }
+
+            records.append(record)
+        phase["rows"] = len(records)
 
     print(f"Created {len(records)} card records with enhanced metadata")
 
@@ -1469,10 +2196,34 @@ def main():
         "context": context_docs,
     }
 
+    # An ONNX backend is only kept if it agrees with PyTorch on a sample. The
+    # check runs once per ONNX file; later runs reuse its saved report.
+    if model.backend != "torch" and primary_docs:
+        report = model.onnx.load_check()
+        if report is None:
+            with events.phase("backend_check", backend=model.backend) as phase:
+                report = model.check_backend(primary_docs[:BACKEND_CHECK_SAMPLE])
+                phase.update(report)
+            model.onnx.save_check(report)
+        else:
+            print(f"Using the saved backend check: {model.onnx.check_file}")
+        print(
+            f"{model.backend} vs PyTorch on {report['sample']} documents: "
+            f"mean cosine {report['mean_cosine']:.5f} (min {report['min_cosine']:.5f}), "
+            f"{report['backend_per_sec']:.0f} vs {report['torch_per_sec']:.0f} documents/sec "
+            f"({report['speedup']:.2f}x)"
+        )
+        if not report["accepted"]:
+            print(f"Mean cosine is below {BACKEND_MIN_COSINE}, falling back to PyTorch")
+            model = OptimizedSentenceTransformer("all-MiniLM-L6-v2", device)
+
     # Generate all embeddings sequentially to avoid GPU conflicts
-    embedding_results = generate_embeddings_sequential(
-        model, document_sets
-    )
+    if device == "cpu" and os.environ.get(ENCODE_WORKERS_ENV):
+        model.start_pool(int(os.environ[ENCODE_WORKERS_ENV]))
+    try:
+        embedding_results = generate_embeddings_sequential(model, document_sets, events)
+    finally:
+        model.close_pool()
 
     # Extract embeddings from results
     primary_embeddings = embedding_results.get("primary", [])
@@ -1526,62 +2277,65 @@ def main():
         record["context_vector"] = to_list(context_embeddings[i])
 
 
-    if not table_exists:
-        # Create LanceDB table with enhanced schema
-        print("Creating new LanceDB table 'magic_cards'...")
-        table = db.create_table(
-            "magic_cards",
-            schema=MagicCard,
-            mode="overwrite",
-        )
-        # Add records to table
-        print("Adding records to database...")
-        table.add(records)
-
-        # Create indexes for all vector fields
-        print("Creating vector indexes...")
-
-        # Primary vector index (main semantic search)
-        table.create_index(
-            metric="cosine",
-            vector_column_name="primary_vector",
-            m=96,
-            ef_construction=1000,
-            accelerator="cuda" if torch.cuda.is_available() else None,
-        )
+    lancedb_phase = "create_table" if not table_exists else "add_records"
+    with events.phase(lancedb_phase) as phase:
+        phase["rows"] = len(records)
+        if not table_exists:
+            # Create LanceDB table with enhanced schema
+            print("Creating new LanceDB table 'magic_cards'...")
+            table = db.create_table(
+                "magic_cards",
+                schema=MagicCard,
+                mode="overwrite",
+            )
+            # Add records to table
+            print("Adding records to database...")
+            table.add(records)
+
+            # Create indexes for all vector fields
+            print("Creating vector indexes...")
+
+            # Primary vector index (main semantic search)
+            table.create_index(
+                metric="cosine",
+                vector_column_name="primary_vector",
+                m=96,
+                ef_construction=1000,
+                accelerator="cuda" if torch.cuda.is_available() else None,
+            )
 
-        # Keyword vector index (exact matching)
-        table.create_index(
-            metric="cosine",
-            vector_column_name="keyword_vector",
-            m=96,
-            ef_construction=1000,
-            accelerator="cuda" if torch.cuda.is_available() else None,
-        )
+            # Keyword vector index (exact matching)
+            table.create_index(
+                metric="cosine",
+                vector_column_name="keyword_vector",
+                m=96,
+                ef_construction=1000,
+                accelerator="cuda" if torch.cuda.is_available() else None,
+            )
 
-        # Context vector index (contextual search)
-        table.create_index(
-            metric="cosine",
-            vector_column_name="context_vector",
-            m=96,
-            ef_construction=1000,
-            accelerator="cuda" if torch.cuda.is_available() else None,
-        )
+            # Context vector index (contextual search)
+            table.create_index(
+                metric="cosine",
+                vector_column_name="context_vector",
+                m=96,
+                ef_construction=1000,
+                accelerator="cuda" if torch.cuda.is_available() else None,
+            )
 
-        # Legacy vector index for backward compatibility
-        table.create_index(
-            metric="cosine",
-            vector_column_name="vector",
-            m=96,
-            ef_construction=1000,
-            accelerator="cuda" if torch.cuda.is_available() else None,
-        )
-    else:
-        # Table exists, so just add the new records
-        print(f"Adding {len(records)} new records to existing 'magic_cards' table...")
-        table = db.open_table("magic_cards")
-        table.add(records)
-        print("Indexes will be updated automatically by LanceDB.")
+            # Legacy vector index for backward compatibility
+            table.create_index(
+                metric="cosine",
+                vector_column_name="vector",
+                m=96,
+                ef_construction=1000,
+                accelerator="cuda" if torch.cuda.is_available() else None,
+            )
+        else:
+            # Table exists, so just add the new records
+            print(f"Adding {len(records)} new records to existing 'magic_cards' table...")
+            table = db.open_table("magic_cards")
+            table.add(records)
+            print("Indexes will be updated automatically by LanceDB.")
 
 
     print(f"Successfully populated LanceDB with {len(records)} enhanced card records")
@@ -1612,6 +2366,14 @@ def main():
     else:
         print("❌ Poor embedding quality - consider regenerating!")
 
+    events.write_summary(
+        "ok",
+        cards=len(records),
+        cache_hit_rate=round(cache_stats["hit_rate"], 4),
+        quality_score=round(overall_quality, 4),
+    )
+    print(f"Timing summary: {TIMINGS_FILE}")
+
     print("Enhanced semantic search database build complete!")
 
 
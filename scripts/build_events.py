@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Build Progress Events
+Structured progress and per-phase timing events for the builders. Events go
+to a callback and/or stdout as JSON lines (one object per line, starting with
+``{"event":``), and a timing summary of all phases is written when the build
+ends so slow phases can be found on user machines.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Set to 1 to get JSON-line events without passing a flag (e.g. from Electron).
+EVENTS_ENV = 'DESKTOPMTG_EVENTS'
+
+# Phase metrics that get a matching ``<name>_per_sec`` rate on phase_end.
+RATE_METRICS = ('rows', 'bytes', 'embeddings')
+
+
+class BuildEvents:
+    """Emit phase_start/phase_end/progress events and collect phase timings.
+
+    Event types:
+      phase_start  {phase, ...}
+      phase_end    {phase, status, duration_s, <metric>, <metric>_per_sec, ...}
+      progress     {phase, unit, done, total, percent, rate_per_sec, eta_s, ...}
+      build_end    {status, total_s, summary_file, ...}
+    Every event also carries ``builder`` and ``elapsed_s`` since the build started.
+    """
+
+    def __init__(self, builder: str, json_lines: bool = False,
+                 callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 summary_file: Optional[Path] = None, progress_interval: float = 0.5):
+        self.builder = builder
+        self.json_lines = json_lines or os.environ.get(EVENTS_ENV) == '1'
+        self.callback = callback
+        self.summary_file = Path(summary_file) if summary_file else None
+        self.progress_interval = progress_interval
+        self.phases: List[Dict[str, Any]] = []
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self._phase_starts: Dict[str, float] = {}
+        self._last_progress: Dict[str, float] = {}
+        # Download threads report progress too; keep their lines whole.
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, **fields) -> Dict[str, Any]:
+        """Send one event to stdout (JSON lines mode) and the callback."""
+        record = {'event': event, 'builder': self.builder,
+                  'elapsed_s': round(time.perf_counter() - self._start, 3), **fields}
+        with self._lock:
+            if self.json_lines:
+                sys.stdout.write(json.dumps(record) + '\n')
+                sys.stdout.flush()
+            if self.callback is not None:
+                self.callback(record)
+        return record
+
+    @contextmanager
+    def phase(self, name: str, **fields) -> Iterator[Dict[str, Any]]:
+        """Time a phase. The yielded dict collects metrics reported on phase_end."""
+        metrics: Dict[str, Any] = dict(fields)
+        self.emit('phase_start', phase=name, **fields)
+        start = self._phase_starts[name] = time.perf_counter()
+        status = 'ok'
+        try:
+            yield metrics
+        except BaseException as e:
+            status = 'error'
+            metrics['error'] = str(e)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            for metric in RATE_METRICS:
+                if isinstance(metrics.get(metric), (int, float)) and duration > 0:
+                    metrics[f'{metric}_per_sec'] = round(metrics[metric] / duration, 1)
+            entry = {'phase': name, 'status': status, 'duration_s': round(duration, 3), **metrics}
+            self.phases.append(entry)
+            self._phase_starts.pop(name, None)
+            self.emit('phase_end', **entry)
+
+    def progress(self, phase: str, done: float, total: Optional[float] = None, unit: str = 'rows',
+                 force: bool = False, **fields) -> None:
+        """Report progress of ``phase``, at most once per ``progress_interval`` unless forced."""
+        now = time.perf_counter()
+        if not force and now - self._last_progress.get(phase, 0.0) < self.progress_interval:
+            return
+        self._last_progress[phase] = now
+        elapsed = now - self._phase_starts.setdefault(phase, now)
+        rate = done / elapsed if elapsed > 0 else None
+        percent = round(done / total * 100, 1) if total else None
+        eta = round((total - done) / rate, 1) if total and rate else None
+        self.emit('progress', phase=phase, unit=unit, done=done, total=total, percent=percent,
+                  rate_per_sec=round(rate, 1) if rate else None, eta_s=eta, **fields)
+
+    def write_summary(self, status: str = 'ok', **fields) -> Dict[str, Any]:
+        """Write the timing summary file (if configured) and emit build_end."""
+        total = time.perf_counter() - self._start
+        summary = {
+            'builder': self.builder,
+            'status': status,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': datetime.now().isoformat(),
+            'total_s': round(total, 3),
+            'slowest_phase': max(self.phases, key=lambda p: p['duration_s'])['phase'] if self.phases else None,
+            'phases': self.phases,
+            **fields,
+        }
+        if self.summary_file is not None:
+            try:
+                self.summary_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.summary_file, 'w') as f:
+                    json.dump(summary, f, indent=2)
+            except OSError as e:
+                print(f"⚠️ Could not write timing summary {self.summary_file}: {e}")
+        self.emit('build_end', status=status, total_s=summary['total_s'],
+                  summary_file=str(self.summary_file) if self.summary_file else None, **fields)
+        return summary
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Card Table Export
+Writes the ``cards`` table of cards.db as a typed, columnar Parquet or Arrow
+IPC file next to the database, and reads it back memory-mapped and projected
+to the columns a pipeline needs, so the embedding builders do not have to
+pull every row (and the full card JSON) out of SQLite. Requires pyarrow.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional – the export is skipped without it
+    pa = None
+
+EXPORT_FORMATS = ('parquet', 'arrow')
+EXPORT_SUFFIXES = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# Exported columns as (name, kind). Kinds: text, float, int, bool, date,
+# list (JSON array of strings), map (JSON object of strings), json (kept as
+# JSON text), cents (from the typed ``prices`` table, so a prices-only refresh
+# can re-export them). ``loyalty`` is read from the card JSON since it has no
+# column of its own.
+EXPORT_COLUMNS = (
+    ('id', 'text'), ('oracle_id', 'text'), ('lang', 'text'), ('name', 'text'),
+    ('mana_cost', 'text'), ('cmc', 'float'), ('type_line', 'text'), ('oracle_text', 'text'),
+    ('power', 'text'), ('toughness', 'text'), ('loyalty', 'text'),
+    ('colors', 'list'), ('color_identity', 'list'), ('keywords', 'list'), ('produced_mana', 'list'),
+    ('legalities', 'map'), ('card_faces', 'json'),
+    ('set_id', 'text'), ('set_code', 'text'), ('set_name', 'text'), ('set_type', 'text'),
+    ('collector_number', 'text'), ('rarity', 'text'), ('released_at', 'date'), ('artist', 'text'),
+    ('border_color', 'text'), ('frame', 'text'), ('image_status', 'text'), ('image_uris', 'map'),
+    ('layout', 'text'), ('reserved', 'bool'), ('foil', 'bool'), ('nonfoil', 'bool'), ('digital', 'bool'),
+    ('reprint', 'bool'), ('story_spotlight', 'bool'), ('full_art', 'bool'), ('textless', 'bool'),
+    ('tcgplayer_id', 'int'), ('mtgo_id', 'int'), ('arena_id', 'int'),
+    ('usd', 'cents'), ('usd_foil', 'cents'), ('eur', 'cents'), ('tix', 'cents'),
+    ('colors_mask', 'int'), ('color_identity_mask', 'int'), ('legal_mask', 'int'),
+    ('power_num', 'float'), ('toughness_num', 'float'),
+)
+
+# Rows per Parquet row group / Arrow record batch.
+EXPORT_BATCH_ROWS = 5000
+
+
+def _arrow_type(kind: str) -> Any:
+    return {
+        'text': pa.string(), 'json': pa.string(), 'float': pa.float64(), 'int': pa.int64(),
+        'cents': pa.int64(), 'bool': pa.bool_(), 'date': pa.date32(),
+        'list': pa.list_(pa.string()), 'map': pa.map_(pa.string(), pa.string()),
+    }[kind]
+
+
+def export_schema() -> Any:
+    """Arrow schema of the export."""
+    return pa.schema([(name, _arrow_type(kind)) for name, kind in EXPORT_COLUMNS])
+
+
+def export_path(database: Path, fmt: str) -> Path:
+    """Where the export of ``database`` goes, e.g. ``cards.parquet`` next to ``cards.db``."""
+    return Path(database).with_suffix(EXPORT_SUFFIXES[fmt])
+
+
+def find_card_export(database: Path) -> Optional[Path]:
+    """The export of ``database`` that exists, in ``EXPORT_FORMATS`` order, or None."""
+    for fmt in EXPORT_FORMATS:
+        path = export_path(database, fmt)
+        if path.exists():
+            return path
+    return None
+
+
+def _convert(kind: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if kind == 'list':
+        return json.loads(value)
+    if kind == 'map':
+        return [(key, item if item is None else str(item)) for key, item in json.loads(value).items()]
+    if kind == 'bool':
+        return bool(value)
+    if kind == 'date':
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            return None
+    return value
+
+
+def export_cards(conn: sqlite3.Connection, path: Path, fmt: Optional[str] = None, *,
+                 price_fields: Sequence[str],
+                 card_prices: Callable[[Optional[Dict[str, Any]]], Tuple[Optional[int], ...]],
+                 decode_data: Callable[[Any, Any], Dict[str, Any]]) -> int:
+    """Write the ``cards`` table to ``path`` as Parquet or Arrow IPC and return the row count.
+
+    ``fmt`` defaults to the one matching the file suffix. The file is written
+    next to its destination and renamed into place, so readers never see a
+    partial export. Arrow files are uncompressed so they can be memory-mapped
+    without copying; Parquet files are smaller.
+
+    The builder's price and data formats are passed in: ``price_fields`` are
+    the columns of the ``prices`` table (the ``cents`` export columns),
+    ``card_prices`` turns a card's ``prices`` JSON into cents in that order
+    and ``decode_data`` turns a ``data`` value (and its row) into the card dict.
+    """
+    if pa is None:
+        raise ImportError("Exporting the card table requires the 'pyarrow' package")
+
+    path = Path(path)
+    fmt = fmt or next((name for name, suffix in EXPORT_SUFFIXES.items() if path.suffix == suffix), 'parquet')
+    schema = export_schema()
+    row_columns = [name for name, kind in EXPORT_COLUMNS if kind != 'cents' and name != 'loyalty']
+    has_prices = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'prices'").fetchone() is not None
+    if has_prices:
+        price_sql = ', '.join(f'p.{field} AS price_{field}' for field in price_fields)
+        source = 'cards LEFT JOIN prices p ON p.card_id = cards.id'
+    else:
+        price_sql = ', '.join(f'NULL AS price_{field}' for field in price_fields)
+        source = 'cards'
+    # Row access by name on this cursor only; the caller's row_factory is left alone
+    rows = conn.cursor()
+    rows.row_factory = sqlite3.Row
+    rows.execute(f"SELECT {', '.join(f'cards.{name}' for name in row_columns)}, "
+                 f"cards.prices, cards.data, {price_sql} FROM {source} ORDER BY cards.id")
+
+    temp_path = path.with_name(path.name + '.tmp')
+    writer = (pq.ParquetWriter(str(temp_path), schema, compression='zstd') if fmt == 'parquet'
+              else pa.ipc.new_file(str(temp_path), schema))
+    count = 0
+    try:
+        while True:
+            batch = rows.fetchmany(EXPORT_BATCH_ROWS)
+            if not batch:
+                break
+            columns: Dict[str, List[Any]] = {name: [] for name, _ in EXPORT_COLUMNS}
+            for row in batch:
+                for name, kind in EXPORT_COLUMNS:
+                    if kind != 'cents' and name != 'loyalty':
+                        columns[name].append(_convert(kind, row[name]))
+                prices = ([row[f'price_{field}'] for field in price_fields] if has_prices
+                          else card_prices(json.loads(row['prices'] or '{}')))
+                for name, cents in zip(price_fields, prices):
+                    columns[name].append(cents)
+                # Only planeswalkers have a loyalty worth decoding the card JSON for
+                type_line = row['type_line'] or ''
+                columns['loyalty'].append(decode_data(row['data'], row).get('loyalty')
+                                          if 'Planeswalker' in type_line else None)
+            record_batch = pa.RecordBatch.from_arrays(
+                [pa.array(columns[name], type=field.type) for name, field in zip(columns, schema)],
+                schema=schema)
+            if fmt == 'parquet':
+                writer.write_table(pa.Table.from_batches([record_batch]))
+            else:
+                writer.write_batch(record_batch)
+            count += len(batch)
+    except BaseException:
+        writer.close()
+        temp_path.unlink()
+        raise
+    writer.close()
+    os.replace(temp_path, path)
+    return count
+
+
+def read_card_export(path: Path, columns: Optional[Sequence[str]] = None,
+                     where: Optional[Dict[str, Any]] = None) -> Any:
+    """Load an export as a ``pyarrow.Table``, memory-mapped and limited to ``columns``.
+
+    ``where`` keeps only rows whose columns equal the given values, e.g.
+    ``{'lang': 'en'}``. Parquet files only decode the requested columns; Arrow
+    files are mapped, so columns that are not used are never read from disk.
+    Use ``table.column(name).to_pylist()`` or ``to_pydict()`` to get Python
+    values column by column.
+    """
+    if pa is None:
+        raise ImportError("Reading the card export requires the 'pyarrow' package")
+    path = Path(path)
+    needed = list(columns) if columns else None
+    if needed and where:
+        needed += [name for name in where if name not in needed]
+    if path.suffix == EXPORT_SUFFIXES['arrow']:
+        table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+        if needed:
+            table = table.select(needed)
+        for name, value in (where or {}).items():
+            table = table.filter(pc.equal(table[name], value))
+    else:
+        filters = [(name, '=', value) for name, value in where.items()] if where else None
+        table = pq.read_table(str(path), columns=needed, memory_map=True, filters=filters)
+    if columns:
+        table = table.select(list(columns))
+    return table
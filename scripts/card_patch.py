@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Card Database Patches
+Makes a compact row-level patch between two builds of cards.db (or any
+SQLite database of the same schema) and applies it in place, so an update
+only transfers the rows that changed. Every patch carries a checksum of the
+database content it was made from and of the content it produces; applying
+checks both and rolls back on a mismatch.
+
+A patch is a small SQLite database, gzip-compressed. For each table it holds
+the new or changed rows and the keys of the deleted rows. Tables without a
+primary key (and FTS5 tables) are patched in groups of rows sharing their
+first column, e.g. all ``card_types`` rows of one card. FTS5 shadow tables
+and ``sqlite_stat1`` are not carried; their virtual table is patched instead.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+PATCH_FORMAT = 1
+
+# Internal tables of an FTS5 table ``x`` are named ``x_data``, ``x_idx``, ...
+FTS_SHADOW_SUFFIXES = ('_data', '_idx', '_content', '_docsize', '_config')
+
+
+class PatchError(ValueError):
+    """A patch that does not fit the database, or whose result fails verification."""
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def patched_tables(conn: sqlite3.Connection, schema: str = 'main') -> List[Tuple[str, List[str], List[str]]]:
+    """``(table, columns, key columns)`` of every table a patch carries, by name.
+
+    The key columns are the primary key; tables without one get an empty list
+    and are patched by groups of their first column.
+    """
+    rows = conn.execute(f"SELECT name, sql FROM {schema}.sqlite_master "
+                        f"WHERE type = 'table' ORDER BY name").fetchall()
+    virtual = [name for name, sql in rows if (sql or '').upper().startswith('CREATE VIRTUAL TABLE')]
+    tables = []
+    for name, _ in rows:
+        if name.startswith('sqlite_') or any(
+                name.startswith(table) and name[len(table):] in FTS_SHADOW_SUFFIXES for table in virtual):
+            continue
+        info = conn.execute(f'PRAGMA {schema}.table_info({_quote(name)})').fetchall()
+        keys = [column[1] for column in sorted(info, key=lambda column: column[5]) if column[5]]
+        tables.append((name, [column[1] for column in info], keys))
+    return tables
+
+
+def schema_signature(conn: sqlite3.Connection, schema: str = 'main') -> str:
+    """Hash of the schema (tables, indexes, views and triggers); patches need it to match."""
+    digest = hashlib.sha256()
+    for row in conn.execute(f"SELECT type, name, sql FROM {schema}.sqlite_master "
+                            f"WHERE name NOT LIKE 'sqlite_%' ORDER BY type, name"):
+        digest.update(repr(row).encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+def content_checksum(conn: sqlite3.Connection, schema: str = 'main') -> str:
+    """SHA-256 of the rows of every patched table, in key order.
+
+    It depends only on the stored values, not on rowids or the file layout,
+    so a patched database and a fresh build of the same data agree.
+    """
+    digest = hashlib.sha256()
+    for name, columns, keys in patched_tables(conn, schema):
+        column_sql = ', '.join(map(_quote, columns))
+        order_sql = ', '.join(map(_quote, keys or columns))
+        digest.update(f'\x00{name}\x00'.encode('utf-8'))
+        rows = conn.execute(f'SELECT {column_sql} FROM {schema}.{_quote(name)} ORDER BY {order_sql}')
+        while True:
+            batch = rows.fetchmany(5000)
+            if not batch:
+                break
+            digest.update(repr(batch).encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+def make_patch(base: Path, target: Path, path: Path, info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Write the patch that turns database ``base`` into ``target`` to ``path``.
+
+    ``info`` is stored in the patch as is (e.g. the bulk data dates of both
+    builds). Raises PatchError if the schemas differ: such an update needs
+    the full database. Returns a summary with the checksums, the number of
+    rows per table and the patch size.
+    """
+    path = Path(path)
+    fd, temp_name = tempfile.mkstemp(prefix='cards-patch-', suffix='.sqlite', dir=str(path.parent))
+    os.close(fd)
+    temp_path = Path(temp_name)
+    try:
+        with closing(sqlite3.connect(str(temp_path))) as conn:
+            conn.execute('PRAGMA journal_mode=OFF')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('ATTACH DATABASE ? AS base', (str(base),))
+            conn.execute('ATTACH DATABASE ? AS target', (str(target),))
+            base_schema = schema_signature(conn, 'base')
+            if base_schema != schema_signature(conn, 'target'):
+                raise PatchError("The schemas of the two databases differ, a patch cannot update one to the other")
+
+            conn.execute('CREATE TABLE patch_info (key TEXT PRIMARY KEY, value TEXT)')
+            conn.execute('''
+                CREATE TABLE patch_tables (
+                    position INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    columns TEXT NOT NULL,
+                    keys TEXT NOT NULL,
+                    upserts INTEGER NOT NULL,
+                    deletes INTEGER NOT NULL
+                )
+            ''')
+            tables: Dict[str, Dict[str, int]] = {}
+            for position, (name, columns, keys) in enumerate(patched_tables(conn, 'target')):
+                table = _quote(name)
+                column_sql = ', '.join(map(_quote, columns))
+                if keys:
+                    key_sql = ', '.join(map(_quote, keys))
+                    conn.execute(f'CREATE TABLE upsert_{position} AS SELECT {column_sql} FROM target.{table} '
+                                 f'EXCEPT SELECT {column_sql} FROM base.{table}')
+                    conn.execute(f'CREATE TABLE delete_{position} AS SELECT {key_sql} FROM base.{table} '
+                                 f'EXCEPT SELECT {key_sql} FROM target.{table}')
+                else:
+                    # Replace every group of rows (by first column) that differs in any row
+                    group = _quote(columns[0])
+                    conn.execute(f'''
+                        CREATE TABLE delete_{position} AS
+                        SELECT {group} FROM (SELECT {column_sql} FROM target.{table}
+                                             EXCEPT SELECT {column_sql} FROM base.{table})
+                        UNION
+                        SELECT {group} FROM (SELECT {column_sql} FROM base.{table}
+                                             EXCEPT SELECT {column_sql} FROM target.{table})
+                    ''')
+                    conn.execute(f'CREATE TABLE upsert_{position} AS SELECT {column_sql} FROM target.{table} '
+                                 f'WHERE {group} IN (SELECT {group} FROM delete_{position})')
+                counts = {kind: conn.execute(f'SELECT COUNT(*) FROM {kind}_{position}').fetchone()[0]
+                          for kind in ('upsert', 'delete')}
+                conn.execute('INSERT INTO patch_tables VALUES (?, ?, ?, ?, ?, ?)',
+                             (position, name, json.dumps(columns), json.dumps(keys),
+                              counts['upsert'], counts['delete']))
+                tables[name] = {'upserts': counts['upsert'], 'deletes': counts['delete']}
+
+            summary = {
+                'format': PATCH_FORMAT,
+                'created_at': datetime.now().isoformat(),
+                'schema': base_schema,
+                'base_checksum': content_checksum(conn, 'base'),
+                'target_checksum': content_checksum(conn, 'target'),
+                'info': info or {},
+            }
+            conn.executemany('INSERT INTO patch_info VALUES (?, ?)',
+                             [(key, json.dumps(value)) for key, value in summary.items()])
+            conn.commit()
+            conn.execute('DETACH DATABASE base')
+            conn.execute('DETACH DATABASE target')
+            conn.execute('VACUUM')
+
+        compressed_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'rb') as source, gzip.open(compressed_path, 'wb', compresslevel=9) as patch:
+            shutil.copyfileobj(source, patch, 1024 * 1024)
+        os.replace(compressed_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+    summary.update(tables=tables, bytes=path.stat().st_size, target_bytes=Path(target).stat().st_size)
+    return summary
+
+
+def read_patch_info(path: Path) -> Dict[str, Any]:
+    """The checksums, dates and per-table row counts stored in a patch."""
+    with _open_patch(path) as patch_path, closing(sqlite3.connect(str(patch_path))) as conn:
+        info = _patch_info(conn, 'main')
+        info['tables'] = {name: {'upserts': upserts, 'deletes': deletes} for name, upserts, deletes
+                          in conn.execute('SELECT name, upserts, deletes FROM patch_tables ORDER BY position')}
+    return info
+
+
+def apply_patch(database: Path, path: Path, verify_base: bool = True) -> Dict[str, Any]:
+    """Apply the patch at ``path`` to ``database`` in place, in one transaction.
+
+    The database must have the patch's schema and, when ``verify_base`` is
+    set, exactly the content the patch was made from. After the rows are
+    written the content checksum must equal the patch's target checksum,
+    otherwise the transaction is rolled back and PatchError raised. Readers
+    of a WAL database see the old content until the patch is committed.
+    A database that already has the target content is left alone.
+    """
+    with _open_patch(path) as patch_path, \
+            closing(sqlite3.connect(str(database), isolation_level=None, timeout=30)) as conn:
+        conn.execute('ATTACH DATABASE ? AS patch', (str(patch_path),))
+        info = _patch_info(conn, 'patch')
+        if info.get('format') != PATCH_FORMAT:
+            raise PatchError(f"Unsupported patch format {info.get('format')!r}")
+        if schema_signature(conn) != info['schema']:
+            raise PatchError("The database schema does not match the patch")
+        if verify_base:
+            checksum = content_checksum(conn)
+            if checksum == info['target_checksum']:
+                return {**info, 'status': 'current'}
+            if checksum != info['base_checksum']:
+                raise PatchError("The database is not the one this patch was made from")
+
+        counts: Dict[str, Dict[str, int]] = {}
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for position, name, columns, keys in conn.execute(
+                    'SELECT position, name, columns, keys FROM patch.patch_tables ORDER BY position').fetchall():
+                columns, keys = json.loads(columns), json.loads(keys)
+                table = _quote(name)
+                key_sql = ', '.join(map(_quote, keys or columns[:1]))
+                if len(keys) > 1:
+                    key_sql = f'({key_sql})'
+                deleted = conn.execute(f'DELETE FROM main.{table} WHERE {key_sql} IN '
+                                       f'(SELECT * FROM patch.delete_{position})').rowcount
+                if keys:
+                    # Rows that changed are replaced through their primary key
+                    conn.execute(f"INSERT OR REPLACE INTO main.{table} ({', '.join(map(_quote, columns))}) "
+                                 f'SELECT * FROM patch.upsert_{position}')
+                else:
+                    conn.execute(f"INSERT INTO main.{table} ({', '.join(map(_quote, columns))}) "
+                                 f'SELECT * FROM patch.upsert_{position}')
+                written = conn.execute(f'SELECT COUNT(*) FROM patch.upsert_{position}').fetchone()[0]
+                counts[name] = {'upserts': written, 'deletes': deleted}
+            if content_checksum(conn) != info['target_checksum']:
+                raise PatchError("The patched database does not match the patch's target checksum")
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('DETACH DATABASE patch')
+        conn.execute('PRAGMA optimize')
+    return {**info, 'status': 'applied', 'tables': counts}
+
+
+def _patch_info(conn: sqlite3.Connection, schema: str) -> Dict[str, Any]:
+    try:
+        return {key: json.loads(value) for key, value in conn.execute(f'SELECT key, value FROM {schema}.patch_info')}
+    except sqlite3.DatabaseError as e:
+        raise PatchError(f"Not a card database patch: {e}") from e
+
+
+class _open_patch:
+    """Context manager giving a decompressed copy of a patch file, removed afterwards."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.temp_path: Optional[Path] = None
+
+    def __enter__(self) -> Path:
+        fd, temp_name = tempfile.mkstemp(prefix='cards-patch-', suffix='.sqlite')
+        self.temp_path = Path(temp_name)
+        try:
+            with os.fdopen(fd, 'wb') as target, gzip.open(self.path, 'rb') as source:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+        except (OSError, EOFError) as e:
+            self.temp_path.unlink()
+            raise PatchError(f"Could not read patch {self.path}: {e}") from e
+        return self.temp_path
+
+    def __exit__(self, *exc) -> None:
+        if self.temp_path is not None and self.temp_path.exists():
+            self.temp_path.unlink()
+
+
+def _print_summary(summary: Dict[str, Any]) -> None:
+    for name, counts in summary.get('tables', {}).items():
+        if counts['upserts'] or counts['deletes']:
+            print(f"   {name}: {counts['upserts']:,} written, {counts['deletes']:,} deleted")
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Make or apply row-level patches between card database builds')
+    commands = parser.add_subparsers(dest='command', required=True)
+    make = commands.add_parser('make', help='write the patch from BASE to TARGET')
+    make.add_argument('base', type=Path)
+    make.add_argument('target', type=Path)
+    make.add_argument('patch', type=Path)
+    apply = commands.add_parser('apply', help='apply PATCH to DATABASE in place')
+    apply.add_argument('database', type=Path)
+    apply.add_argument('patch', type=Path)
+    apply.add_argument('--no-verify-base', action='store_true',
+                       help='skip the base checksum (the result is still verified)')
+    show = commands.add_parser('info', help='print what a patch contains')
+    show.add_argument('patch', type=Path)
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'make':
+            summary = make_patch(args.base, args.target, args.patch)
+            print(f"🩹 Patch written: {args.patch} ({summary['bytes'] / 1024 / 1024:.2f} MB, "
+                  f"{summary['bytes'] / summary['target_bytes']:.1%} of the database)")
+        elif args.command == 'apply':
+            summary = apply_patch(args.database, args.patch, verify_base=not args.no_verify_base)
+            if summary['status'] == 'current':
+                print(f"✅ {args.database} already has the patched content")
+            else:
+                print(f"✅ Patch applied and verified: {args.database}")
+        else:
+            summary = read_patch_info(args.patch)
+            print(json.dumps({key: value for key, value in summary.items() if key != 'tables'}, indent=2))
+    except PatchError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    _print_summary(summary)
+
+
+if __name__ == '__main__':
+    main()
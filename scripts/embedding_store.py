@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""
+Embedding Store
+An append-only file of float32 vectors, memory-mapped for reading, with a
+compact index of 16-byte keys. The embedding cache of build_docv2 keeps one
+store per vector dimension instead of one pickle file per text, so a cached
+rebuild looks up a whole document set in a few vectorized reads.
+
+Stores are grouped in namespaces, one directory per combination of model
+revision, max_seq_length and document processor version, so an embedding
+made under another setup is never returned. The cache directory is kept
+under a size cap: stale namespaces are dropped first, then the least
+recently (LRU) or least frequently (LFU) used embeddings of the current one.
+
+Files (in a namespace directory):
+    namespace.json     the fields the namespace stands for, and when it was last used
+    vectors-<dim>.f32  rows of ``dim`` float32 values, in insertion order
+    keys-<dim>.bin     the 16-byte key of each row, in the same order
+    usage-<dim>.npy    last use time and use count of each row (for eviction)
+Vectors are written before their keys, so after an interrupted write the
+rows without a key are dropped when the store is opened again.
+
+Usage:
+    python embedding_store.py stats [cache/embeddings]
+    python embedding_store.py compact [cache/embeddings] [--max-mb 1024] [--policy lfu]
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+KEY_BYTES = 16
+# Bytes per row of a usage file (float64 last use time, uint32 use count).
+USAGE_BYTES = 12
+USAGE_DTYPE = np.dtype([("last_used", "<f8"), ("use_count", "<u4")])
+
+EVICTION_POLICIES = ("lru", "lfu")
+NAMESPACE_FILE = "namespace.json"
+# Eviction goes this far below the cap, so it is not repeated on every insert.
+EVICTION_TARGET_RATIO = 0.9
+
+
+def embedding_key(text: str, model_name: str, embedding_type: str) -> bytes:
+    """Key of one embedding: the first 16 bytes of the SHA-256 the pickle cache named its files by"""
+    content = f"{model_name}:{embedding_type}:{text}"
+    return hashlib.sha256(content.encode()).digest()[:KEY_BYTES]
+
+
+class EmbeddingStore:
+    """Vectors of one dimension, stored as a memory-mapped float32 matrix"""
+
+    def __init__(self, directory: Path, dim: int):
+        self.directory = Path(directory)
+        self.dim = dim
+        self.vectors_path = self.directory / f"vectors-{dim}.f32"
+        self.keys_path = self.directory / f"keys-{dim}.bin"
+        self.usage_path = self.directory / f"usage-{dim}.npy"
+        self.rows: Dict[bytes, int] = {}
+        self.usage = np.zeros(0, dtype=USAGE_DTYPE)
+        self._usage_dirty = False
+        self._vectors: Optional[np.memmap] = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def row_bytes(self) -> int:
+        """Bytes on disk per row (vector, key and usage)"""
+        return self.dim * 4 + KEY_BYTES + USAGE_BYTES
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes on disk"""
+        return len(self.rows) * self.row_bytes
+
+    def _load(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        row_bytes = self.dim * 4
+        vector_rows = (
+            self.vectors_path.stat().st_size // row_bytes
+            if self.vectors_path.exists()
+            else 0
+        )
+        key_rows = (
+            self.keys_path.stat().st_size // KEY_BYTES if self.keys_path.exists() else 0
+        )
+        count = min(vector_rows, key_rows)
+        # Drop whatever an interrupted write left behind
+        for path, size in (
+            (self.vectors_path, count * row_bytes),
+            (self.keys_path, count * KEY_BYTES),
+        ):
+            if path.exists() and path.stat().st_size != size:
+                os.truncate(path, size)
+        data = self.keys_path.read_bytes() if count else b""
+        self.rows = {
+            data[offset : offset + KEY_BYTES]: row
+            for row, offset in enumerate(range(0, count * KEY_BYTES, KEY_BYTES))
+        }
+        self.usage = np.zeros(count, dtype=USAGE_DTYPE)
+        if count and self.usage_path.exists():
+            try:
+                usage = np.load(self.usage_path)
+                if usage.dtype == USAGE_DTYPE and len(usage) == count:
+                    self.usage = usage
+            except (OSError, ValueError):
+                pass
+        self._usage_dirty = False
+        self._vectors = None
+
+    def _matrix(self) -> Optional[np.memmap]:
+        if self._vectors is None and self.rows:
+            self._vectors = np.memmap(
+                self.vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(len(self.rows), self.dim),
+            )
+        return self._vectors
+
+    def _gather(self, rows: np.ndarray) -> np.ndarray:
+        # Sorted rows make the gather one forward pass over the mapped file
+        order = np.argsort(rows, kind="stable")
+        vectors = np.empty((len(rows), self.dim), dtype=np.float32)
+        vectors[order] = self._matrix()[rows[order]]
+        return vectors
+
+    def lookup(self, keys: Sequence[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions in ``keys`` that are stored, and their vectors as one (n, dim) array"""
+        positions = []
+        rows = []
+        for position, key in enumerate(keys):
+            row = self.rows.get(key)
+            if row is not None:
+                positions.append(position)
+                rows.append(row)
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dim), np.float32)
+        rows_array = np.asarray(rows, dtype=np.int64)
+        self.usage["last_used"][rows_array] = time.time()
+        np.add.at(self.usage["use_count"], rows_array, 1)
+        self._usage_dirty = True
+        return np.asarray(positions, dtype=np.int64), self._gather(rows_array)
+
+    def append(self, keys: Sequence[bytes], vectors: np.ndarray) -> int:
+        """Store the vectors whose keys are new; returns how many were written"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        new_keys: List[bytes] = []
+        new_rows: List[int] = []
+        seen = set()
+        for index, key in enumerate(keys):
+            if key not in self.rows and key not in seen:
+                seen.add(key)
+                new_keys.append(key)
+                new_rows.append(index)
+        if not new_keys:
+            return 0
+        # Unmap first: Windows cannot extend a file while it is mapped
+        self._vectors = None
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors[new_rows]).tobytes())
+            f.flush()
+        with open(self.keys_path, "ab") as f:
+            f.write(b"".join(new_keys))
+        start = len(self.rows)
+        for offset, key in enumerate(new_keys):
+            self.rows[key] = start + offset
+        added = np.zeros(len(new_keys), dtype=USAGE_DTYPE)
+        added["last_used"] = time.time()
+        added["use_count"] = 1
+        self.usage = np.concatenate([self.usage, added])
+        self._usage_dirty = True
+        return len(new_keys)
+
+    def items(self) -> Tuple[List[bytes], np.ndarray]:
+        """Every key, in row order, and a copy of the vector matrix"""
+        keys = self._keys_by_row()
+        matrix = self._matrix()
+        return keys, (
+            np.array(matrix)
+            if matrix is not None
+            else np.empty((0, self.dim), np.float32)
+        )
+
+    def _keys_by_row(self) -> List[bytes]:
+        keys = [b""] * len(self.rows)
+        for key, row in self.rows.items():
+            keys[row] = key
+        return keys
+
+    def save_usage(self) -> None:
+        """Persist the usage of the rows if it changed"""
+        if not self._usage_dirty:
+            return
+        temp_path = self.usage_path.with_name(self.usage_path.name + ".tmp")
+        with open(temp_path, "wb") as f:
+            np.save(f, self.usage)
+        os.replace(temp_path, self.usage_path)
+        self._usage_dirty = False
+
+    def keep(self, rows: np.ndarray) -> int:
+        """Rewrite the store with only ``rows``; returns how many rows were dropped
+
+        The key file is emptied before the new vectors are swapped in, so an
+        interruption leaves either the old store, the new one or an empty one,
+        never keys paired with the wrong vectors.
+        """
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        dropped = len(self.rows) - len(rows)
+        if dropped <= 0:
+            return 0
+        keys = self._keys_by_row()
+        temp_vectors = self.vectors_path.with_name(self.vectors_path.name + ".tmp")
+        temp_keys = self.keys_path.with_name(self.keys_path.name + ".tmp")
+        with open(temp_vectors, "wb") as f:
+            for start in range(0, len(rows), 8192):
+                f.write(self._matrix()[rows[start : start + 8192]].tobytes())
+        with open(temp_keys, "wb") as f:
+            f.write(b"".join(keys[row] for row in rows.tolist()))
+        usage = self.usage[rows]
+
+        self._vectors = None
+        os.truncate(self.keys_path, 0)
+        os.replace(temp_vectors, self.vectors_path)
+        os.replace(temp_keys, self.keys_path)
+        self._load()
+        self.usage = usage
+        self._usage_dirty = True
+        self.save_usage()
+        return dropped
+
+    def clear(self) -> None:
+        """Remove every vector"""
+        self._vectors = None
+        for path in (self.vectors_path, self.keys_path, self.usage_path):
+            if path.exists():
+                path.unlink()
+        self.rows = {}
+        self.usage = np.zeros(0, dtype=USAGE_DTYPE)
+
+
+def store_dimensions(directory: Path) -> Iterable[int]:
+    """Dimensions of the stores found in ``directory``"""
+    for path in sorted(Path(directory).glob("vectors-*.f32")):
+        try:
+            yield int(path.stem.split("-", 1)[1])
+        except ValueError:
+            continue
+
+
+def namespace_name(fields: Dict[str, Any]) -> str:
+    """Directory name of the namespace for ``fields``"""
+    content = json.dumps(fields, sort_keys=True, default=str)
+    return "ns-" + hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+class EmbeddingNamespace:
+    """The stores (one per dimension) of one model/preprocessing setup"""
+
+    def __init__(self, cache_dir: Path, fields: Dict[str, Any]):
+        self.fields = dict(fields)
+        self.directory = Path(cache_dir) / namespace_name(self.fields)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.stores: Dict[int, EmbeddingStore] = {
+            dim: EmbeddingStore(self.directory, dim)
+            for dim in store_dimensions(self.directory)
+        }
+        self.touch()
+
+    def __len__(self) -> int:
+        return sum(len(store) for store in self.stores.values())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(store.nbytes for store in self.stores.values())
+
+    def touch(self) -> None:
+        """Record the namespace (and that it is in use) in namespace.json"""
+        info = {"fields": self.fields, "last_used": time.time()}
+        (self.directory / NAMESPACE_FILE).write_text(
+            json.dumps(info, indent=2, default=str)
+        )
+
+    def store(self, dim: int) -> EmbeddingStore:
+        if dim not in self.stores:
+            self.stores[dim] = EmbeddingStore(self.directory, dim)
+        return self.stores[dim]
+
+    def lookup(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """The stored vector of each key (None where there is none)"""
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        for store in self.stores.values():
+            positions, vectors = store.lookup(keys)
+            for position, vector in zip(positions.tolist(), vectors):
+                results[position] = vector
+        return results
+
+    def append(self, keys: Sequence[bytes], vectors: np.ndarray) -> int:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), -1)
+        return self.store(vectors.shape[1]).append(keys, vectors)
+
+    def flush(self) -> None:
+        for store in self.stores.values():
+            store.save_usage()
+
+    def evict(self, count: int, policy: str = "lru") -> int:
+        """Drop the ``count`` least recently or least frequently used vectors"""
+        if count <= 0 or not len(self):
+            return 0
+        dims = list(self.stores)
+        usage = np.concatenate([self.stores[dim].usage for dim in dims])
+        owners = np.concatenate(
+            [np.full(len(self.stores[dim]), i) for i, dim in enumerate(dims)]
+        )
+        rows = np.concatenate([np.arange(len(self.stores[dim])) for dim in dims])
+        if policy == "lfu":
+            # Least used first, the oldest of those first
+            order = np.lexsort((usage["last_used"], usage["use_count"]))
+        else:
+            order = np.argsort(usage["last_used"], kind="stable")
+        evicted = np.zeros(len(usage), dtype=bool)
+        evicted[order[:count]] = True
+        dropped = 0
+        for i, dim in enumerate(dims):
+            mine = owners == i
+            if evicted[mine].any():
+                dropped += self.stores[dim].keep(rows[mine & ~evicted])
+        return dropped
+
+    def clear(self) -> None:
+        for store in self.stores.values():
+            store.clear()
+        self.stores = {}
+
+
+def directory_bytes(directory: Path) -> int:
+    """Bytes of the files directly in ``directory``"""
+    return sum(
+        entry.stat().st_size for entry in os.scandir(directory) if entry.is_file()
+    )
+
+
+def namespace_dirs(cache_dir: Path) -> List[Path]:
+    """Namespace directories of a cache, least recently used first"""
+
+    def last_used(path: Path) -> float:
+        try:
+            return float(json.loads((path / NAMESPACE_FILE).read_text())["last_used"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0.0
+
+    dirs = [path for path in Path(cache_dir).glob("ns-*") if path.is_dir()]
+    return sorted(dirs, key=last_used)
+
+
+def cache_bytes(cache_dir: Path) -> int:
+    """Bytes used by a whole cache directory"""
+    cache_dir = Path(cache_dir)
+    if not cache_dir.exists():
+        return 0
+    return directory_bytes(cache_dir) + sum(
+        directory_bytes(path) for path in namespace_dirs(cache_dir)
+    )
+
+
+def _drop_stale(
+    cache_dir: Path,
+    active: Optional[EmbeddingNamespace],
+    keep: int,
+    total: int,
+    target: int,
+) -> Tuple[int, int]:
+    """Remove legacy files and old namespaces until ``total`` is below ``target``
+
+    ``active`` and the ``keep`` most recently used other namespaces stay.
+    Returns the bytes left and the number of namespaces removed.
+    """
+    dropped = 0
+    # Files outside any namespace come from unversioned caches
+    for entry in list(os.scandir(cache_dir)):
+        if total <= target:
+            break
+        if entry.is_file():
+            total -= entry.stat().st_size
+            os.unlink(entry.path)
+    others = [
+        path
+        for path in namespace_dirs(cache_dir)
+        if active is None or path != active.directory
+    ]
+    for path in others[: max(0, len(others) - keep)]:
+        if total <= target:
+            break
+        total -= directory_bytes(path)
+        shutil.rmtree(path)
+        dropped += 1
+    return total, dropped
+
+
+def enforce_cache_limit(
+    cache_dir: Path,
+    max_bytes: int,
+    policy: str = "lru",
+    active: Optional[EmbeddingNamespace] = None,
+) -> Dict[str, int]:
+    """Bring a cache directory under ``max_bytes``
+
+    Stale data goes first (files outside namespaces, then the other
+    namespaces, least recently used first); after that ``policy`` picks the
+    vectors of ``active`` to evict. Eviction goes down to
+    EVICTION_TARGET_RATIO of the cap, so a full cache is not compacted again
+    on every insert.
+    """
+    result = {"evicted": 0, "namespaces_dropped": 0}
+    total = cache_bytes(cache_dir)
+    if total <= max_bytes:
+        return result
+    target = int(max_bytes * EVICTION_TARGET_RATIO)
+    total, result["namespaces_dropped"] = _drop_stale(
+        cache_dir, active, 0, total, target
+    )
+    if total > target and active is not None and len(active):
+        row_bytes = active.nbytes / len(active)
+        result["evicted"] = active.evict(
+            math.ceil((total - target) / row_bytes), policy
+        )
+    return result
+
+
+def compact_cache(
+    cache_dir: Path,
+    max_bytes: Optional[int] = None,
+    policy: str = "lru",
+    active: Optional[EmbeddingNamespace] = None,
+    keep_namespaces: int = 1,
+) -> Dict[str, int]:
+    """Remove legacy files and all but the most recent namespaces, then apply the cap
+
+    ``active`` (if given) is always kept, and counts as one of
+    ``keep_namespaces``. Without it the most recently used namespace is the
+    one the cap evicts from.
+    """
+    cache_dir = Path(cache_dir)
+    before = cache_bytes(cache_dir)
+    keep = keep_namespaces - 1 if active is not None else keep_namespaces
+    _, dropped = _drop_stale(cache_dir, active, max(0, keep), before, -1)
+    evicted = 0
+    if max_bytes is not None:
+        if active is None:
+            recent = namespace_dirs(cache_dir)
+            if recent:
+                info = json.loads((recent[-1] / NAMESPACE_FILE).read_text())
+                active = EmbeddingNamespace(cache_dir, info["fields"])
+        evicted = enforce_cache_limit(cache_dir, max_bytes, policy, active)["evicted"]
+    return {
+        "namespaces_dropped": dropped,
+        "evicted": evicted,
+        "bytes_before": before,
+        "bytes_after": cache_bytes(cache_dir),
+    }
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(
+        description="Inspect or compact the embedding cache"
+    )
+    parser.add_argument("command", choices=["stats", "compact"])
+    parser.add_argument(
+        "cache_dir", nargs="?", type=Path, default=Path("cache/embeddings")
+    )
+    parser.add_argument("--max-mb", type=float, help="size cap applied by compact")
+    parser.add_argument("--policy", choices=EVICTION_POLICIES, default="lru")
+    parser.add_argument(
+        "--keep-namespaces",
+        type=int,
+        default=1,
+        help="most recently used namespaces kept by compact",
+    )
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        result = compact_cache(
+            args.cache_dir,
+            int(args.max_mb * 1024 * 1024) if args.max_mb else None,
+            args.policy,
+            keep_namespaces=args.keep_namespaces,
+        )
+        print(
+            f"Compacted {args.cache_dir}: {result['bytes_before'] / 1024 / 1024:.1f} MB -> "
+            f"{result['bytes_after'] / 1024 / 1024:.1f} MB "
+            f"({result['namespaces_dropped']} namespaces dropped, {result['evicted']} embeddings evicted)"
+        )
+        return
+
+    for path in reversed(namespace_dirs(args.cache_dir)):
+        info = json.loads((path / NAMESPACE_FILE).read_text())
+        entries = sum(len(EmbeddingStore(path, dim)) for dim in store_dimensions(path))
+        print(
+            f"{path.name}: {entries} embeddings, {directory_bytes(path) / 1024 / 1024:.1f} MB, "
+            f"last used {time.strftime('%Y-%m-%d %H:%M', time.localtime(info['last_used']))}"
+        )
+        print(f"  {json.dumps(info['fields'], default=str)}")
+    print(f"Total: {cache_bytes(args.cache_dir) / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Synthetic Scryfall Bulk Data Generator
+Writes Scryfall-shaped card JSON (one card per line, like the real bulk
+files) so the database builder can be exercised and benchmarked without the
+multi-GB download.
+"""
+
+import argparse
+import json
+import random
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+FORMATS = [
+    'standard', 'future', 'historic', 'timeless', 'gladiator', 'pioneer', 'explorer',
+    'modern', 'legacy', 'pauper', 'vintage', 'penny', 'commander', 'oathbreaker',
+    'standardbrawl', 'brawl', 'alchemy', 'paupercommander', 'duel', 'oldschool',
+    'premodern', 'predh',
+]
+LANGUAGES = ['es', 'fr', 'de', 'it', 'pt', 'ja', 'ko', 'ru', 'zhs', 'zht']
+MULTI_FACE_LAYOUTS = ['transform', 'modal_dfc', 'split', 'adventure', 'flip']
+RARITIES = ['common', 'common', 'common', 'uncommon', 'uncommon', 'rare', 'mythic']
+
+ADJECTIVES = [
+    'Ancient', 'Blazing', 'Cunning', 'Dread', 'Eternal', 'Feral', 'Gilded', 'Hollow',
+    'Iron', 'Jade', 'Keen', 'Lost', 'Molten', 'Noble', 'Obsidian', 'Primal', 'Quiet',
+    'Radiant', 'Savage', 'Twisted', 'Unbroken', 'Verdant', 'Wicked', 'Zealous',
+    'Ashen', 'Brazen', 'Crimson', 'Distant', 'Ember', 'Frost', 'Grim', 'Hallowed',
+]
+NOUNS = [
+    'Angel', 'Behemoth', 'Cartographer', 'Drake', 'Envoy', 'Familiar', 'Guardian',
+    'Hydra', 'Invoker', 'Juggernaut', 'Knight', 'Lich', 'Mystic', 'Nomad', 'Oracle',
+    'Paladin', 'Ranger', 'Sphinx', 'Tyrant', 'Upstart', 'Vampire', 'Warden', 'Wurm',
+    'Archive', 'Bargain', 'Cascade', 'Decree', 'Eruption', 'Flood', 'Gambit', 'Harvest',
+]
+PLACES = [
+    'the Wastes', 'the Deep', 'Dominaria', 'the Vault', 'the Spire', 'the Mire',
+    'Zendikar', 'the Citadel', 'the Grove', 'Innistrad', 'the Tides', 'Kaladesh',
+]
+SUBTYPES = {
+    'Creature': ['Elf Druid', 'Human Wizard', 'Zombie', 'Dragon', 'Goblin Warrior', 'Spirit', 'Merfolk Rogue'],
+    'Artifact': ['Equipment', 'Vehicle', 'Treasure', ''],
+    'Enchantment': ['Aura', 'Saga', ''],
+    'Land': ['Forest', 'Island', 'Swamp', 'Mountain', 'Plains', ''],
+    'Planeswalker': ['Jace', 'Chandra', 'Liliana', 'Nissa'],
+    'Instant': ['', '', 'Arcane'],
+    'Sorcery': ['', '', 'Lesson'],
+}
+KEYWORDS = ['Flying', 'Trample', 'Haste', 'Vigilance', 'Deathtouch', 'Lifelink', 'Ward',
+            'Flash', 'Reach', 'Menace', 'First strike', 'Hexproof']
+ABILITIES = [
+    'When {this} enters the battlefield, draw a card.',
+    '{T}: Add {G}.',
+    '{T}: Add {W} or {U}.',
+    'Counter target spell unless its controller pays {3}.',
+    '{this} deals 3 damage to any target.',
+    'Destroy target creature. Its controller loses 2 life.',
+    '{2}{B}, Sacrifice a creature: Each opponent loses 2 life.',
+    'Whenever {this} attacks, create a 1/1 white Soldier creature token.',
+    'Enchanted creature gets +2/+2 and has trample.',
+    'Search your library for a basic land card, put it onto the battlefield tapped, then shuffle.',
+    'Return target creature card from your graveyard to your hand.',
+    '+1: Draw a card, then discard a card.',
+    '−3: Target creature gets -3/-3 until end of turn.',
+    'Scry 2.',
+    'At the beginning of your upkeep, you gain 1 life.',
+]
+FLAVOR = [
+    '"The old ways are not forgotten, only waiting."',
+    'Even the smallest spark can set the plains ablaze.',
+    'It remembered every name the tide had ever swallowed.',
+]
+
+
+def card_name(oracle_index: int) -> str:
+    """Deterministic, mostly unique card name for an oracle card."""
+    adjective = ADJECTIVES[oracle_index % len(ADJECTIVES)]
+    noun = NOUNS[(oracle_index // len(ADJECTIVES)) % len(NOUNS)]
+    cycle = oracle_index // (len(ADJECTIVES) * len(NOUNS))
+    if cycle == 0:
+        return f"{adjective} {noun}"
+    place = PLACES[cycle % len(PLACES)]
+    suffix = f" {cycle // len(PLACES) + 1}" if cycle >= len(PLACES) else ''
+    return f"{adjective} {noun} of {place}{suffix}"
+
+
+def _type_line(rng: random.Random) -> str:
+    card_type = rng.choice(list(SUBTYPES))
+    subtype = rng.choice(SUBTYPES[card_type])
+    supertype = 'Legendary ' if rng.random() < 0.15 else ''
+    if card_type == 'Land' and subtype and rng.random() < 0.5:
+        supertype = 'Basic '
+    return f"{supertype}{card_type} — {subtype}" if subtype else f"{supertype}{card_type}"
+
+
+def _mana_cost(rng: random.Random, colors) -> str:
+    generic = rng.randint(0, 4)
+    cost = f"{{{generic}}}" if generic else ''
+    return cost + ''.join(f"{{{color}}}" for color in colors for _ in range(rng.randint(1, 2)))
+
+
+def _mana_value(mana_cost: str) -> int:
+    symbols = mana_cost.strip('{}').split('}{') if mana_cost else []
+    return sum(int(symbol) if symbol.isdigit() else 1 for symbol in symbols)
+
+
+def _oracle(rng: random.Random, oracle_index: int, multi_face: bool) -> Dict[str, Any]:
+    """Gameplay fields shared by every printing of one oracle card."""
+    colors = sorted(rng.sample('WUBRG', rng.choice([0, 1, 1, 1, 2, 2, 3])), key='WUBRG'.index)
+    keywords = rng.sample(KEYWORDS, rng.choice([0, 0, 1, 1, 2]))
+    faces = []
+    for face in range(2 if multi_face else 1):
+        type_line = _type_line(rng)
+        lines = list(keywords) if face == 0 and keywords else []
+        lines += rng.sample(ABILITIES, rng.randint(1, 3))
+        face_fields = {
+            'name': card_name(oracle_index) if face == 0 else card_name(oracle_index + 7919),
+            'mana_cost': _mana_cost(rng, colors) if 'Land' not in type_line else '',
+            'type_line': type_line,
+            'oracle_text': '\n'.join(lines),
+        }
+        if 'Creature' in type_line:
+            face_fields['power'] = rng.choice(['0', '1', '2', '3', '4', '5', '*'])
+            face_fields['toughness'] = rng.choice(['1', '2', '3', '4', '5', '1+*'])
+        if 'Planeswalker' in type_line:
+            face_fields['loyalty'] = str(rng.randint(2, 6))
+        faces.append(face_fields)
+    return {
+        'oracle_id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        'faces': faces,
+        'layout': rng.choice(MULTI_FACE_LAYOUTS) if multi_face else 'normal',
+        'colors': colors,
+        'keywords': keywords,
+        'cmc': float(_mana_value(faces[0]['mana_cost'])),
+        'legalities': {fmt: rng.choice(['legal', 'legal', 'not_legal', 'banned', 'restricted'])
+                       for fmt in FORMATS},
+        'edhrec_rank': rng.randint(1, 30000),
+    }
+
+
+def _image_uris(card_id: str, rng: random.Random) -> Dict[str, str]:
+    stamp = rng.randint(1500000000, 1700000000)
+    return {kind: f"https://cards.scryfall.io/{kind}/front/{card_id[0]}/{card_id[1]}/{card_id}.jpg?{stamp}"
+            for kind in ('small', 'normal', 'large', 'png', 'art_crop', 'border_crop')}
+
+
+def _printing(rng: random.Random, oracle: Dict[str, Any], number: int, lang: str) -> Dict[str, Any]:
+    card_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    set_code = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(3))
+    faces = oracle['faces']
+    name = ' // '.join(face['name'] for face in faces)
+    card = {
+        'object': 'card',
+        'id': card_id,
+        'oracle_id': oracle['oracle_id'],
+        'multiverse_ids': [rng.randint(1, 700000)],
+        'mtgo_id': rng.randint(1, 120000),
+        'arena_id': rng.randint(1, 90000),
+        'tcgplayer_id': rng.randint(1, 600000),
+        'cardmarket_id': rng.randint(1, 800000),
+        'name': name,
+        'lang': lang,
+        'released_at': f"{rng.randint(1993, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'uri': f"https://api.scryfall.com/cards/{card_id}",
+        'scryfall_uri': f"https://scryfall.com/card/{set_code}/{number}/{lang}?utm_source=api",
+        'layout': oracle['layout'],
+        'highres_image': True,
+        'image_status': 'highres_scan',
+        'cmc': oracle['cmc'],
+        'colors': oracle['colors'],
+        'color_identity': oracle['colors'],
+        'keywords': oracle['keywords'],
+        'legalities': oracle['legalities'],
+        'games': ['paper', 'mtgo'],
+        'reserved': rng.random() < 0.01,
+        'foil': True,
+        'nonfoil': True,
+        'finishes': ['nonfoil', 'foil'],
+        'oversized': False,
+        'promo': rng.random() < 0.05,
+        'reprint': rng.random() < 0.5,
+        'variation': False,
+        'set_id': str(uuid.uuid5(uuid.NAMESPACE_URL, set_code)),
+        'set': set_code,
+        'set_name': f"{rng.choice(ADJECTIVES)} {rng.choice(PLACES).replace('the ', '').title()}",
+        'set_type': rng.choice(['expansion', 'core', 'masters', 'commander', 'promo']),
+        'set_uri': f"https://api.scryfall.com/sets/{set_code}",
+        'set_search_uri': f"https://api.scryfall.com/cards/search?order=set&q=e%3A{set_code}&unique=prints",
+        'scryfall_set_uri': f"https://scryfall.com/sets/{set_code}?utm_source=api",
+        'rulings_uri': f"https://api.scryfall.com/cards/{card_id}/rulings",
+        'prints_search_uri': f"https://api.scryfall.com/cards/search?order=released&q=oracleid%3A{oracle['oracle_id']}",
+        'collector_number': str(number),
+        'digital': False,
+        'rarity': rng.choice(RARITIES),
+        'card_back_id': '0aeebaf5-8c7d-4636-9e82-8c27447861f7',
+        'artist': f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}",
+        'artist_ids': [str(uuid.UUID(int=rng.getrandbits(128), version=4))],
+        'border_color': rng.choice(['black', 'black', 'white', 'borderless']),
+        'frame': rng.choice(['1993', '1997', '2003', '2015']),
+        'full_art': False,
+        'textless': False,
+        'booster': True,
+        'story_spotlight': False,
+        'edhrec_rank': oracle['edhrec_rank'],
+        'prices': {
+            'usd': f"{rng.random() * 20:.2f}" if rng.random() < 0.8 else None,
+            'usd_foil': f"{rng.random() * 40:.2f}" if rng.random() < 0.6 else None,
+            'usd_etched': None,
+            'eur': f"{rng.random() * 20:.2f}" if rng.random() < 0.7 else None,
+            'eur_foil': None,
+            'tix': f"{rng.random():.2f}" if rng.random() < 0.5 else None,
+        },
+        'related_uris': {
+            'gatherer': f"https://gatherer.wizards.com/Pages/Card/Details.aspx?multiverseid={number}",
+            'edhrec': f"https://edhrec.com/route/?cc={name.replace(' ', '+')}",
+        },
+        'purchase_uris': {
+            'tcgplayer': f"https://www.tcgplayer.com/product/{number}",
+            'cardmarket': f"https://www.cardmarket.com/en/Magic/Products/Search?searchString={name.replace(' ', '+')}",
+        },
+    }
+    if rng.random() < 0.3:
+        card['flavor_text'] = rng.choice(FLAVOR)
+    if lang != 'en':
+        card['printed_name'] = f"{name} ({lang})"
+        card['printed_type_line'] = f"{faces[0]['type_line']} ({lang})"
+        card['printed_text'] = f"[{lang}] {faces[0]['oracle_text']}"
+
+    if len(faces) == 1:
+        card.update(faces[0])
+        card['image_uris'] = _image_uris(card_id, rng)
+    else:
+        card['mana_cost'] = ' // '.join(face['mana_cost'] for face in faces)
+        card['card_faces'] = [{'object': 'card_face', **face} for face in faces]
+        if oracle['layout'] in ('transform', 'modal_dfc'):
+            for face in card['card_faces']:
+                face['image_uris'] = _image_uris(card_id, rng)
+            del card['mana_cost']
+        else:
+            card['type_line'] = ' // '.join(face['type_line'] for face in faces)
+            card['image_uris'] = _image_uris(card_id, rng)
+    return card
+
+
+def generate_cards(count: int, non_english_ratio: float = 0.4, multi_face_ratio: float = 0.05,
+                   printings_per_card: float = 3.0, seed: int = 7) -> Iterator[Dict[str, Any]]:
+    """Yield ``count`` Scryfall-shaped cards.
+
+    Printings of one oracle card share their gameplay fields; the ratios are
+    per printing (non-English) and per oracle card (multi-face). The same
+    arguments always produce the same cards.
+    """
+    rng = random.Random(seed)
+    produced = 0
+    oracle_index = 0
+    while produced < count:
+        oracle = _oracle(rng, oracle_index, rng.random() < multi_face_ratio)
+        printings = max(1, min(count - produced, round(rng.expovariate(1 / printings_per_card))))
+        for _ in range(printings):
+            lang = rng.choice(LANGUAGES) if rng.random() < non_english_ratio else 'en'
+            yield _printing(rng, oracle, produced + 1, lang)
+            produced += 1
+        oracle_index += 1
+
+
+def write_corpus(path: Path, count: int, **options) -> int:
+    """Write a bulk file in Scryfall's layout (a JSON array, one card per line). Returns its size."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[\n')
+        for index, card in enumerate(generate_cards(count, **options)):
+            if index:
+                f.write(',\n')
+            f.write(json.dumps(card, ensure_ascii=False, separators=(',', ':')))
+        f.write('\n]\n')
+    return path.stat().st_size
+
+
+def parse_count(value: str) -> int:
+    """Parse card counts such as ``10000``, ``100k`` or ``1m``."""
+    value = value.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value[:-1] if scale > 1 else value) * scale)
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Generate a synthetic Scryfall bulk data file')
+    parser.add_argument('count', type=parse_count, help='number of cards, e.g. 10k, 100k or 500k')
+    parser.add_argument('output', type=Path, help='bulk JSON file to write')
+    parser.add_argument('--non-english', type=float, default=0.4,
+                        help='fraction of printings that are not English')
+    parser.add_argument('--multi-face', type=float, default=0.05,
+                        help='fraction of cards with two faces (transform, split, adventure, ...)')
+    parser.add_argument('--printings', type=float, default=3.0,
+                        help='average number of printings per card')
+    parser.add_argument('--seed', type=int, default=7, help='random seed')
+    args = parser.parse_args()
+
+    size = write_corpus(args.output, args.count, non_english_ratio=args.non_english,
+                        multi_face_ratio=args.multi_face, printings_per_card=args.printings,
+                        seed=args.seed)
+    print(f"✅ Wrote {args.count:,} cards to {args.output} ({size / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
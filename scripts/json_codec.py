@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+JSON Codec
+Parses and serializes JSON for the builders with the fastest installed
+library: orjson, then msgspec, then the standard library. ``dumps`` writes
+compact UTF-8 JSON (no spaces, non-ASCII characters unescaped), which all
+three produce byte for byte the same, so stored JSON and content hashes do
+not depend on the library. The one known difference is the spelling of
+floats that need an exponent (below 1e-4 or from 1e16), which Scryfall data
+does not contain.
+"""
+
+import json
+import os
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # optional
+    msgspec = None
+
+# Preference order; 'json' (the standard library) is always available.
+JSON_CODECS = ('orjson', 'msgspec', 'json')
+
+# Set to a codec name to override the automatic choice (e.g. for benchmarks).
+JSON_CODEC_ENV = 'DESKTOPMTG_JSON_CODEC'
+
+_stdlib_dumps = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+
+
+def available_json_codecs() -> tuple:
+    """Names of the codecs that can be used here, fastest first."""
+    installed = {'orjson': orjson is not None, 'msgspec': msgspec is not None, 'json': True}
+    return tuple(name for name in JSON_CODECS if installed[name])
+
+
+class JsonCodec:
+    """``loads``/``dumps`` backed by one JSON library.
+
+    ``loads`` accepts ``str`` or UTF-8 ``bytes`` and raises
+    ``json.JSONDecodeError`` on invalid input whatever the library.
+    ``dumps`` returns compact JSON text.
+    """
+
+    def __init__(self, name: str):
+        if name not in available_json_codecs():
+            raise ValueError(f"JSON codec '{name}' is not available "
+                             f"(installed: {', '.join(available_json_codecs())})")
+        self.name = name
+        if name == 'orjson':
+            # orjson.JSONDecodeError already subclasses json.JSONDecodeError
+            self.loads: Callable[[Union[str, bytes]], Any] = orjson.loads
+            self._dumps = self._dumps_orjson
+        elif name == 'msgspec':
+            self._decoder = msgspec.json.Decoder()
+            self._encoder = msgspec.json.Encoder()
+            self.loads = self._loads_msgspec
+            self._dumps = self._dumps_msgspec
+        else:
+            self.loads = json.loads
+            self._dumps = _stdlib_dumps
+
+    def __repr__(self) -> str:
+        return f'JsonCodec({self.name!r})'
+
+    def __reduce__(self):
+        # Worker processes rebuild the codec by name
+        return JsonCodec, (self.name,)
+
+    def dumps(self, obj: Any) -> str:
+        """Compact JSON text of ``obj``."""
+        return self._dumps(obj)
+
+    @staticmethod
+    def _dumps_orjson(obj: Any) -> str:
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except TypeError:
+            # e.g. integers beyond 64 bits, which only the standard library writes
+            return _stdlib_dumps(obj)
+
+    def _loads_msgspec(self, text: Union[str, bytes]) -> Any:
+        try:
+            return self._decoder.decode(text)
+        except msgspec.DecodeError as e:
+            doc = text.decode('utf-8', 'replace') if isinstance(text, bytes) else text
+            raise json.JSONDecodeError(str(e), doc, 0) from e
+
+    def _dumps_msgspec(self, obj: Any) -> str:
+        try:
+            return self._encoder.encode(obj).decode('utf-8')
+        except (TypeError, OverflowError):
+            return _stdlib_dumps(obj)
+
+
+def get_json_codec(name: Optional[str] = None) -> JsonCodec:
+    """The named codec, else the one set in DESKTOPMTG_JSON_CODEC, else the fastest installed."""
+    name = name or os.environ.get(JSON_CODEC_ENV) or available_json_codecs()[0]
+    return JsonCodec(name)